@@ -1,44 +1,194 @@
+import asyncio
+import concurrent.futures
+import contextvars
+import logging
+import os
+import threading
+import time
 from typing import TypedDict, Annotated
 from datetime import datetime
 
 from langgraph.graph.message import AnyMessage, add_messages
 from langgraph.graph import StateGraph, START, END
-from langchain_core.runnables import Runnable
+from langchain_core.messages import AIMessage, message_chunk_to_message
+from langchain_core.runnables import Runnable, RunnableLambda
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_community.tools import DuckDuckGoSearchRun
 from langgraph.prebuilt import tools_condition
-from langgraph.checkpoint.memory import MemorySaver
 
+from ai.checkpoint import create_checkpointer
+from ai.context import RETRY_PROMPT, aprepare_context, prepare_context
 from ai.models import llm
 from tools.flight_scraper import search_flights
+from tools.flight_search import (
+    search_flights_flexible_dates,
+    search_round_trip_flights,
+)
 from tools.hotel_scraper import search_hotels
-from utils.tools import create_tool_node_with_fallback
+from tools.web_search import web_search
+from utils.tools import create_tool_node_with_fallback, with_timeout
+from utils.tracing import assistant_step_seconds, span
+
+logger = logging.getLogger(__name__)
 
 
 class State(TypedDict):
     messages: Annotated[list[AnyMessage], add_messages]
 
 
+# Re-prompts allowed when the model returns an empty reply, and the time budget in
+# seconds for the whole step: each model call must start replying within what is left
+# of it, but a reply that has started streaming is never cut off
+ASSISTANT_MAX_RETRIES = int(os.getenv("ASSISTANT_MAX_RETRIES", 2))
+ASSISTANT_RETRY_BUDGET = float(os.getenv("ASSISTANT_RETRY_BUDGET", 90))
+EMPTY_REPLY_FALLBACK = "Sorry, I couldn't come up with a response. Could you rephrase that?"
+
+# Runs sync model calls, so the caller can stop waiting for a reply that never starts
+_sync_executor = concurrent.futures.ThreadPoolExecutor(thread_name_prefix="assistant")
+
+
+def fallback_message() -> AIMessage:
+    # Not streamed by the model, so stream consumers send it themselves (see is_fallback)
+    return AIMessage(content=EMPTY_REPLY_FALLBACK, response_metadata={"fallback": True})
+
+
+def is_fallback(message) -> bool:
+    return isinstance(message, AIMessage) and message.response_metadata.get("fallback") is True
+
+
+class AssistantStats:
+    def __init__(self):
+        self.calls = 0
+        self.empty_replies = 0
+        self.gave_up = 0
+        self.timed_out = 0
+
+    def snapshot(self) -> dict:
+        return {
+            "calls": self.calls,
+            "empty_replies": self.empty_replies,
+            "gave_up": self.gave_up,
+            "timed_out": self.timed_out,
+            "empty_reply_rate": self.empty_replies / self.calls if self.calls else None,
+        }
+
+
+assistant_stats = AssistantStats()
+
+
 class Assistant:
-    def __init__(self, runnable: Runnable):
+    def __init__(
+        self,
+        runnable: Runnable,
+        max_retries: int = ASSISTANT_MAX_RETRIES,
+        retry_budget: float = ASSISTANT_RETRY_BUDGET,
+    ):
         self.runnable = runnable
+        self.max_retries = max_retries
+        self.retry_budget = retry_budget
 
-    def __call__(self, state: State) -> State:
-        while True:
-            result = self.runnable.invoke(state)
-            # If the LLM happens to return an empty response, we will re-prompt it
-            # for an actual response.
-            if not result.tool_calls and (
-                not result.content
-                or isinstance(result.content, list)
-                and not result.content[0].get("text")
-            ):
-                messages = state["messages"] + [("user", "Respond with a real output.")]
-                state = {**state, "messages": messages}
-            else:
-                break
+    @staticmethod
+    def _is_empty(result) -> bool:
+        return not result.tool_calls and (
+            not result.content
+            or isinstance(result.content, list)
+            and not result.content[0].get("text")
+        )
+
+    def _next_state(self, state: State, result, attempt: int, start: float):
+        """
+        Returns the state to re-prompt with if the reply was empty and there is retry
+        budget left, otherwise None.
+        """
+        assistant_stats.calls += 1
+        if not self._is_empty(result):
+            return None
+        assistant_stats.empty_replies += 1
+        if attempt >= self.max_retries or time.monotonic() - start > self.retry_budget:
+            assistant_stats.gave_up += 1
+            logger.warning("Empty reply after %d attempts, giving up.", attempt + 1)
+            return None
+        # If the LLM happens to return an empty response, we will re-prompt it
+        # for an actual response.
+        messages = state["messages"] + [("user", RETRY_PROMPT)]
+        return {**state, "messages": messages}
+
+    def _finish(self, result) -> State:
+        if self._is_empty(result):
+            result = fallback_message()
         return {"messages": result}
 
+    def _remaining(self, start: float) -> float:
+        return max(self.retry_budget - (time.monotonic() - start), 0)
+
+    def _timed_out(self, attempt: int) -> State:
+        assistant_stats.timed_out += 1
+        logger.warning(
+            "Model call %d did not start replying within the %gs budget, giving up.",
+            attempt + 1,
+            self.retry_budget,
+        )
+        return {"messages": fallback_message()}
+
+    def _stream(self, state: State, started: threading.Event):
+        """Streams one model call into one message; sets `started` at the first chunk."""
+        result = None
+        try:
+            for chunk in self.runnable.stream(state):
+                result = chunk if result is None else result + chunk
+                started.set()
+        finally:
+            started.set()
+        return message_chunk_to_message(result) if result is not None else AIMessage(content="")
+
+    async def _astream(self, state: State, timeout: float):
+        """
+        Async version of _stream. Raises asyncio.TimeoutError if the first chunk does
+        not arrive within `timeout` seconds.
+        """
+        stream = self.runnable.astream(state)
+        try:
+            result = await asyncio.wait_for(anext(stream), timeout)
+        except StopAsyncIteration:
+            return AIMessage(content="")
+        async for chunk in stream:
+            result += chunk
+        return message_chunk_to_message(result)
+
+    def __call__(self, state: State) -> State:
+        start = time.monotonic()
+        attempt = 0
+        with span("assistant_step", assistant_step_seconds):
+            while True:
+                # A call that never starts keeps its thread, but the step stops waiting
+                started = threading.Event()
+                future = _sync_executor.submit(
+                    contextvars.copy_context().run, self._stream, state, started
+                )
+                if not started.wait(self._remaining(start)):
+                    return self._timed_out(attempt)
+                result = future.result()
+                next_state = self._next_state(state, result, attempt, start)
+                if next_state is None:
+                    return self._finish(result)
+                state = next_state
+                attempt += 1
+
+    async def acall(self, state: State) -> State:
+        """Async node body, so a waiting LLM call holds a coroutine instead of a thread."""
+        start = time.monotonic()
+        attempt = 0
+        async with span("assistant_step", assistant_step_seconds):
+            while True:
+                try:
+                    result = await self._astream(state, self._remaining(start))
+                except asyncio.TimeoutError:
+                    return self._timed_out(attempt)
+                next_state = self._next_state(state, result, attempt, start)
+                if next_state is None:
+                    return self._finish(result)
+                state = next_state
+                attempt += 1
+
 
 primary_assistant_prompt = ChatPromptTemplate.from_messages(
     [
@@ -48,7 +198,9 @@ primary_assistant_prompt = ChatPromptTemplate.from_messages(
             " You can also help with questions about local restaurants, attractions, travel tips, and other travel-related information. "
             " You can not book flights or hotels, only search for them. "
             " Use the search_flights and search_hotels tools to search for flights and hotels. "
-            " Use the web search tool for general travel information. "
+            " When the user is flexible on dates (e.g. the cheapest day in a week), use search_flights_flexible_dates once instead of calling search_flights for each date. "
+            " For return trips, use search_round_trip_flights to search both legs at once. "
+            " Use the web_search tool for general travel information; when you need several searches, pass all the queries in one call. "
             " If there are some missing details required to search, ask the user for more information. "
             " When searching for hotels, you can make additional web search to find the best options or fill in missing details like amenities, location, etc. "
             " If a search comes up empty, expand your search before giving up."
@@ -58,12 +210,27 @@ primary_assistant_prompt = ChatPromptTemplate.from_messages(
     ]
 ).partial(time=datetime.now)
 
-tools = [search_flights, search_hotels, DuckDuckGoSearchRun()]
-assistant_runnable = primary_assistant_prompt | llm.bind_tools(tools)
+# Each tool call is cancelled after its own timeout (seconds)
+tools = [
+    with_timeout(search_flights, 45),
+    with_timeout(search_flights_flexible_dates, 120),
+    with_timeout(search_round_trip_flights, 60),
+    with_timeout(search_hotels, 60),
+    with_timeout(web_search, 30),
+]
+# Fit the conversation into the token budget before it reaches the prompt
+assistant_runnable = (
+    RunnableLambda(prepare_context, afunc=aprepare_context, name="context")
+    | primary_assistant_prompt
+    | llm.bind_tools(tools)
+)
 
 builder = StateGraph(State)
 
-builder.add_node("assistant", Assistant(assistant_runnable))
+assistant = Assistant(assistant_runnable)
+builder.add_node(
+    "assistant", RunnableLambda(assistant, afunc=assistant.acall, name="assistant")
+)
 builder.add_node("tools", create_tool_node_with_fallback(tools))
 
 builder.add_edge(START, "assistant")
@@ -75,15 +242,21 @@ builder.add_edge("tools", "assistant")
 
 # The checkpointer lets the graph persist its state
 # this is a complete memory for the entire graph.
-memory = MemorySaver()
+# CHECKPOINT_BACKEND picks a bounded in-process store or a SQLite file shared by workers.
+memory = create_checkpointer()
 graph = builder.compile(checkpointer=memory)
 
+
+async def athread_exists(thread_id: str) -> bool:
+    """Whether the checkpointer holds state for the thread, without loading it."""
+    return await memory.ahas_thread(thread_id)
+
+
 # Draw the graph
 # graph.get_graph().draw_mermaid_png(output_file_path="graph.png")
 
 # For testing the graph locally
 if __name__ == "__main__":
-    import asyncio
     from langchain_core.messages import HumanMessage
 
     async def run_interactive_test():
@@ -0,0 +1,702 @@
+import asyncio
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from typing import Any, AsyncIterator, Iterator, Optional, Sequence
+
+import zstandard
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    SerializerProtocol,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.checkpoint.serde.types import TASKS, ChannelProtocol
+
+logger = logging.getLogger(__name__)
+
+# "memory" keeps checkpoints in this process, "sqlite" shares them through CHECKPOINT_DB
+CHECKPOINT_BACKEND = os.getenv("CHECKPOINT_BACKEND", "memory")
+CHECKPOINT_DB = os.getenv("CHECKPOINT_DB", "checkpoints.sqlite3")
+
+CHECKPOINT_MAX_THREADS = int(os.getenv("CHECKPOINT_MAX_THREADS", 1000))
+CHECKPOINT_IDLE_TTL = float(os.getenv("CHECKPOINT_IDLE_TTL", 6 * 3600))
+CHECKPOINT_MAX_MB = float(os.getenv("CHECKPOINT_MAX_MB", 256))
+CHECKPOINT_KEEP = int(os.getenv("CHECKPOINT_KEEP", 4))
+
+# Threads used this recently are mid-run, so the size and count caps leave them alone
+ACTIVE_WINDOW = 120.0
+
+# Serialized values at least this large are stored zstd-compressed
+COMPRESS_MIN_BYTES = 256
+ZSTD_SUFFIX = "+zstd"
+
+
+def _typed_size(value: tuple[str, bytes]) -> int:
+    return len(value[1])
+
+
+class BoundedMemorySaver(InMemorySaver):
+    """
+    In-memory checkpointer with bounded growth:
+        - only the latest `keep_checkpoints` checkpoints of each thread are kept,
+          along with their pending writes and the channel blobs they reference;
+        - threads idle for longer than `idle_ttl` seconds are dropped;
+        - beyond `max_threads` threads or `max_bytes` of serialized state, the least
+          recently used threads are dropped first.
+    Byte counts are the sizes of the serialized checkpoints, blobs and writes, which is
+    close to what the saver holds.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_threads: int = CHECKPOINT_MAX_THREADS,
+        idle_ttl: float = CHECKPOINT_IDLE_TTL,
+        max_bytes: int = int(CHECKPOINT_MAX_MB * 1024 * 1024),
+        keep_checkpoints: int = CHECKPOINT_KEEP,
+        serde: Optional[SerializerProtocol] = None,
+    ):
+        super().__init__(serde=serde)
+        self.max_threads = max_threads
+        self.idle_ttl = idle_ttl
+        self.max_bytes = max_bytes
+        # The parent of the latest checkpoint holds its pending sends, so keep two at least
+        self.keep_checkpoints = max(keep_checkpoints, 2)
+        self._lock = threading.RLock()
+        self._last_used: OrderedDict[str, float] = OrderedDict()
+        self._thread_bytes: dict[str, int] = defaultdict(int)
+        # (thread_id, checkpoint_ns, checkpoint_id) -> channel versions it references
+        self._versions: dict[tuple[str, str, str], dict] = {}
+        # (thread_id, checkpoint_ns) -> blob keys (channel, version) held for it
+        self._blob_keys: dict[tuple[str, str], set] = defaultdict(set)
+        self.total_bytes = 0
+        self.evicted_threads = 0
+        self.pruned_checkpoints = 0
+
+    def has_thread(self, thread_id: str) -> bool:
+        return bool(self.storage.get(thread_id))
+
+    async def ahas_thread(self, thread_id: str) -> bool:
+        return self.has_thread(thread_id)
+
+    def _touch(self, thread_id: str):
+        self._last_used[thread_id] = time.monotonic()
+        self._last_used.move_to_end(thread_id)
+
+    def _add_bytes(self, thread_id: str, size: int):
+        self._thread_bytes[thread_id] += size
+        self.total_bytes += size
+
+    def _writes_size(self, key: tuple[str, str, str]) -> int:
+        return sum(_typed_size(write[2]) for write in self.writes.get(key, {}).values())
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = config["configurable"]["thread_id"]
+        with self._lock:
+            # Looking up an unknown thread would add an empty entry to the defaultdict
+            if thread_id not in self.storage:
+                return None
+            self._touch(thread_id)
+            return super().get_tuple(config)
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        if config and config["configurable"]["thread_id"] not in self.storage:
+            return iter(())
+        return super().list(config, filter=filter, before=before, limit=limit)
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        with self._lock:
+            next_config = super().put(config, checkpoint, metadata, new_versions)
+            saved = self.storage[thread_id][checkpoint_ns][checkpoint["id"]]
+            size = _typed_size(saved[0]) + _typed_size(saved[1])
+            blob_keys = self._blob_keys[(thread_id, checkpoint_ns)]
+            for channel, version in new_versions.items():
+                if (channel, version) not in blob_keys:
+                    blob_keys.add((channel, version))
+                    size += _typed_size(
+                        self.blobs[(thread_id, checkpoint_ns, channel, version)]
+                    )
+            self._versions[(thread_id, checkpoint_ns, checkpoint["id"])] = dict(
+                checkpoint["channel_versions"]
+            )
+            self._add_bytes(thread_id, size)
+            self._touch(thread_id)
+            self._prune(thread_id, checkpoint_ns)
+            self._evict(keep=thread_id)
+        return next_config
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        thread_id = config["configurable"]["thread_id"]
+        key = (
+            thread_id,
+            config["configurable"].get("checkpoint_ns", ""),
+            config["configurable"]["checkpoint_id"],
+        )
+        with self._lock:
+            before = self._writes_size(key)
+            super().put_writes(config, writes, task_id, task_path)
+            self._add_bytes(thread_id, self._writes_size(key) - before)
+            self._touch(thread_id)
+
+    def _prune(self, thread_id: str, checkpoint_ns: str):
+        """Drops all but the latest checkpoints of a thread, and blobs nothing references."""
+        checkpoints = self.storage[thread_id][checkpoint_ns]
+        if len(checkpoints) <= self.keep_checkpoints:
+            return
+
+        freed = 0
+        for checkpoint_id in sorted(checkpoints)[: -self.keep_checkpoints]:
+            saved = checkpoints.pop(checkpoint_id)
+            freed += _typed_size(saved[0]) + _typed_size(saved[1])
+            freed += self._writes_size((thread_id, checkpoint_ns, checkpoint_id))
+            self.writes.pop((thread_id, checkpoint_ns, checkpoint_id), None)
+            self._versions.pop((thread_id, checkpoint_ns, checkpoint_id), None)
+            self.pruned_checkpoints += 1
+
+        referenced = set()
+        for checkpoint_id in checkpoints:
+            versions = self._versions.get((thread_id, checkpoint_ns, checkpoint_id), {})
+            referenced.update(versions.items())
+        blob_keys = self._blob_keys[(thread_id, checkpoint_ns)]
+        for channel, version in blob_keys - referenced:
+            blob = self.blobs.pop((thread_id, checkpoint_ns, channel, version), None)
+            if blob is not None:
+                freed += _typed_size(blob)
+        blob_keys &= referenced
+        self._add_bytes(thread_id, -freed)
+
+    def _drop_thread(self, thread_id: str):
+        namespaces = self.storage.pop(thread_id, {})
+        for checkpoint_ns, checkpoints in namespaces.items():
+            for checkpoint_id in checkpoints:
+                self.writes.pop((thread_id, checkpoint_ns, checkpoint_id), None)
+                self._versions.pop((thread_id, checkpoint_ns, checkpoint_id), None)
+            for channel, version in self._blob_keys.pop((thread_id, checkpoint_ns), ()):
+                self.blobs.pop((thread_id, checkpoint_ns, channel, version), None)
+        self._last_used.pop(thread_id, None)
+        self.total_bytes -= self._thread_bytes.pop(thread_id, 0)
+        self.evicted_threads += 1
+
+    def _evict(self, keep: str):
+        """Drops idle threads, then the least recently used ones while over a cap."""
+        now = time.monotonic()
+        for thread_id, last_used in list(self._last_used.items()):
+            # Threads are in least recently used order, and `keep` was just touched
+            if thread_id == keep:
+                break
+            idle = now - last_used
+            over_cap = (
+                len(self._last_used) > self.max_threads
+                or self.total_bytes > self.max_bytes
+            )
+            if idle >= self.idle_ttl or (over_cap and idle >= ACTIVE_WINDOW):
+                self._drop_thread(thread_id)
+            else:
+                break
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "threads": len(self._last_used),
+                "bytes": self.total_bytes,
+                "checkpoints": len(self._versions),
+                "blobs": len(self.blobs),
+                "evicted_threads": self.evicted_threads,
+                "pruned_checkpoints": self.pruned_checkpoints,
+            }
+
+
+class SQLiteSaver(BaseCheckpointSaver[str]):
+    """
+    Checkpointer on a local SQLite file in WAL mode, so every uvicorn worker on the host
+    can resume any thread. Each step writes only the checkpoint row and the blobs of
+    the channels that changed, in a single transaction. Values are serialized with the
+    saver's serde (msgpack for graph state) and zstd-compressed above a small size.
+    Like BoundedMemorySaver, only the latest `keep_checkpoints` checkpoints of each
+    thread are kept, and threads idle for longer than `idle_ttl` seconds are purged.
+    """
+
+    def __init__(
+        self,
+        path: str = CHECKPOINT_DB,
+        *,
+        keep_checkpoints: int = CHECKPOINT_KEEP,
+        idle_ttl: float = CHECKPOINT_IDLE_TTL,
+        serde: Optional[SerializerProtocol] = None,
+    ):
+        super().__init__(serde=serde)
+        self.path = path
+        self.keep_checkpoints = max(keep_checkpoints, 2)
+        self.idle_ttl = idle_ttl
+        self._local = threading.local()
+        self._last_purge = 0.0
+        # Counted by this process only; puts run in worker threads
+        self._stats_lock = threading.Lock()
+        self.evicted_threads = 0
+        self.pruned_checkpoints = 0
+        with self._connect() as conn:
+            conn.executescript(
+                "CREATE TABLE IF NOT EXISTS threads ("
+                " thread_id TEXT PRIMARY KEY,"
+                " updated_at REAL NOT NULL);"
+                "CREATE INDEX IF NOT EXISTS threads_updated_at ON threads (updated_at);"
+                "CREATE TABLE IF NOT EXISTS checkpoints ("
+                " thread_id TEXT NOT NULL,"
+                " checkpoint_ns TEXT NOT NULL,"
+                " checkpoint_id TEXT NOT NULL,"
+                " parent_checkpoint_id TEXT,"
+                " type TEXT NOT NULL,"
+                " checkpoint BLOB NOT NULL,"
+                " metadata_type TEXT NOT NULL,"
+                " metadata BLOB NOT NULL,"
+                " PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id));"
+                "CREATE TABLE IF NOT EXISTS blobs ("
+                " thread_id TEXT NOT NULL,"
+                " checkpoint_ns TEXT NOT NULL,"
+                " channel TEXT NOT NULL,"
+                " version TEXT NOT NULL,"
+                " type TEXT NOT NULL,"
+                " data BLOB,"
+                " PRIMARY KEY (thread_id, checkpoint_ns, channel, version));"
+                "CREATE TABLE IF NOT EXISTS writes ("
+                " thread_id TEXT NOT NULL,"
+                " checkpoint_ns TEXT NOT NULL,"
+                " checkpoint_id TEXT NOT NULL,"
+                " task_id TEXT NOT NULL,"
+                " idx INTEGER NOT NULL,"
+                " channel TEXT NOT NULL,"
+                " type TEXT NOT NULL,"
+                " data BLOB,"
+                " task_path TEXT NOT NULL DEFAULT '',"
+                " PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx));"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10.0, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.compressor = zstandard.ZstdCompressor(level=3)
+            self._local.decompressor = zstandard.ZstdDecompressor()
+        return conn
+
+    def _dumps(self, value: Any) -> tuple[str, bytes]:
+        type_, data = self.serde.dumps_typed(value)
+        if len(data) >= COMPRESS_MIN_BYTES:
+            self._connect()
+            return f"{type_}{ZSTD_SUFFIX}", self._local.compressor.compress(data)
+        return type_, data
+
+    def _loads(self, type_: str, data: bytes) -> Any:
+        if type_.endswith(ZSTD_SUFFIX):
+            self._connect()
+            type_ = type_[: -len(ZSTD_SUFFIX)]
+            data = self._local.decompressor.decompress(data)
+        return self.serde.loads_typed((type_, data))
+
+    def has_thread(self, thread_id: str) -> bool:
+        row = (
+            self._connect()
+            .execute("SELECT 1 FROM threads WHERE thread_id = ?", (thread_id,))
+            .fetchone()
+        )
+        return row is not None
+
+    async def ahas_thread(self, thread_id: str) -> bool:
+        return await asyncio.to_thread(self.has_thread, thread_id)
+
+    def _load_tuple(self, conn: sqlite3.Connection, thread_id: str, row) -> CheckpointTuple:
+        checkpoint_ns, checkpoint_id, parent_checkpoint_id, type_, data, metadata_type, metadata = row
+        checkpoint: Checkpoint = self._loads(type_, data)
+
+        versions = checkpoint["channel_versions"]
+        channel_values = {}
+        if versions:
+            blob_rows = conn.execute(
+                "SELECT channel, type, data FROM blobs"
+                " WHERE thread_id = ? AND checkpoint_ns = ? AND (channel, version) IN"
+                f" (VALUES {', '.join(['(?, ?)'] * len(versions))})",
+                (thread_id, checkpoint_ns, *(v for item in versions.items() for v in item)),
+            ).fetchall()
+            for channel, blob_type, blob in blob_rows:
+                if blob_type != "empty":
+                    channel_values[channel] = self._loads(blob_type, blob)
+
+        writes = conn.execute(
+            "SELECT task_id, channel, type, data FROM writes"
+            " WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?"
+            " ORDER BY task_id, idx",
+            (thread_id, checkpoint_ns, checkpoint_id),
+        ).fetchall()
+        sends = []
+        if parent_checkpoint_id:
+            sends = conn.execute(
+                "SELECT type, data FROM writes"
+                " WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? AND channel = ?"
+                " ORDER BY task_path, task_id, idx",
+                (thread_id, checkpoint_ns, parent_checkpoint_id, TASKS),
+            ).fetchall()
+
+        return CheckpointTuple(
+            config={
+                "configurable": {
+                    "thread_id": thread_id,
+                    "checkpoint_ns": checkpoint_ns,
+                    "checkpoint_id": checkpoint_id,
+                }
+            },
+            checkpoint={
+                **checkpoint,
+                "channel_values": channel_values,
+                "pending_sends": [self._loads(t, d) for t, d in sends],
+            },
+            metadata=self._loads(metadata_type, metadata),
+            pending_writes=[
+                (task_id, channel, self._loads(t, d)) for task_id, channel, t, d in writes
+            ],
+            parent_config=(
+                {
+                    "configurable": {
+                        "thread_id": thread_id,
+                        "checkpoint_ns": checkpoint_ns,
+                        "checkpoint_id": parent_checkpoint_id,
+                    }
+                }
+                if parent_checkpoint_id
+                else None
+            ),
+        )
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        columns = (
+            "SELECT checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint,"
+            " metadata_type, metadata FROM checkpoints"
+        )
+        conn = self._connect()
+        if checkpoint_id := get_checkpoint_id(config):
+            row = conn.execute(
+                f"{columns} WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                (thread_id, checkpoint_ns, checkpoint_id),
+            ).fetchone()
+        else:
+            row = conn.execute(
+                f"{columns} WHERE thread_id = ? AND checkpoint_ns = ?"
+                " ORDER BY checkpoint_id DESC LIMIT 1",
+                (thread_id, checkpoint_ns),
+            ).fetchone()
+        if row is None:
+            return None
+        return self._load_tuple(conn, thread_id, row)
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        where, params = [], []
+        if config:
+            where.append("thread_id = ?")
+            params.append(config["configurable"]["thread_id"])
+            if (checkpoint_ns := config["configurable"].get("checkpoint_ns")) is not None:
+                where.append("checkpoint_ns = ?")
+                params.append(checkpoint_ns)
+            if checkpoint_id := get_checkpoint_id(config):
+                where.append("checkpoint_id = ?")
+                params.append(checkpoint_id)
+        if before and (before_checkpoint_id := get_checkpoint_id(before)):
+            where.append("checkpoint_id < ?")
+            params.append(before_checkpoint_id)
+
+        conn = self._connect()
+        rows = conn.execute(
+            "SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type,"
+            " checkpoint, metadata_type, metadata FROM checkpoints"
+            + (f" WHERE {' AND '.join(where)}" if where else "")
+            + " ORDER BY thread_id, checkpoint_ns, checkpoint_id DESC",
+            params,
+        ).fetchall()
+        for thread_id, *row in rows:
+            if limit is not None and limit <= 0:
+                break
+            if filter:
+                metadata = self._loads(row[5], row[6])
+                if not all(metadata.get(k) == v for k, v in filter.items()):
+                    continue
+            if limit is not None:
+                limit -= 1
+            yield self._load_tuple(conn, thread_id, row)
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        c = checkpoint.copy()
+        c.pop("pending_sends")  # type: ignore[misc]
+        values: dict[str, Any] = c.pop("channel_values")  # type: ignore[misc]
+
+        # Only channels updated by this step get new blobs; the rest are shared
+        blob_rows = []
+        for channel, version in new_versions.items():
+            type_, data = (
+                self._dumps(values[channel]) if channel in values else ("empty", None)
+            )
+            blob_rows.append((thread_id, checkpoint_ns, channel, str(version), type_, data))
+        checkpoint_type, checkpoint_data = self._dumps(c)
+        metadata_type, metadata_data = self._dumps(get_checkpoint_metadata(config, metadata))
+
+        now = time.time()
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO blobs"
+                " (thread_id, checkpoint_ns, channel, version, type, data)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                blob_rows,
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO checkpoints"
+                " (thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type,"
+                " checkpoint, metadata_type, metadata) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    thread_id,
+                    checkpoint_ns,
+                    checkpoint["id"],
+                    config["configurable"].get("checkpoint_id"),
+                    checkpoint_type,
+                    checkpoint_data,
+                    metadata_type,
+                    metadata_data,
+                ),
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO threads (thread_id, updated_at) VALUES (?, ?)",
+                (thread_id, now),
+            )
+            self._prune(conn, thread_id, checkpoint_ns)
+            # Purge idle threads at most once a minute
+            if now - self._last_purge > 60:
+                self._last_purge = now
+                self._purge_idle(conn, now)
+
+        return {
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        rows = []
+        for idx, (channel, value) in enumerate(writes):
+            type_, data = self._dumps(value)
+            rows.append(
+                (
+                    thread_id,
+                    checkpoint_ns,
+                    checkpoint_id,
+                    task_id,
+                    WRITES_IDX_MAP.get(channel, idx),
+                    channel,
+                    type_,
+                    data,
+                    task_path,
+                )
+            )
+        columns = (
+            " INTO writes (thread_id, checkpoint_ns, checkpoint_id, task_id, idx,"
+            " channel, type, data, task_path) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+        )
+        with self._connect() as conn:
+            # Regular writes are kept as first saved; special ones (errors, interrupts) replace
+            regular = [row for row in rows if row[4] >= 0]
+            special = [row for row in rows if row[4] < 0]
+            if regular:
+                conn.executemany("INSERT OR IGNORE" + columns, regular)
+            if special:
+                conn.executemany("INSERT OR REPLACE" + columns, special)
+
+    def _prune(self, conn: sqlite3.Connection, thread_id: str, checkpoint_ns: str):
+        """Drops all but the latest checkpoints of a thread, and blobs nothing references."""
+        stale = [
+            row[0]
+            for row in conn.execute(
+                "SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?"
+                " ORDER BY checkpoint_id DESC LIMIT -1 OFFSET ?",
+                (thread_id, checkpoint_ns, self.keep_checkpoints),
+            )
+        ]
+        if not stale:
+            return
+        with self._stats_lock:
+            self.pruned_checkpoints += len(stale)
+        placeholders = ", ".join("?" * len(stale))
+        for table in ("checkpoints", "writes"):
+            conn.execute(
+                f"DELETE FROM {table} WHERE thread_id = ? AND checkpoint_ns = ?"
+                f" AND checkpoint_id IN ({placeholders})",
+                (thread_id, checkpoint_ns, *stale),
+            )
+
+        referenced = set()
+        for type_, data in conn.execute(
+            "SELECT type, checkpoint FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?",
+            (thread_id, checkpoint_ns),
+        ):
+            referenced.update(
+                (channel, str(version))
+                for channel, version in self._loads(type_, data)["channel_versions"].items()
+            )
+        unreferenced = [
+            (thread_id, checkpoint_ns, channel, version)
+            for channel, version in conn.execute(
+                "SELECT channel, version FROM blobs WHERE thread_id = ? AND checkpoint_ns = ?",
+                (thread_id, checkpoint_ns),
+            )
+            if (channel, version) not in referenced
+        ]
+        conn.executemany(
+            "DELETE FROM blobs WHERE thread_id = ? AND checkpoint_ns = ?"
+            " AND channel = ? AND version = ?",
+            unreferenced,
+        )
+
+    def _purge_idle(self, conn: sqlite3.Connection, now: float):
+        idle = [
+            row[0]
+            for row in conn.execute(
+                "SELECT thread_id FROM threads WHERE updated_at <= ?",
+                (now - self.idle_ttl,),
+            )
+        ]
+        with self._stats_lock:
+            self.evicted_threads += len(idle)
+        for table in ("checkpoints", "blobs", "writes", "threads"):
+            conn.executemany(
+                f"DELETE FROM {table} WHERE thread_id = ?", [(t,) for t in idle]
+            )
+
+    def stats(self) -> dict:
+        conn = self._connect()
+        threads = conn.execute("SELECT COUNT(*) FROM threads").fetchone()[0]
+        checkpoints = conn.execute("SELECT COUNT(*) FROM checkpoints").fetchone()[0]
+        page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        with self._stats_lock:
+            return {
+                "threads": threads,
+                "bytes": page_count * page_size,
+                "checkpoints": checkpoints,
+                "evicted_threads": self.evicted_threads,
+                "pruned_checkpoints": self.pruned_checkpoints,
+            }
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        items = await asyncio.to_thread(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )
+        for item in items:
+            yield item
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    def get_next_version(self, current: Optional[str], channel: ChannelProtocol) -> str:
+        # Same scheme as InMemorySaver: zero-padded counter plus a random suffix
+        if current is None:
+            current_v = 0
+        elif isinstance(current, int):
+            current_v = current
+        else:
+            current_v = int(current.split(".")[0])
+        return f"{current_v + 1:032}.{random.random():016}"
+
+
+def create_checkpointer() -> BaseCheckpointSaver:
+    """Checkpointer picked by CHECKPOINT_BACKEND: "memory" (default) or "sqlite"."""
+    if CHECKPOINT_BACKEND == "sqlite":
+        logger.info("Using SQLite checkpointer at %s", CHECKPOINT_DB)
+        return SQLiteSaver(CHECKPOINT_DB)
+    if CHECKPOINT_BACKEND != "memory":
+        raise ValueError(
+            f"Unknown CHECKPOINT_BACKEND '{CHECKPOINT_BACKEND}'. Use memory or sqlite."
+        )
+    return BoundedMemorySaver()
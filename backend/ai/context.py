@@ -0,0 +1,369 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import List, Optional
+
+from langchain_core.messages import (
+    AIMessage,
+    AnyMessage,
+    HumanMessage,
+    SystemMessage,
+    ToolMessage,
+    convert_to_messages,
+)
+from langchain_core.prompts import ChatPromptTemplate
+
+from ai.models import llm
+from utils.cache import MISSING, TTLCache, make_key
+from utils.projection import count_tokens
+
+logger = logging.getLogger(__name__)
+
+# Token budget for the conversation messages sent with each assistant call
+CONTEXT_MAX_TOKENS = int(os.getenv("CONTEXT_MAX_TOKENS", 16000))
+# Most recent user turns that are never summarized
+CONTEXT_KEEP_TURNS = int(os.getenv("CONTEXT_KEEP_TURNS", 2))
+# Tool outputs from earlier turns larger than this are elided first
+CONTEXT_TOOL_OUTPUT_TOKENS = int(os.getenv("CONTEXT_TOOL_OUTPUT_TOKENS", 300))
+# Once over budget, fold old turns until under this share of it, so the summary
+# is reused for the next few turns instead of being rebuilt on every call
+CONTEXT_LOW_WATER = 0.6
+# Per-message overhead of the chat format
+MESSAGE_OVERHEAD_TOKENS = 4
+SUMMARY_PREFIX = "Summary of the earlier conversation:\n"
+# What the assistant re-prompts with after an empty reply; it does not start a turn
+RETRY_PROMPT = "Respond with a real output."
+# Stands in for the result of a tool call whose run was cancelled before it returned
+CANCELLED_TOOL_OUTPUT = (
+    "[Tool call cancelled before it returned. Call the tool again if its result is "
+    "still needed.]"
+)
+
+summary_prompt = ChatPromptTemplate.from_messages(
+    [
+        (
+            "system",
+            "You keep the memory of a travel assistant's conversation with a user. "
+            "Update the summary with the new messages. Keep the user's destinations, dates, "
+            "travellers, budget and preferences, and the flights and hotels that were "
+            "found or chosen with their prices. Drop small talk. Use at most 200 words."
+            "\n\nCurrent summary:\n{summary}\n\nNew messages:\n{transcript}",
+        ),
+    ]
+)
+
+_token_counts = TTLCache("context_tokens", max_entries=8192)
+_summaries = TTLCache("context_summaries", max_entries=1024, default_ttl=24 * 3600)
+
+
+def _message_key(message: AnyMessage) -> str:
+    return message.id or make_key(message.type, message.content)
+
+
+def _content_text(message: AnyMessage) -> str:
+    content = message.content
+    if isinstance(content, str):
+        return content
+    return "".join(
+        block.get("text", "") if isinstance(block, dict) else str(block)
+        for block in content
+    )
+
+
+def _fingerprint(message: AnyMessage) -> list:
+    fingerprint = [message.type, _content_text(message)]
+    if isinstance(message, AIMessage):
+        fingerprint.append([tc.get("id") for tc in message.tool_calls])
+    elif isinstance(message, ToolMessage):
+        fingerprint.append(message.tool_call_id)
+    return fingerprint
+
+
+def _boundary_keys(turns: List[List[AnyMessage]]) -> List[str]:
+    """
+    Summary cache keys for folding the first 1, 2, ... of `turns`. Each key covers
+    every message up to the end of its turn, so a summary is only reused for the
+    exact same conversation prefix.
+    """
+    keys, key = [], ""
+    for turn in turns:
+        key = make_key(key, [_fingerprint(message) for message in turn])
+        keys.append(key)
+    return keys
+
+
+def message_tokens(message: AnyMessage) -> int:
+    text = _content_text(message)
+    # Elided copies keep the message id, so the length is part of the key
+    key = f"{_message_key(message)}:{len(text)}"
+    tokens = _token_counts.get(key)
+    if tokens is MISSING:
+        if isinstance(message, AIMessage) and message.tool_calls:
+            text += json.dumps([(tc["name"], tc["args"]) for tc in message.tool_calls])
+        tokens = count_tokens(text) + MESSAGE_OVERHEAD_TOKENS
+        _token_counts.set(key, tokens)
+    return tokens
+
+
+def _is_retry_prompt(message: AnyMessage) -> bool:
+    return isinstance(message, HumanMessage) and message.content == RETRY_PROMPT
+
+
+def _split_turns(messages: List[AnyMessage]) -> List[List[AnyMessage]]:
+    """
+    Groups messages into turns that each start at a user message. An assistant's
+    tool calls and their tool results always sit in the same turn, and so does the
+    assistant's re-prompt after an empty reply.
+    """
+    turns: List[List[AnyMessage]] = []
+    for message in messages:
+        starts_turn = isinstance(message, HumanMessage) and not _is_retry_prompt(message)
+        if starts_turn or not turns:
+            turns.append([])
+        turns[-1].append(message)
+    return turns
+
+
+def _answer_dangling_tool_calls(messages: List[AnyMessage]) -> List[AnyMessage]:
+    """
+    Adds a cancelled result after every tool call that has none. A run cancelled in
+    the tools node leaves such calls in the checkpoint, and the model API rejects a
+    history where a tool call is not followed by its result.
+    """
+    answered = {
+        message.tool_call_id for message in messages if isinstance(message, ToolMessage)
+    }
+    if all(
+        tc["id"] in answered
+        for message in messages
+        if isinstance(message, AIMessage)
+        for tc in message.tool_calls
+    ):
+        return messages
+
+    patched = []
+    for message in messages:
+        patched.append(message)
+        if not isinstance(message, AIMessage):
+            continue
+        for tc in message.tool_calls:
+            if tc["id"] not in answered:
+                logger.warning("Answering dangling tool call %s (%s)", tc["id"], tc["name"])
+                patched.append(
+                    ToolMessage(
+                        content=CANCELLED_TOOL_OUTPUT, tool_call_id=tc["id"], name=tc["name"]
+                    )
+                )
+    return patched
+
+
+def _elide(message: ToolMessage) -> ToolMessage:
+    return message.model_copy(
+        update={
+            "content": f"[{message.name or 'Tool'} result from an earlier turn removed "
+            "to save space. Call the tool again if its details are needed.]"
+        }
+    )
+
+
+def _transcript(turns: List[List[AnyMessage]], max_chars: int = 600) -> str:
+    lines = []
+    for turn in turns:
+        for message in turn:
+            text = _content_text(message)
+            if isinstance(message, HumanMessage):
+                lines.append(f"User: {text}")
+            elif isinstance(message, ToolMessage):
+                lines.append(f"Tool {message.name}: {text[:max_chars]}")
+            elif isinstance(message, AIMessage):
+                for tc in message.tool_calls:
+                    lines.append(f"Assistant called {tc['name']} with {json.dumps(tc['args'])}")
+                if text:
+                    lines.append(f"Assistant: {text}")
+    return "\n".join(lines)
+
+
+class ContextStats:
+    def __init__(self):
+        self.calls = 0
+        self.trimmed_calls = 0
+        self.tokens_in = 0
+        self.tokens_out = 0
+        self.elided_outputs = 0
+        self.summary_hits = 0
+        self.summary_misses = 0
+
+    def snapshot(self) -> dict:
+        return {
+            "calls": self.calls,
+            "trimmed_calls": self.trimmed_calls,
+            "tokens_in": self.tokens_in,
+            "tokens_out": self.tokens_out,
+            "elided_outputs": self.elided_outputs,
+            "summary_hits": self.summary_hits,
+            "summary_misses": self.summary_misses,
+        }
+
+
+context_stats = ContextStats()
+
+
+class ContextManager:
+    """
+    Fits the conversation into a token budget before it is sent to the model:
+        1. Large tool outputs from older turns are elided, oldest first.
+        2. If that is not enough, the oldest turns are folded into a running summary.
+           Summaries are cached by the messages they cover, so each fold only
+           summarizes the turns added since the previous one.
+        3. The last `keep_turns` turns are kept as they are, and as a last resort only
+           their older tool outputs are elided; the current turn is never touched.
+    Turns are cut at user messages, so tool calls and tool results stay paired. Tool
+    calls left without a result by a cancelled run are answered as cancelled first.
+    """
+
+    def __init__(
+        self,
+        max_tokens: int = CONTEXT_MAX_TOKENS,
+        keep_turns: int = CONTEXT_KEEP_TURNS,
+        tool_output_tokens: int = CONTEXT_TOOL_OUTPUT_TOKENS,
+    ):
+        self.max_tokens = max_tokens
+        self.keep_turns = max(keep_turns, 1)
+        self.tool_output_tokens = tool_output_tokens
+
+    def _turn_tokens(self, turn: List[AnyMessage]) -> int:
+        return sum(message_tokens(message) for message in turn)
+
+    def _elide_outputs(self, turns, total: int, target: int) -> int:
+        for turn in turns:
+            for index, message in enumerate(turn):
+                if total <= target:
+                    return total
+                if (
+                    isinstance(message, ToolMessage)
+                    and message_tokens(message) > self.tool_output_tokens
+                ):
+                    elided = _elide(message)
+                    total -= message_tokens(message) - message_tokens(elided)
+                    turn[index] = elided
+                    context_stats.elided_outputs += 1
+        return total
+
+    def _summarize(self, summary: str, turns: List[List[AnyMessage]]) -> Optional[str]:
+        # No callbacks, so the summary is not streamed to the user as assistant output
+        try:
+            return llm.invoke(
+                summary_prompt.format_messages(
+                    summary=summary or "(none)", transcript=_transcript(turns)
+                ),
+                config={"callbacks": [], "run_name": "context_summary"},
+            ).content
+        except Exception as e:
+            logger.warning("Error summarizing conversation: %s", e)
+            return None
+
+    def _fold(
+        self, turns, tokens: List[int], boundary_keys: List[str], budget: int
+    ) -> tuple[int, str]:
+        """
+        Picks how many leading turns to replace with a summary and returns that count
+        with the summary text. Reuses the latest cached summary that fits the budget.
+        """
+        foldable = len(turns) - self.keep_turns
+
+        # Latest fold point that already has a summary
+        cached_count, summary = 0, ""
+        for count in range(foldable, 0, -1):
+            cached = _summaries.get(boundary_keys[count - 1])
+            if cached is not MISSING:
+                cached_count, summary = count, cached
+                break
+
+        if cached_count and (
+            cached_count == foldable
+            or sum(tokens[cached_count:]) + count_tokens(summary) <= budget
+        ):
+            context_stats.summary_hits += 1
+            return cached_count, summary
+
+        # Fold further, down to the low-water mark so the next turns reuse this summary
+        target = int(budget * CONTEXT_LOW_WATER)
+        count = cached_count + 1
+        while count < foldable and sum(tokens[count:]) > target:
+            count += 1
+
+        context_stats.summary_misses += 1
+        new_summary = self._summarize(summary, turns[cached_count:count])
+        if new_summary is None:
+            # Drop the folded turns rather than blow the budget
+            return count, summary
+        _summaries.set(boundary_keys[count - 1], new_summary)
+        return count, new_summary
+
+    def over_budget(self, messages: List[AnyMessage]) -> bool:
+        return sum(message_tokens(message) for message in messages) > self.max_tokens
+
+    def trim(self, messages: List[AnyMessage]) -> List[AnyMessage]:
+        context_stats.calls += 1
+        messages = _answer_dangling_tool_calls(messages)
+        tokens_in = sum(message_tokens(message) for message in messages)
+        context_stats.tokens_in += tokens_in
+        if tokens_in <= self.max_tokens:
+            context_stats.tokens_out += tokens_in
+            return messages
+
+        start = time.perf_counter()
+        turns = [list(turn) for turn in _split_turns(messages)]
+        old_turns = turns[: -self.keep_turns]
+        # Keyed on the messages as sent, before any of their outputs are elided
+        boundary_keys = _boundary_keys(old_turns)
+        total = self._elide_outputs(old_turns, tokens_in, self.max_tokens)
+
+        summary = ""
+        if total > self.max_tokens and len(turns) > self.keep_turns:
+            tokens = [self._turn_tokens(turn) for turn in turns]
+            folded, summary = self._fold(turns, tokens, boundary_keys, self.max_tokens)
+            turns = turns[folded:]
+            total = sum(tokens[folded:]) + count_tokens(summary)
+
+        if total > self.max_tokens:
+            total = self._elide_outputs(turns[:-1], total, self.max_tokens)
+
+        trimmed = [message for turn in turns for message in turn]
+        if summary:
+            trimmed.insert(0, SystemMessage(content=SUMMARY_PREFIX + summary))
+
+        context_stats.trimmed_calls += 1
+        context_stats.tokens_out += total
+        logger.info(
+            "Trimmed context from %d to %d tokens (%d -> %d messages) in %.1f ms",
+            tokens_in,
+            total,
+            len(messages),
+            len(trimmed),
+            (time.perf_counter() - start) * 1000,
+        )
+        return trimmed
+
+
+context_manager = ContextManager()
+
+
+def prepare_context(state: dict) -> dict:
+    """Runs before the assistant prompt; the graph state itself is left untouched."""
+    # The assistant's re-prompt appends plain ("user", ...) tuples
+    messages = convert_to_messages(state["messages"])
+    return {**state, "messages": context_manager.trim(messages)}
+
+
+async def aprepare_context(state: dict) -> dict:
+    """
+    Async version of prepare_context. Within budget it runs inline; trimming may call
+    the model for a summary, so that runs in a worker thread.
+    """
+    messages = convert_to_messages(state["messages"])
+    if not context_manager.over_budget(messages):
+        return {**state, "messages": context_manager.trim(messages)}
+    return {**state, "messages": await asyncio.to_thread(context_manager.trim, messages)}
@@ -0,0 +1,315 @@
+import json
+import os
+import re
+import threading
+import unicodedata
+import uuid
+from typing import Any, AsyncIterator, Iterator, List, Optional
+
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForLLMRun,
+    CallbackManagerForLLMRun,
+)
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import (
+    AIMessage,
+    AIMessageChunk,
+    BaseMessage,
+    HumanMessage,
+    message_to_dict,
+    messages_from_dict,
+)
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import Runnable
+from pydantic import ConfigDict
+
+from utils.cache import MISSING, TTLCache, make_key
+
+# "0" turns the response cache off
+LLM_CACHE = os.getenv("LLM_CACHE", "1").lower() not in ("0", "false", "no")
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", 24 * 3600))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", 2048))
+# Questions about what is happening right now are always sent to the model. Dates
+# stay in the key, so "tomorrow" or "this weekend" are safe to cache for the day.
+LLM_CACHE_BYPASS_PATTERN = (
+    os.getenv("LLM_CACHE_BYPASS_PATTERN")
+    or r"\b(now|right now|latest|current|currently|live)\b"
+)
+
+# Config metadata key; {"metadata": {"llm_cache": False}} skips the cache for a run
+CACHE_METADATA_KEY = "llm_cache"
+
+_bypass_re = re.compile(LLM_CACHE_BYPASS_PATTERN, re.IGNORECASE)
+# Times of day in prompts (e.g. the assistant's "Current time"), dropped from the
+# normalized key so answers are shared for the rest of the day
+_TIME_OF_DAY_RE = re.compile(r"(\d{4}-\d{2}-\d{2})[ T]\d{2}:\d{2}(:\d{2}(\.\d+)?)?")
+# Cached text is replayed in word-sized pieces when the caller is streaming
+_PIECE_RE = re.compile(r"\s*\S+|\s+")
+
+llm_cache = TTLCache(
+    "llm",
+    max_entries=LLM_CACHE_MAX_ENTRIES,
+    default_ttl=LLM_CACHE_TTL,
+    db_path=os.getenv("LLM_CACHE_DB") or None,
+)
+
+
+class LLMCacheStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.exact_hits = 0
+        self.normalized_hits = 0
+        self.bypassed = 0
+        self.stores = 0
+
+    def add(self, **counts):
+        with self._lock:
+            for name, count in counts.items():
+                setattr(self, name, getattr(self, name) + count)
+
+    def snapshot(self) -> dict:
+        hits = self.exact_hits + self.normalized_hits
+        return {
+            "lookups": self.lookups,
+            "exact_hits": self.exact_hits,
+            "normalized_hits": self.normalized_hits,
+            "misses": self.lookups - hits,
+            "bypassed": self.bypassed,
+            "stores": self.stores,
+            "hit_rate": hits / self.lookups if self.lookups else None,
+        }
+
+
+llm_cache_stats = LLMCacheStats()
+
+
+def _content_text(content) -> str:
+    if isinstance(content, str):
+        return content
+    return "".join(
+        block.get("text", "") if isinstance(block, dict) else str(block)
+        for block in content
+    )
+
+
+def normalize_prompt_text(text: str) -> str:
+    text = unicodedata.normalize("NFKC", text)
+    text = _TIME_OF_DAY_RE.sub(r"\1", text)
+    return " ".join(text.split())
+
+
+def _prompt_parts(messages: List[BaseMessage], normalized: bool) -> list:
+    """
+    The parts of the prompt that decide the reply. Message and tool call ids are
+    left out, they are random per run and the model never acts on them.
+    """
+    parts = []
+    for message in messages:
+        content = message.content
+        if normalized:
+            content = normalize_prompt_text(_content_text(content))
+        part = [message.type, content]
+        if isinstance(message, AIMessage) and message.tool_calls:
+            part.append([[tc["name"], tc["args"]] for tc in message.tool_calls])
+        parts.append(part)
+    return parts
+
+
+def _cacheable(message: BaseMessage) -> bool:
+    # Empty replies are re-prompted by the assistant, and cut off replies are incomplete
+    finish_reason = message.response_metadata.get("finish_reason")
+    return bool(message.content or message.tool_calls) and finish_reason != "length"
+
+
+def _replay_chunks(message: AIMessage) -> Iterator[ChatGenerationChunk]:
+    """Splits a cached reply into chunks like the ones the model streams."""
+    text = _content_text(message.content)
+    for piece in _PIECE_RE.findall(text):
+        yield ChatGenerationChunk(message=AIMessageChunk(content=piece))
+    if message.tool_calls:
+        yield ChatGenerationChunk(
+            message=AIMessageChunk(
+                content="",
+                tool_call_chunks=[
+                    {
+                        "name": tc["name"],
+                        "args": json.dumps(tc["args"]),
+                        "id": tc["id"],
+                        "index": index,
+                        "type": "tool_call_chunk",
+                    }
+                    for index, tc in enumerate(message.tool_calls)
+                ],
+            )
+        )
+    yield ChatGenerationChunk(
+        message=AIMessageChunk(content="", response_metadata=message.response_metadata)
+    )
+
+
+class CachedChatModel(BaseChatModel):
+    """
+    Serves repeated prompts from a response cache in front of a chat model.
+
+    The key covers the model's parameters (including bound tools), and the messages
+    either exactly or normalized (Unicode form, whitespace, time of day); the exact
+    key is tried first. Replies are stored under both. A hit on a streaming call is
+    replayed as token chunks, so callers of astream_events see the same events as for
+    a model reply. Prompts whose last user message matches LLM_CACHE_BYPASS_PATTERN,
+    and runs with {"llm_cache": False} in their config metadata, skip the cache.
+    """
+
+    model: BaseChatModel
+    cache_store: Any = None
+    ttl: Optional[float] = None
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    def __init__(self, **kwargs):
+        # The model's own cache would be consulted under a different key
+        kwargs.setdefault("cache", False)
+        kwargs.setdefault("cache_store", llm_cache)
+        super().__init__(**kwargs)
+
+    @property
+    def _llm_type(self) -> str:
+        return f"cached-{self.model._llm_type}"
+
+    @property
+    def _identifying_params(self) -> dict:
+        return self.model._identifying_params
+
+    def bind_tools(self, tools, **kwargs) -> Runnable:
+        # Let the model format the tools, then bind the same arguments to this wrapper
+        return self.bind(**self.model.bind_tools(tools, **kwargs).kwargs)
+
+    def _keys(self, messages, stop, run_manager, **kwargs) -> Optional[List[str]]:
+        """The exact and normalized keys, or None when this call must not be cached."""
+        if run_manager and run_manager.metadata.get(CACHE_METADATA_KEY) is False:
+            llm_cache_stats.add(bypassed=1)
+            return None
+        last_user = next(
+            (m for m in reversed(messages) if isinstance(m, HumanMessage)), None
+        )
+        if last_user is not None and _bypass_re.search(_content_text(last_user.content)):
+            llm_cache_stats.add(bypassed=1)
+            return None
+        llm_string = self.model._get_llm_string(stop=stop, **kwargs)
+        return [
+            make_key(llm_string, _prompt_parts(messages, normalized))
+            for normalized in (False, True)
+        ]
+
+    def _hit(self, value: dict, exact: bool) -> AIMessage:
+        llm_cache_stats.add(**{"exact_hits" if exact else "normalized_hits": 1})
+        message = messages_from_dict([value])[0]
+        message.response_metadata["cached"] = True
+        # Fresh tool call ids, as the model would give, so replies never share one
+        for tool_call in message.tool_calls:
+            tool_call["id"] = f"call_{uuid.uuid4().hex[:24]}"
+        return message
+
+    def _lookup(self, keys: List[str]) -> Optional[AIMessage]:
+        llm_cache_stats.add(lookups=1)
+        value = self.cache_store.get(keys[0])
+        if value is not MISSING:
+            return self._hit(value, exact=True)
+        value = self.cache_store.get(keys[1])
+        if value is not MISSING:
+            # Promote, so the next identical prompt is an exact hit
+            self.cache_store.set(keys[0], value, self.ttl)
+            return self._hit(value, exact=False)
+        return None
+
+    async def _alookup(self, keys: List[str]) -> Optional[AIMessage]:
+        llm_cache_stats.add(lookups=1)
+        value = await self.cache_store.aget(keys[0])
+        if value is not MISSING:
+            return self._hit(value, exact=True)
+        value = await self.cache_store.aget(keys[1])
+        if value is not MISSING:
+            await self.cache_store.aset(keys[0], value, self.ttl)
+            return self._hit(value, exact=False)
+        return None
+
+    @staticmethod
+    def _entry(keys: Optional[List[str]], message: BaseMessage) -> Optional[dict]:
+        if keys is None or not _cacheable(message):
+            return None
+        llm_cache_stats.add(stores=1)
+        # Only what a replay needs; ids are per run
+        return message_to_dict(
+            AIMessage(
+                content=message.content,
+                tool_calls=message.tool_calls,
+                response_metadata=message.response_metadata,
+            )
+        )
+
+    def _store(self, keys: Optional[List[str]], message: BaseMessage):
+        entry = self._entry(keys, message)
+        if entry is not None:
+            for key in keys:
+                self.cache_store.set(key, entry, self.ttl)
+
+    async def _astore(self, keys: Optional[List[str]], message: BaseMessage):
+        entry = self._entry(keys, message)
+        if entry is not None:
+            for key in keys:
+                await self.cache_store.aset(key, entry, self.ttl)
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        keys = self._keys(messages, stop, run_manager, **kwargs)
+        cached = self._lookup(keys) if keys else None
+        if cached is not None:
+            return ChatResult(generations=[ChatGeneration(message=cached)])
+        result = self.model._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+        self._store(keys, result.generations[0].message)
+        return result
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        keys = self._keys(messages, stop, run_manager, **kwargs)
+        cached = await self._alookup(keys) if keys else None
+        if cached is not None:
+            return ChatResult(generations=[ChatGeneration(message=cached)])
+        result = await self.model._agenerate(
+            messages, stop=stop, run_manager=run_manager, **kwargs
+        )
+        await self._astore(keys, result.generations[0].message)
+        return result
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        keys = self._keys(messages, stop, run_manager, **kwargs)
+        cached = await self._alookup(keys) if keys else None
+        if cached is not None:
+            for chunk in _replay_chunks(cached):
+                yield chunk
+            return
+
+        reply = None
+        async for chunk in self.model._astream(
+            messages, stop=stop, run_manager=run_manager, **kwargs
+        ):
+            reply = chunk.message if reply is None else reply + chunk.message
+            yield chunk
+        if reply is not None:
+            await self._astore(keys, reply)
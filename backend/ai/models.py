@@ -2,6 +2,8 @@ import os
 from dotenv import load_dotenv
 from langchain_openai import ChatOpenAI
 
+from ai.llm_cache import LLM_CACHE, CachedChatModel
+
 load_dotenv()
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
@@ -23,3 +25,6 @@ trackingConfig = (
 llm = ChatOpenAI(
     model="gpt-4.1-mini", openai_api_key=OPENAI_API_KEY, temperature=0, **trackingConfig
 )
+# Repeated prompts are answered from the response cache (LLM_CACHE=0 to turn it off)
+if LLM_CACHE:
+    llm = CachedChatModel(model=llm)
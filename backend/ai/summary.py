@@ -1,5 +1,21 @@
+import asyncio
+import logging
+import os
+import unicodedata
+from typing import List, Optional
+
 from langchain_core.prompts import ChatPromptTemplate
 from ai.models import llm
+from utils.cache import MISSING, TTLCache, make_key
+from utils.singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# Titles only depend on the input text, so they can be kept for a long time
+SUMMARY_CACHE_TTL = float(os.getenv("SUMMARY_CACHE_TTL", 7 * 24 * 3600))
+SUMMARY_CACHE_MAX_ENTRIES = int(os.getenv("SUMMARY_CACHE_MAX_ENTRIES", 4096))
+# Model calls in flight at once for one batch request
+SUMMARY_BATCH_CONCURRENCY = int(os.getenv("SUMMARY_BATCH_CONCURRENCY", 4))
 
 prompt = ChatPromptTemplate.from_messages(
     [
@@ -13,13 +29,73 @@ prompt = ChatPromptTemplate.from_messages(
     ]
 )
 
+summary_cache = TTLCache(
+    "summaries",
+    max_entries=SUMMARY_CACHE_MAX_ENTRIES,
+    default_ttl=SUMMARY_CACHE_TTL,
+    db_path=os.getenv("SUMMARY_CACHE_DB") or None,
+)
+# Identical inputs summarized at the same time share one model call
+summary_requests = SingleFlight("summaries")
+
+
+def normalize_input(user_input: str) -> str:
+    """Folds case, Unicode forms and whitespace, so trivially different inputs share a title."""
+    return " ".join(unicodedata.normalize("NFKC", user_input).casefold().split())
+
 
 def get_summary(user_input: str) -> str:
     """
     Get a summary of user input in short text to show in the chat list as the title.
     """
+    key = make_key(normalize_input(user_input))
+    cached = summary_cache.get(key)
+    if cached is not MISSING:
+        return cached
+    try:
+        summary = llm.invoke(prompt.format(input=user_input)).content
+    except Exception as e:
+        logger.warning("Error getting summary: %s", e)
+        return None
+    summary_cache.set(key, summary)
+    return summary
+
+
+async def _request_summary(key: str, user_input: str) -> Optional[str]:
     try:
-        return llm.invoke(prompt.format(input=user_input)).content
+        summary = (await llm.ainvoke(prompt.format(input=user_input))).content
     except Exception as e:
-        print(f"Error getting summary: {e}")
+        logger.warning("Error getting summary: %s", e)
         return None
+    await summary_cache.aset(key, summary)
+    return summary
+
+
+async def aget_summary(user_input: str) -> Optional[str]:
+    """Async version of get_summary; failures are not cached."""
+    key = make_key(normalize_input(user_input))
+    cached = await summary_cache.aget(key)
+    if cached is not MISSING:
+        return cached
+    return await summary_requests.ado(key, _request_summary, key, user_input)
+
+
+async def aget_summaries(
+    user_inputs: List[str], concurrency: int = SUMMARY_BATCH_CONCURRENCY
+) -> List[Optional[str]]:
+    """
+    Summarizes many inputs with at most `concurrency` model calls at a time.
+    Returns the summaries in input order, None where one failed. Inputs that
+    normalize the same are summarized once.
+    """
+    semaphore = asyncio.Semaphore(max(concurrency, 1))
+    normalized = [normalize_input(text) for text in user_inputs]
+    unique = dict(zip(normalized, user_inputs))
+
+    async def summarize(user_input: str) -> Optional[str]:
+        async with semaphore:
+            return await aget_summary(user_input)
+
+    summaries = await asyncio.gather(*(summarize(text) for text in unique.values()))
+    by_input = dict(zip(unique, summaries))
+    return [by_input[key] for key in normalized]
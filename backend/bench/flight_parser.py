@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark for FlightScraper._parse_flight_data over a corpus of captured
+Google Flights aria-labels. Checks the parsed output against the expected fixture
+before timing, so a faster parser can never silently change results.
+
+Usage (from the backend directory):
+    python bench/flight_parser.py [--repeat 200]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES_DIR = os.path.join(BACKEND_DIR, "bench", "fixtures")
+sys.path.append(BACKEND_DIR)
+
+from tools.flight_scraper import FlightScraper, to_json
+
+
+def _load_fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _parse(scraper):
+    # Silence the progress prints so they don't dominate the timing
+    with contextlib.redirect_stdout(io.StringIO()):
+        scraper._parse_flight_data()
+    return scraper.parsed_flights
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    labels = _load_fixture("flight_labels.json")
+    expected = _load_fixture("flight_labels_expected.json")
+
+    scraper = FlightScraper("HEL", "LHR")
+    scraper.date = "2025-05-01"
+    scraper.raw_flight_strings = labels
+
+    if to_json(_parse(scraper)) != expected:
+        print("Parsed output does not match flight_labels_expected.json")
+        sys.exit(1)
+
+    timings = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        _parse(scraper)
+        timings.append(time.perf_counter() - start)
+
+    timings.sort()
+    per_label_us = timings[len(timings) // 2] / len(labels) * 1e6
+    print(f"labels: {len(labels)}, flights: {len(expected)}, runs: {args.repeat}")
+    print(f"median per page: {timings[len(timings) // 2] * 1e3:.3f} ms")
+    print(f"min per page:    {timings[0] * 1e3:.3f} ms")
+    print(f"median per label: {per_label_us:.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark for ranking and serializing a multi-date flight search, with the
+flights held as FlightData models versus a FlightTable. The captured page is
+parsed once per date, merged, ranked with every strategy and serialized. Checks
+that both give the same output before timing.
+
+Usage (from the backend directory):
+    python bench/flight_table.py [--days 14] [--repeat 50]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import orjson
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES_DIR = os.path.join(BACKEND_DIR, "bench", "fixtures")
+sys.path.append(BACKEND_DIR)
+
+from tools.flight_data import FlightTable
+from tools.flight_ranking import RANKING_STRATEGIES, rank_flights
+from tools.flight_scraper import FlightScraper, to_json
+
+
+def _parse_days(labels, days):
+    tables = []
+    for day in range(days):
+        scraper = FlightScraper("HEL", "LHR")
+        scraper.date = f"2025-05-{day + 1:02d}"
+        scraper.raw_flight_strings = labels
+        scraper._parse_flight_data()
+        tables.append(scraper.parsed_flights)
+    return tables
+
+
+def _models(tables):
+    flights = []
+    for table in tables:
+        flights.extend(table.to_flight_data())
+    return [orjson.dumps(to_json(rank_flights(flights, s, 20))) for s in RANKING_STRATEGIES]
+
+
+def _table(tables):
+    flights = FlightTable.concat(tables)
+    return [orjson.dumps(rank_flights(flights, s, 20).to_dicts()) for s in RANKING_STRATEGIES]
+
+
+def _time(fn, tables, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(tables)
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return timings[len(timings) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--days", type=int, default=14)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    with open(os.path.join(FIXTURES_DIR, "flight_labels.json"), encoding="utf-8") as f:
+        labels = json.load(f)
+    tables = _parse_days(labels, args.days)
+
+    if _models(tables) != _table(tables):
+        print("FlightTable output does not match the FlightData output")
+        sys.exit(1)
+
+    # The models path includes building the models, as the scraper used to per flight
+    flights = sum(len(table) for table in tables)
+    print(f"days: {args.days}, flights: {flights}, runs: {args.repeat}")
+    for name, fn in (("FlightData models", _models), ("FlightTable", _table)):
+        median = _time(fn, tables, args.repeat)
+        print(f"{name:<20} {median * 1e3:8.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Throughput benchmark for the chat stream SSE encoding. Replays a synthetic assistant
+response (model tokens, tool call chunks, tool start/end) through the previous
+json.dumps-per-event encoding and through encode_stream with coalescing off and on,
+and reports events/s, bytes/s and the number of writes. Checks that every variant
+decodes to the same text and tool arguments before timing.
+
+Usage (from the backend directory):
+    python bench/sse_encoder.py [--tokens 20000] [--repeat 5]
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BACKEND_DIR)
+
+from utils.sse import SSEEncoder, encode_stream
+
+WORDS = "Here are the cheapest flights from Helsinki to London on 1 May , with Finnair and British Airways ".split()
+
+
+def _events(tokens):
+    events = [{"type": "thread", "thread_id": "stream_bench"}]
+    args = json.dumps({"origin": "HEL", "destination": "LHR", "date": "2025-05-01"})
+    for i in range(0, len(args), 4):
+        events.append(
+            {
+                "type": "tool_call_chunk",
+                "chunk": {
+                    "name": "search_flights" if i == 0 else None,
+                    "args": args[i : i + 4],
+                    "id": "call_1" if i == 0 else None,
+                    "index": 0,
+                    "type": "tool_call_chunk",
+                },
+            }
+        )
+    events.append({"type": "tool_start", "name": "search_flights", "input": json.loads(args)})
+    events.append({"type": "tool_end", "name": "search_flights"})
+    for i in range(tokens):
+        events.append({"type": "token", "content": WORDS[i % len(WORDS)] + " "})
+    events.append({"type": "end"})
+    return events
+
+
+def _legacy(events):
+    # What event_stream wrote before: one json.dumps and one write per event
+    return [f"data: {json.dumps(event)}\n\n".encode() for event in events]
+
+
+async def _source(events):
+    for event in events:
+        yield event
+
+
+async def _encoded(events, coalesce):
+    return [
+        chunk
+        async for chunk in encode_stream(
+            _source(events), encoder=SSEEncoder(coalesce=coalesce)
+        )
+    ]
+
+
+def _decode(writes):
+    text, args = [], []
+    for frame in b"".join(writes).split(b"\n\n"):
+        if not frame.startswith(b"data: "):
+            continue
+        event = json.loads(frame[6:])
+        if event["type"] == "token":
+            text.append(event["content"])
+        elif event["type"] == "tool_call_chunk":
+            args.append(event["chunk"]["args"] or "")
+    return "".join(text), "".join(args)
+
+
+def _time(run, repeat):
+    timings, writes = [], None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        writes = run()
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return timings[len(timings) // 2], writes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--tokens", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    events = _events(args.tokens)
+    variants = {
+        "json.dumps per event": lambda: _legacy(events),
+        "encoder, coalescing off": lambda: asyncio.run(_encoded(events, False)),
+        "encoder, coalescing on": lambda: asyncio.run(_encoded(events, True)),
+    }
+
+    expected = _decode(_legacy(events))
+    print(f"events: {len(events)}, runs: {args.repeat}")
+    for name, run in variants.items():
+        elapsed, writes = _time(run, args.repeat)
+        if _decode(writes) != expected:
+            print(f"{name}: decoded stream does not match")
+            sys.exit(1)
+        size = sum(len(write) for write in writes)
+        print(
+            f"{name:<24} {len(events) / elapsed:>12,.0f} events/s "
+            f"{size / elapsed / 1e6:>8.1f} MB/s "
+            f"{len(writes):>7} writes {size:>9} bytes"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -10,7 +10,8 @@ import datetime
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 # Import the backend modules
-from tools.flight_scraper import FlightScraper, to_json, to_markdown
+from tools.flight_scraper import to_json, to_markdown
+from tools.flight_search import fetch_round_trip, pair_round_trips
 from tools.hotel_scraper import get_hotel_details
 from ai.summary import get_summary
 
@@ -344,18 +345,17 @@ class Debug:
             seat_class = getattr(args, "seat_class", "economy")
             direct = getattr(args, "direct", False)
 
-            scraper = FlightScraper(
+            outbound_flights, return_flights = await fetch_round_trip(
                 args.origin,
                 args.destination,
+                args.start_date,
+                args.end_date,
                 args.num_guests,
                 seat_class,
                 direct,
             )
-            outbound_flights = scraper.get_flight_details(args.start_date)
             outbound_flights_json = to_json(outbound_flights)
             outbound_flights_str = to_markdown(outbound_flights)
-
-            return_flights = scraper.get_flight_details(args.end_date)
             return_flights_json = to_json(return_flights)
             return_flights_str = to_markdown(return_flights)
 
@@ -368,7 +368,11 @@ class Debug:
             # Save results to file (pass the dict version)
             self._save_results_to_file(
                 "flight_results",
-                {"outbound": outbound_flights_json, "return": return_flights_json},
+                {
+                    "outbound": outbound_flights_json,
+                    "return": return_flights_json,
+                    "pairs": pair_round_trips(outbound_flights, return_flights),
+                },
             )
 
         except Exception as e:
@@ -378,7 +382,7 @@ class Debug:
         try:
             print(f"Searching for hotels in {args.destination}...")
 
-            results = get_hotel_details(
+            results = await get_hotel_details(
                 args.destination,
                 args.start_date,
                 args.end_date,
@@ -1,19 +1,104 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import List, Dict, Any
+from pydantic import BaseModel, Field
+from typing import List, Dict, Any, Optional
+import asyncio
+import logging
+import time
 import uuid
-import json
-from starlette.responses import StreamingResponse
+from starlette.responses import PlainTextResponse, StreamingResponse
 from langchain_core.messages import (
     HumanMessage,
     AIMessage,
     ToolMessage,
     BaseMessage,
 )
-from ai.summary import get_summary
+from ai.summary import aget_summaries, aget_summary, summary_cache, summary_requests
 from ai.assistant import (
+    assistant_stats,
+    athread_exists,
     graph as assistant_graph,
+    is_fallback,
+    memory,
+)
+from ai.context import context_stats
+from ai.llm_cache import llm_cache, llm_cache_stats
+from tasks import task_manager
+from tools.brightdata_api import serp_cache, serp_searches
+from tools.flight_scraper import flight_searches
+from tools.search_tasks import submit_flight_search, submit_hotel_search
+from tools.serp_poller import poll_stats
+from tools.web_search import web_search_cache, web_search_limiter, web_searches
+from utils.http import close_async_clients
+from utils.log import log_payload, setup_logging
+from utils.metrics import register_stats, render_metrics
+from utils.projection import get_projection_stats
+from utils.sse import SSEEncoder, encode_event, encode_stream, sse_stats
+from utils.tracing import chat_stream_seconds, chat_ttft_seconds, start_trace
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# Stats the components already keep, exported on /api/metrics: counters for the fields
+# that only ever grow, gauges for the rest
+SINGLEFLIGHT_COUNTERS = ("calls", "executions", "coalesced")
+CACHE_COUNTERS = ("hits", "disk_hits", "misses", "evictions", "expirations", "sets")
+
+register_stats(
+    "assistant",
+    assistant_stats.snapshot,
+    counters=("calls", "empty_replies", "gave_up", "timed_out"),
+)
+register_stats(
+    "context",
+    context_stats.snapshot,
+    counters=(
+        "calls",
+        "trimmed_calls",
+        "tokens_in",
+        "tokens_out",
+        "elided_outputs",
+        "summary_hits",
+        "summary_misses",
+    ),
+)
+register_stats(
+    "checkpoint", memory.stats, counters=("evicted_threads", "pruned_checkpoints")
+)
+register_stats(
+    "projection",
+    get_projection_stats,
+    by="tool",
+    counters=("calls", "items_in", "items_out", "bytes_saved", "tokens_saved"),
+)
+for searches in (serp_searches, flight_searches, summary_requests, web_searches):
+    register_stats(
+        "singleflight", searches.stats, counters=SINGLEFLIGHT_COUNTERS, name=searches.name
+    )
+for cache in (serp_cache, summary_cache, llm_cache, web_search_cache):
+    register_stats(
+        "cache", cache.stats.snapshot, counters=CACHE_COUNTERS, namespace=cache.namespace
+    )
+register_stats(
+    "llm_cache",
+    llm_cache_stats.snapshot,
+    counters=("lookups", "exact_hits", "normalized_hits", "misses", "bypassed", "stores"),
+)
+register_stats(
+    "serp_poll",
+    poll_stats.snapshot,
+    counters=("completed", "timed_out", "failed", "polls"),
+)
+register_stats(
+    "web_search_rate_limit",
+    web_search_limiter.stats,
+    counters=("waits", "waited_seconds"),
+)
+register_stats(
+    "sse", sse_stats.snapshot, counters=("events", "frames", "bytes", "heartbeats")
+)
+register_stats(
+    "background_tasks", task_manager.stats, counters=("submitted", "evicted")
 )
 
 app = FastAPI(title="AI Travel Companion API")
@@ -28,14 +113,51 @@ app.add_middleware(
 )
 
 
+@app.on_event("shutdown")
+async def shutdown():
+    await close_async_clients()
+    task_manager.shutdown()
+
+
 class StreamRequest(BaseModel):
+    # Only the new messages when resuming `thread_id`, the whole conversation when
+    # starting a thread or when `full_history` is set
     messages: List[Dict[str, Any]]
+    thread_id: Optional[str] = None
+    full_history: bool = False
 
 
 class SummaryRequest(BaseModel):
     user_input: str
 
 
+class SummaryBatchRequest(BaseModel):
+    user_inputs: List[str] = Field(max_length=100)
+
+
+class FlightSearchTaskRequest(BaseModel):
+    origin_airport_code: str
+    destination_airport_code: str
+    start_date: str
+    # Searches every day up to and including end_date when set
+    end_date: Optional[str] = None
+    num_guests: int = 1
+    seat_class: str = "economy"
+    direct: bool = False
+    ranking: str = "cheapest"
+    top_k: int = Field(default=5, ge=1, le=50)
+
+
+class HotelSearchTaskRequest(BaseModel):
+    location: str
+    checkin_date: str
+    checkout_date: str
+    num_guests: int = 1
+    currency: str = "USD"
+    free_cancellation: bool = False
+    accommodation_types: List[str] = ["hotel"]
+
+
 def _convert_message_dicts_to_objects(
     messages: List[Dict[str, Any]],
 ) -> List[BaseMessage]:
@@ -52,7 +174,7 @@ def _convert_message_dicts_to_objects(
             if role == "assistant":
                 pass
             else:
-                print(f"Skipping message with empty content and no tool calls: {msg}")
+                logger.warning("Skipping message with empty content and no tool calls")
                 continue
 
         if role == "user":
@@ -76,7 +198,7 @@ def _convert_message_dicts_to_objects(
                             }
                         )
                     else:
-                        print(f"Warning: Invalid tool_call format skipped: {tc}")
+                        logger.warning("Invalid tool_call format skipped: %s", tc)
                 if valid_tool_calls:
                     output_messages.append(
                         AIMessage(content=content or "", tool_calls=valid_tool_calls)
@@ -92,11 +214,11 @@ def _convert_message_dicts_to_objects(
                     ToolMessage(content=content or "", tool_call_id=tool_call_id)
                 )
             else:
-                print(f"Warning: Tool message missing tool_call_id: {msg}")
+                logger.warning("Tool message missing tool_call_id, skipped")
         else:
-            print(f"Warning: Unrecognized message role '{role}' skipped: {msg}")
+            logger.warning("Unrecognized message role '%s' skipped", role)
 
-    print(f"Converted LangChain messages: {output_messages}")
+    log_payload(logger, "Converted LangChain messages", output_messages)
     return output_messages
 
 
@@ -105,82 +227,213 @@ async def health_check():
     return {"status": "ok", "message": "API is running"}
 
 
+@app.get("/api/metrics")
+async def metrics():
+    """Metrics in the Prometheus text format."""
+    # Some stats query the checkpoint database, so they are collected off the event loop
+    return PlainTextResponse(
+        await asyncio.to_thread(render_metrics),
+        media_type="text/plain; version=0.0.4; charset=utf-8",
+    )
+
+
 @app.post("/api/chat/summary")
 async def get_chat_summary(request: SummaryRequest):
     """Get a short summary of the user's input."""
-    summary = get_summary(request.user_input)
+    summary = await aget_summary(request.user_input)
     if summary:
         return {"summary": summary}
     else:
         raise HTTPException(status_code=500, detail="Failed to get chat summary")
 
 
+@app.post("/api/chat/summaries")
+async def get_chat_summaries(request: SummaryBatchRequest):
+    """
+    Get short summaries of many inputs at once, e.g. to title a chat list.
+    Summaries are returned in input order, null where one could not be made.
+    """
+    return {"summaries": await aget_summaries(request.user_inputs)}
+
+
 @app.post("/api/chat/stream")
 async def stream_chat(request: StreamRequest):
-    """Streams responses for the recommendation assistant using Server-Sent Events."""
-    thread_id = f"stream_{uuid.uuid4()}"
-    print(f"Received stream request, assigning Thread ID: {thread_id}")
+    """
+    Streams responses for the recommendation assistant using Server-Sent Events.
+    Known threads resume from the checkpointer, so clients only send the new message.
+    An unknown thread without the full history is rejected with 409 so the client can
+    resend the whole conversation.
+    """
+    thread_id = request.thread_id
+    resume = bool(thread_id) and not request.full_history
+    known = bool(thread_id) and await athread_exists(thread_id)
+    if resume and not known:
+        raise HTTPException(
+            status_code=409, detail="Unknown thread_id, resend the full history."
+        )
+    if not thread_id or (not resume and known):
+        # Replaying a full history into an existing thread would duplicate it
+        thread_id = f"stream_{uuid.uuid4()}"
+    logger.info(
+        "Received stream request for Thread ID: %s (%s, %d messages)",
+        thread_id,
+        "resumed" if resume else "new",
+        len(request.messages),
+    )
+    received_at = time.perf_counter()
 
     try:
         graph_input = {"messages": _convert_message_dicts_to_objects(request.messages)}
 
         if not graph_input["messages"]:
-            print(f"[Thread {thread_id}] No valid messages found after conversion.")
+            logger.warning("[Thread %s] No valid messages found after conversion.", thread_id)
 
             async def empty_stream():
-                yield f"data: {json.dumps({'type': 'error', 'message': 'No valid messages received.'})}\n\n"
-                yield f"data: {json.dumps({'type': 'end'})}\n\n"
+                yield encode_event({"type": "error", "message": "No valid messages received."})
+                yield encode_event({"type": "end"})
 
             return StreamingResponse(empty_stream(), media_type="text/event-stream")
 
-        async def event_stream():
-            try:
-                async for event in assistant_graph.astream_events(
-                    graph_input,
-                    config={"configurable": {"thread_id": thread_id}},
-                    version="v1",
-                ):
-                    kind = event["event"]
-                    data = event.get("data", {})
-                    name = event.get("name", "")
-
-                    if kind == "on_chat_model_stream":
-                        chunk = data.get("chunk")
-                        if chunk and chunk.content:
-                            yield f"data: {json.dumps({'type': 'token', 'content': chunk.content})}\n\n"
-                        if chunk and chunk.tool_call_chunks:
-                            for tool_chunk in chunk.tool_call_chunks:
-                                yield f"data: {json.dumps({'type': 'tool_call_chunk', 'chunk': tool_chunk})}\n\n"
-
-                    elif kind == "on_tool_start":
-                        print(
-                            f"\n--\nStarting tool: {name} with inputs: {data.get('input')}\n--"
-                        )
-                        yield f"data: {json.dumps({'type': 'tool_start', 'name': name, 'input': data.get('input')})}\n\n"
+        async def events():
+            yield {"type": "thread", "thread_id": thread_id}
+            # Stays "cancelled" if the client goes away mid-stream
+            status = "cancelled"
+            # Spans from the assistant, tools and upstream calls of this stream land in
+            # `trace`, which is logged as one timing line at the end
+            with start_trace(thread_id, received_at) as trace:
+                try:
+                    first_token = True
+                    async for event in assistant_graph.astream_events(
+                        graph_input,
+                        config={"configurable": {"thread_id": thread_id}},
+                        version="v1",
+                    ):
+                        kind = event["event"]
+                        data = event.get("data", {})
+                        name = event.get("name", "")
 
-                    elif kind == "on_tool_end":
-                        print(
-                            f"\n--\nEnded tool: {name}\nTool output was: {data.get('output')}\n--"
-                        )
-                        yield f"data: {json.dumps({'type': 'tool_end', 'name': name })}\n\n"
+                        if kind == "on_chat_model_stream":
+                            chunk = data.get("chunk")
+                            if chunk and chunk.content:
+                                if first_token:
+                                    first_token = False
+                                    now = time.perf_counter()
+                                    chat_ttft_seconds.observe(now - received_at)
+                                    trace.add("first_token", received_at, now - received_at)
+                                yield {"type": "token", "content": chunk.content}
+                            if chunk and chunk.tool_call_chunks:
+                                for tool_chunk in chunk.tool_call_chunks:
+                                    yield {"type": "tool_call_chunk", "chunk": tool_chunk}
 
-            except Exception as e:
-                print(f"[Thread {thread_id}] Error during stream generation: {str(e)}")
-                import traceback
+                        elif kind == "on_chain_end" and name == "assistant":
+                            # The fallback for an empty or timed out reply is not streamed
+                            # by the model; only the node's own end event carries it
+                            output = data.get("output")
+                            message = output.get("messages") if isinstance(output, dict) else None
+                            if is_fallback(message) and any(
+                                tag.startswith("graph:step:") for tag in event.get("tags", [])
+                            ):
+                                yield {"type": "token", "content": message.content}
 
-                traceback.print_exc()
-                yield f"data: {json.dumps({'type': 'error', 'message': f'Stream error: {str(e)}'})}\n\n"
-            finally:
-                print(f"[Thread {thread_id}] Stream ended.")
-                yield f"data: {json.dumps({'type': 'end'})}\n\n"
+                        elif kind == "on_tool_start":
+                            logger.info("[Thread %s] Starting tool: %s", thread_id, name)
+                            log_payload(logger, f"Tool {name} input", data.get("input"))
+                            yield {"type": "tool_start", "name": name, "input": data.get("input")}
 
-        return StreamingResponse(event_stream(), media_type="text/event-stream")
+                        elif kind == "on_tool_end":
+                            logger.info("[Thread %s] Ended tool: %s", thread_id, name)
+                            log_payload(logger, f"Tool {name} output", data.get("output"))
+                            yield {"type": "tool_end", "name": name}
+                    status = "ok"
 
-    except Exception as e:
-        print(f"Error initiating recommendation stream: {str(e)}")
-        import traceback
+                except Exception as e:
+                    status = "error"
+                    logger.exception("[Thread %s] Error during stream generation", thread_id)
+                    yield {"type": "error", "message": f"Stream error: {str(e)}"}
+                finally:
+                    chat_stream_seconds.observe(
+                        time.perf_counter() - received_at, status=status
+                    )
+                    logger.info("[Thread %s] Stream ended: %s", thread_id, trace.summary())
+            yield {"type": "end"}
+
+        # Tokens are coalesced into frames and heartbeats keep the connection open
+        # while a tool is running
+        event_stream = encode_stream(events())
+        return StreamingResponse(event_stream, media_type="text/event-stream")
 
-        traceback.print_exc()
+    except Exception as e:
+        logger.exception("Error initiating recommendation stream")
         raise HTTPException(
             status_code=500, detail=f"Failed to start recommendation stream: {str(e)}"
         )
+
+
+def _submit_search(submit, request: BaseModel) -> dict:
+    try:
+        task_id = submit(**request.model_dump())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    task = task_manager.get_task(task_id)
+    logger.info("Submitted %s task %s", task.kind, task_id)
+    return task.to_dict()
+
+
+@app.post("/api/tasks/flights", status_code=202)
+async def submit_flight_search_task(request: FlightSearchTaskRequest):
+    """
+    Starts a flight search, over a range of dates when `end_date` is set, as a
+    background task and returns it at once. Follow it with /api/tasks/{task_id}/events.
+    """
+    return _submit_search(submit_flight_search, request)
+
+
+@app.post("/api/tasks/hotels", status_code=202)
+async def submit_hotel_search_task(request: HotelSearchTaskRequest):
+    """Starts a hotel search as a background task and returns it at once."""
+    return _submit_search(submit_hotel_search, request)
+
+
+@app.get("/api/tasks/{task_id}")
+async def get_task(task_id: str, wait: float = Query(default=0, ge=0, le=60)):
+    """
+    Returns a task with its status, progress and, once completed, its result.
+    With `wait`, holds the request for up to that many seconds until the task finishes.
+    """
+    task = await task_manager.wait(task_id, wait) if wait else task_manager.get_task(task_id)
+    if task is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired task_id")
+    return task.to_dict()
+
+
+@app.delete("/api/tasks/{task_id}")
+async def cancel_task(task_id: str):
+    if task_manager.get_task(task_id) is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired task_id")
+    return {"cancelled": task_manager.cancel(task_id)}
+
+
+@app.get("/api/tasks/{task_id}/events")
+async def stream_task_events(
+    task_id: str,
+    after: int = Query(default=0, ge=0),
+    last_event_id: Optional[int] = Header(default=None),
+):
+    """
+    Streams a task's status and progress events, with partial results, using
+    Server-Sent Events. Each event's id is its sequence number, so a reconnecting
+    client (Last-Event-ID header or `after`) only gets the events it missed. Events
+    already sent before subscribing are replayed; the stream ends with an "end" event
+    once the task has finished.
+    """
+    if task_manager.get_task(task_id) is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired task_id")
+    after = max(after, last_event_id or 0)
+
+    async def events():
+        async for event in task_manager.subscribe(task_id, after):
+            yield event.to_dict()
+        yield {"type": "end"}
+
+    event_stream = encode_stream(events(), SSEEncoder(coalesce=False, id_key="seq"))
+    return StreamingResponse(event_stream, media_type="text/event-stream")
@@ -1,68 +1,481 @@
 from enum import Enum
-from collections import defaultdict
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Callable, Optional
+import asyncio
+import logging
+import os
 import threading
+import time
 import uuid
+import weakref
+
+logger = logging.getLogger(__name__)
+
+# Tasks running at once: threads for sync callables, coroutines per event loop for async ones
+TASK_MAX_WORKERS = int(os.getenv("TASK_MAX_WORKERS", 4))
+# Seconds a finished task's result is kept, and how many tasks are kept at most
+TASK_RESULT_TTL = float(os.getenv("TASK_RESULT_TTL", 3600))
+TASK_MAX_TASKS = int(os.getenv("TASK_MAX_TASKS", 1000))
+# Events kept per task for subscribers that connect late or reconnect
+TASK_MAX_EVENTS = 500
+TASK_SHARDS = 16
+
 
 class TaskStatus(Enum):
     PENDING = "pending"
     PROCESSING = "processing"
     COMPLETED = "completed"
     FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+FINISHED_STATUSES = (TaskStatus.COMPLETED, TaskStatus.FAILED, TaskStatus.CANCELLED)
+
 
 class Task:
-    def __init__(self, status, data=None, error=None):
+    """A snapshot of a task's state."""
+
+    def __init__(
+        self,
+        status,
+        data=None,
+        error=None,
+        task_id=None,
+        kind=None,
+        progress=None,
+        created_at=None,
+        updated_at=None,
+    ):
         self.status = status
         self.data = data
         self.error = error
+        self.id = task_id
+        self.kind = kind
+        self.progress = progress
+        self.created_at = created_at
+        self.updated_at = updated_at
+
+    @property
+    def done(self) -> bool:
+        return self.status in FINISHED_STATUSES
+
+    def to_dict(self) -> dict:
+        return {
+            "task_id": self.id,
+            "kind": self.kind,
+            "status": self.status.value,
+            "progress": self.progress,
+            "data": self.data,
+            "error": self.error,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+        }
+
+
+class TaskEvent:
+    """One change of a task. `seq` increases by one per event of the same task."""
+
+    __slots__ = ("seq", "type", "data", "timestamp")
+
+    def __init__(self, seq: int, type: str, data: dict):
+        self.seq = seq
+        self.type = type
+        self.data = data
+        self.timestamp = time.time()
+
+    def to_dict(self) -> dict:
+        return {"seq": self.seq, "type": self.type, **self.data}
+
+
+class _TaskRecord:
+    __slots__ = (
+        "id",
+        "kind",
+        "status",
+        "data",
+        "error",
+        "progress",
+        "created_at",
+        "updated_at",
+        "finished_at",
+        "events",
+        "seq",
+        "waiters",
+        "handle",
+    )
+
+    def __init__(self, task_id: str, kind: Optional[str], data: Any, max_events: int):
+        self.id = task_id
+        self.kind = kind
+        self.status = TaskStatus.PENDING
+        self.data = data
+        self.error = None
+        self.progress = None
+        self.created_at = self.updated_at = time.time()
+        self.finished_at = None
+        self.events: deque = deque(maxlen=max_events)
+        self.seq = 0
+        # (event loop, future) of coroutines waiting for the next change
+        self.waiters: list = []
+        # The running asyncio.Task or concurrent Future, for cancellation
+        self.handle = None
+
+    @property
+    def done(self) -> bool:
+        return self.status in FINISHED_STATUSES
+
+    def snapshot(self) -> Task:
+        return Task(
+            status=self.status,
+            data=self.data,
+            error=self.error,
+            task_id=self.id,
+            kind=self.kind,
+            progress=self.progress,
+            created_at=self.created_at,
+            updated_at=self.updated_at,
+        )
+
+
+class _Shard:
+    __slots__ = ("lock", "tasks", "last_purge")
 
-class TaskManager:
     def __init__(self):
-        # In-memory storage for task results
-        self.task_results = defaultdict(dict)
-        # Lock for thread-safe operations on task_results
-        self.task_lock = threading.Lock()
+        self.lock = threading.Lock()
+        # Insertion ordered, so the oldest tasks are evicted first
+        self.tasks: "OrderedDict[str, _TaskRecord]" = OrderedDict()
+        self.last_purge = 0.0
+
+
+def _wake(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+
+# (manager, task id) of the task running in this context, for report_progress
+_current_task: ContextVar[Optional[tuple]] = ContextVar("current_task", default=None)
+
+
+def report_progress(progress: Optional[float] = None, message: str = None, data: Any = None):
+    """
+    Reports progress from inside a task run by TaskManager.submit, e.g. a partial
+    result. `progress` is a fraction between 0 and 1. Does nothing outside a task.
+    """
+    current = _current_task.get()
+    if current is not None:
+        manager, task_id = current
+        manager.update_progress(task_id, progress, message, data)
+
 
-    def add_task(self, data=None):
+class TaskManager:
+    """
+    Runs background tasks and keeps their state, results and event history.
+
+    Tasks are spread over sharded locks, so reads and updates of different tasks
+    rarely contend. Finished tasks are dropped `result_ttl` seconds after they end,
+    or sooner, oldest first, once a shard holds more than its share of `max_tasks`;
+    running tasks are never dropped. Callers never need to poll: `wait` resolves when
+    a task finishes and `subscribe` yields each change as it happens, from any
+    thread's updates.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = TASK_MAX_WORKERS,
+        result_ttl: float = TASK_RESULT_TTL,
+        max_tasks: int = TASK_MAX_TASKS,
+        shards: int = TASK_SHARDS,
+        max_events: int = TASK_MAX_EVENTS,
+    ):
+        self.max_workers = max_workers
+        self.result_ttl = result_ttl
+        self.max_tasks = max_tasks
+        self.max_events = max_events
+        self._shards = [_Shard() for _ in range(shards)]
+        self._shard_capacity = max(1, max_tasks // shards)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+        self._semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = (
+            weakref.WeakKeyDictionary()
+        )
+        self.submitted = 0
+        self.evicted = 0
+
+    def _shard(self, task_id: str) -> _Shard:
+        return self._shards[hash(task_id) % len(self._shards)]
+
+    def _evict(self, shard: _Shard, now: float):
+        """Drops expired results, then the oldest finished tasks over capacity. Holds the lock."""
+        dropped = []
+        if now - shard.last_purge > 1.0:
+            shard.last_purge = now
+            for task_id, record in list(shard.tasks.items()):
+                if record.done and now - record.finished_at > self.result_ttl:
+                    dropped.append(shard.tasks.pop(task_id))
+        if len(shard.tasks) > self._shard_capacity:
+            for task_id, record in list(shard.tasks.items()):
+                if len(shard.tasks) <= self._shard_capacity:
+                    break
+                if record.done:
+                    dropped.append(shard.tasks.pop(task_id))
+        self.evicted += len(dropped)
+        return [waiter for record in dropped for waiter in record.waiters]
+
+    def _notify(self, waiters: list):
+        for loop, future in waiters:
+            try:
+                loop.call_soon_threadsafe(_wake, future)
+            except RuntimeError:
+                # The waiter's event loop is closed
+                pass
+
+    def _get_record(self, shard: _Shard, task_id: str) -> Optional[_TaskRecord]:
+        record = shard.tasks.get(task_id)
+        if record is not None and record.done:
+            if time.time() - record.finished_at > self.result_ttl:
+                shard.tasks.pop(task_id)
+                self.evicted += 1
+                return None
+        return record
+
+    def _update(self, task_id: str, event_type: str, event_data: dict, **fields) -> None:
+        shard = self._shard(task_id)
+        with shard.lock:
+            record = self._get_record(shard, task_id)
+            if record is None:
+                raise KeyError(f"Unknown task {task_id}")
+            for name, value in fields.items():
+                setattr(record, name, value)
+            record.updated_at = time.time()
+            if record.done and record.finished_at is None:
+                record.finished_at = record.updated_at
+            record.seq += 1
+            record.events.append(TaskEvent(record.seq, event_type, event_data))
+            waiters, record.waiters = record.waiters, []
+        self._notify(waiters)
+
+    def add_task(self, data=None, kind: Optional[str] = None) -> str:
         """Add a new task to the task manager"""
         task_id = str(uuid.uuid4())
-        with self.task_lock:
-            self.task_results[task_id] = {
-                'status': TaskStatus.PENDING,
-                'data': data,
-                'error': None
-            }
+        record = _TaskRecord(task_id, kind, data, self.max_events)
+        record.seq = 1
+        record.events.append(TaskEvent(1, "status", {"status": record.status.value}))
+        shard = self._shard(task_id)
+        with shard.lock:
+            shard.tasks[task_id] = record
+            waiters = self._evict(shard, time.time())
+        self._notify(waiters)
         return task_id
-        
+
     def update_task_status(self, task_id, status, data=None, error=None):
-        """Thread-safe update of task status"""
-        with self.task_lock:
-            if data is not None:
-                self.task_results[task_id].update({
-                    'status': status,
-                    'data': data
-                })
+        """Thread-safe update of task status. Raises KeyError for unknown or expired tasks."""
+        fields = {"status": status}
+        event = {"status": status.value}
+        if data is not None:
+            fields["data"] = event["data"] = data
+        if error is not None:
+            fields["error"] = event["error"] = error
+        if status == TaskStatus.COMPLETED:
+            fields["progress"] = 1.0
+        self._update(task_id, "status", event, **fields)
+
+    def update_progress(
+        self, task_id, progress: Optional[float] = None, message: str = None, data: Any = None
+    ):
+        """Records progress; `data` is a partial result sent to subscribers, not stored."""
+        event = {}
+        fields = {}
+        if progress is not None:
+            fields["progress"] = event["progress"] = progress
+        if message is not None:
+            event["message"] = message
+        if data is not None:
+            event["data"] = data
+        self._update(task_id, "progress", event, **fields)
+
+    def get_task(self, task_id) -> Optional[Task]:
+        """Thread-safe retrieval of task object; None for unknown or expired tasks."""
+        shard = self._shard(task_id)
+        with shard.lock:
+            record = self._get_record(shard, task_id)
+            return record.snapshot() if record is not None else None
+
+    def get_task_status(self, task_id) -> Optional[TaskStatus]:
+        """Thread-safe retrieval of task status; None for unknown or expired tasks."""
+        task = self.get_task(task_id)
+        return task.status if task is not None else None
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="task"
+                )
+            return self._executor
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.max_workers)
+            self._semaphores[loop] = semaphore
+        return semaphore
+
+    def _finish(self, task_id: str, result: Any = None, error: BaseException = None):
+        try:
+            if isinstance(error, asyncio.CancelledError):
+                self.update_task_status(task_id, TaskStatus.CANCELLED)
             elif error is not None:
-                self.task_results[task_id].update({
-                    'status': status,
-                    'error': error
-                })
+                logger.warning("Task %s failed: %r", task_id, error)
+                self.update_task_status(task_id, TaskStatus.FAILED, error=str(error) or repr(error))
             else:
-                self.task_results[task_id]['status'] = status
-    
-    def get_task(self, task_id):
-        """Thread-safe retrieval of task object"""
-        with self.task_lock:
-            task_data = self.task_results.get(task_id)
-            if not task_data:
-                return None
-            return Task(
-                status=task_data.get('status', TaskStatus.PENDING),
-                data=task_data.get('data'),
-                error=task_data.get('error')
-            )
-                
-    def get_task_status(self, task_id):
-        """Thread-safe retrieval of task status"""
-        with self.task_lock:
-            return self.task_results.get(task_id).get('status', TaskStatus.PENDING)
-        
\ No newline at end of file
+                self.update_task_status(task_id, TaskStatus.COMPLETED, data=result)
+        except KeyError:
+            # Evicted while running
+            pass
+
+    def _run_sync(self, task_id: str, fn: Callable[[], Any]):
+        token = _current_task.set((self, task_id))
+        try:
+            self.update_task_status(task_id, TaskStatus.PROCESSING)
+            result = fn()
+        except BaseException as e:
+            self._finish(task_id, error=e)
+        else:
+            self._finish(task_id, result)
+        finally:
+            _current_task.reset(token)
+
+    async def _run_async(self, task_id: str, fn: Callable[[], Any]):
+        token = _current_task.set((self, task_id))
+        try:
+            async with self._get_semaphore():
+                self.update_task_status(task_id, TaskStatus.PROCESSING)
+                result = await fn()
+        except BaseException as e:
+            # A cancelled task ends here, so the cancellation is not re-raised
+            self._finish(task_id, error=e)
+        else:
+            self._finish(task_id, result)
+        finally:
+            _current_task.reset(token)
+
+    def submit(self, fn: Callable[[], Any], kind: Optional[str] = None, data=None) -> str:
+        """
+        Runs `fn` in the background and returns its task id at once. Coroutine
+        functions (or partials of them) run on the calling event loop, others in the
+        worker thread pool;
+        either way at most `max_workers` run at a time and the rest wait as pending.
+        The return value becomes the task's data; an exception fails the task.
+        """
+        task_id = self.add_task(data, kind)
+        self.submitted += 1
+        if asyncio.iscoroutinefunction(fn):
+            handle = asyncio.get_running_loop().create_task(self._run_async(task_id, fn))
+        else:
+            handle = self._get_executor().submit(self._run_sync, task_id, fn)
+        shard = self._shard(task_id)
+        with shard.lock:
+            record = shard.tasks.get(task_id)
+            if record is not None and not record.done:
+                record.handle = handle
+        return task_id
+
+    def cancel(self, task_id: str) -> bool:
+        """Cancels a submitted task. Running threads cannot be stopped, only pending ones."""
+        shard = self._shard(task_id)
+        with shard.lock:
+            record = self._get_record(shard, task_id)
+            handle = record.handle if record is not None and not record.done else None
+        if handle is None:
+            return False
+        if isinstance(handle, Future):
+            if not handle.cancel():
+                return False
+            self._finish(task_id, error=asyncio.CancelledError())
+            return True
+        handle.get_loop().call_soon_threadsafe(handle.cancel)
+        return True
+
+    def _watch(self, task_id: str, after: int):
+        """
+        Returns the task, its events after `after`, and a future resolving on the next
+        change when there is nothing new yet and the task is still running.
+        """
+        shard = self._shard(task_id)
+        with shard.lock:
+            record = self._get_record(shard, task_id)
+            if record is None:
+                return None, [], None
+            events = [event for event in record.events if event.seq > after]
+            future = None
+            if not events and not record.done:
+                loop = asyncio.get_running_loop()
+                future = loop.create_future()
+                record.waiters.append((loop, future))
+            return record.snapshot(), events, future
+
+    async def wait(self, task_id: str, timeout: Optional[float] = None) -> Optional[Task]:
+        """
+        Waits until the task finishes or `timeout` seconds pass, and returns it either
+        way; check `task.done`. None for unknown or expired tasks.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        after = 0
+        while True:
+            task, events, future = self._watch(task_id, after)
+            if task is None or task.done:
+                return task
+            if events:
+                after = events[-1].seq
+                continue
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                future.cancel()
+                return task
+            try:
+                await asyncio.wait_for(future, remaining)
+            except asyncio.TimeoutError:
+                return self.get_task(task_id)
+
+    async def subscribe(self, task_id: str, after: int = 0) -> AsyncIterator[TaskEvent]:
+        """
+        Yields the task's events after sequence number `after` as they happen, and
+        ends once the task has finished. Events older than the last TASK_MAX_EVENTS
+        are no longer available. Ends at once for unknown or expired tasks.
+        """
+        while True:
+            task, events, future = self._watch(task_id, after)
+            if task is None:
+                return
+            for event in events:
+                yield event
+                after = event.seq
+            if future is not None:
+                await future
+            elif task.done and not events:
+                return
+
+    def stats(self) -> dict:
+        counts = {status.value: 0 for status in TaskStatus}
+        for shard in self._shards:
+            with shard.lock:
+                for record in shard.tasks.values():
+                    counts[record.status.value] += 1
+        return {
+            "tasks": sum(counts.values()),
+            **counts,
+            "submitted": self.submitted,
+            "evicted": self.evicted,
+        }
+
+    def shutdown(self, wait: bool = False):
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=wait, cancel_futures=True)
+                self._executor = None
+
+
+task_manager = TaskManager()
@@ -0,0 +1,93 @@
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langchain_core.runnables import RunnableLambda
+from langchain_core.tools import tool
+from langgraph.graph import START, StateGraph
+from langgraph.prebuilt import tools_condition
+
+from ai.assistant import Assistant, State
+from ai.checkpoint import BoundedMemorySaver
+from ai.context import aprepare_context, prepare_context
+from utils.tools import create_tool_node_with_fallback
+
+
+def _check_tool_calls_answered(messages):
+    """Rejects a history the way the chat completions API does."""
+    pending = set()
+    for message in messages:
+        if isinstance(message, ToolMessage):
+            pending.discard(message.tool_call_id)
+            continue
+        if pending:
+            raise ValueError(f"Tool calls {sorted(pending)} have no result")
+        if isinstance(message, AIMessage):
+            pending = {tc["id"] for tc in message.tool_calls}
+    if pending:
+        raise ValueError(f"Tool calls {sorted(pending)} have no result")
+
+
+def test_resume_after_run_cancelled_in_tools_node():
+    """A run cancelled mid tool call must not break the thread's next turn."""
+    tool_started = asyncio.Event()
+
+    @tool
+    async def search_flights(query: str) -> str:
+        """Search flights."""
+        tool_started.set()
+        await asyncio.sleep(10)
+        return "flights"
+
+    async def model(state):
+        messages = state["messages"]
+        _check_tool_calls_answered(messages)
+        if len(messages) == 1:
+            return AIMessage(
+                content="",
+                tool_calls=[
+                    {"name": "search_flights", "args": {"query": "HEL-LHR"}, "id": "call_1"}
+                ],
+            )
+        return AIMessage(content="Here are some hotels.")
+
+    assistant = Assistant(
+        RunnableLambda(prepare_context, afunc=aprepare_context)
+        | RunnableLambda(lambda state: None, afunc=model)
+    )
+    builder = StateGraph(State)
+    builder.add_node("assistant", RunnableLambda(assistant, afunc=assistant.acall))
+    builder.add_node("tools", create_tool_node_with_fallback([search_flights]))
+    builder.add_edge(START, "assistant")
+    builder.add_conditional_edges("assistant", tools_condition)
+    builder.add_edge("tools", "assistant")
+    memory = BoundedMemorySaver()
+    graph = builder.compile(checkpointer=memory)
+    config = {"configurable": {"thread_id": "cancelled"}}
+
+    async def run():
+        # The client goes away while the tool runs
+        first = asyncio.create_task(
+            graph.ainvoke({"messages": [HumanMessage(content="Flights to London")]}, config)
+        )
+        await tool_started.wait()
+        first.cancel()
+        try:
+            await first
+        except asyncio.CancelledError:
+            pass
+
+        state = await graph.aget_state(config)
+        assert state.values["messages"][-1].tool_calls
+        assert await memory.ahas_thread("cancelled")
+
+        return await graph.ainvoke(
+            {"messages": [HumanMessage(content="Hotels instead")]}, config
+        )
+
+    result = asyncio.run(run())
+    assert result["messages"][-1].content == "Here are some hotels."
@@ -0,0 +1,117 @@
+import asyncio
+import os
+import sqlite3
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.tools import tool
+from langgraph.graph import START, MessagesState, StateGraph
+from langgraph.prebuilt import ToolNode, tools_condition
+
+from ai.checkpoint import SQLiteSaver
+
+KEEP_CHECKPOINTS = 3
+
+
+@tool
+def search_hotels(location: str) -> str:
+    """Search hotels."""
+    return f"Hotels in {location}: " + "Hotel Example, 120 EUR. " * 40
+
+
+def assistant(state: MessagesState):
+    last = state["messages"][-1]
+    if isinstance(last, HumanMessage) and last.content.startswith("hotels in "):
+        call = {
+            "name": "search_hotels",
+            "args": {"location": last.content[len("hotels in ") :]},
+            "id": f"call_{len(state['messages'])}",
+        }
+        return {"messages": [AIMessage(content="", tool_calls=[call])]}
+    return {"messages": [AIMessage(content=f"Reply {len(state['messages'])}")]}
+
+
+def build_graph(saver: SQLiteSaver):
+    builder = StateGraph(MessagesState)
+    builder.add_node("assistant", assistant)
+    builder.add_node("tools", ToolNode([search_hotels]))
+    builder.add_edge(START, "assistant")
+    builder.add_conditional_edges("assistant", tools_condition)
+    builder.add_edge("tools", "assistant")
+    return builder.compile(checkpointer=saver)
+
+
+def _orphans(path: str) -> tuple[list, list]:
+    """Blobs no checkpoint references, and writes of checkpoints that are gone."""
+    saver = SQLiteSaver(path)
+    conn = sqlite3.connect(path)
+    referenced = set()
+    for thread_id, checkpoint_ns, type_, data in conn.execute(
+        "SELECT thread_id, checkpoint_ns, type, checkpoint FROM checkpoints"
+    ):
+        referenced.update(
+            (thread_id, checkpoint_ns, channel, str(version))
+            for channel, version in saver._loads(type_, data)["channel_versions"].items()
+        )
+    blobs = [
+        row
+        for row in conn.execute("SELECT thread_id, checkpoint_ns, channel, version FROM blobs")
+        if row not in referenced
+    ]
+    writes = conn.execute(
+        "SELECT thread_id, checkpoint_id FROM writes WHERE NOT EXISTS ("
+        " SELECT 1 FROM checkpoints c WHERE c.thread_id = writes.thread_id"
+        " AND c.checkpoint_ns = writes.checkpoint_ns"
+        " AND c.checkpoint_id = writes.checkpoint_id)"
+    ).fetchall()
+    conn.close()
+    return blobs, writes
+
+
+def test_multi_turn_graph_on_sqlite(tmp_path):
+    path = str(tmp_path / "checkpoints.sqlite3")
+    saver = SQLiteSaver(path, keep_checkpoints=KEEP_CHECKPOINTS)
+    graph = build_graph(saver)
+    config = {"configurable": {"thread_id": "trip"}}
+    turns = ["hi", "hotels in Paris", "thanks", "hotels in Rome", "bye"]
+
+    async def run():
+        for turn in turns:
+            await graph.ainvoke({"messages": [HumanMessage(content=turn)]}, config)
+        # The other worker's thread goes idle and is purged on the next put
+        await graph.ainvoke(
+            {"messages": [HumanMessage(content="hi")]},
+            {"configurable": {"thread_id": "idle"}},
+        )
+
+    asyncio.run(run())
+    assert saver.has_thread("idle")
+    with sqlite3.connect(path) as conn:
+        conn.execute("UPDATE threads SET updated_at = 0 WHERE thread_id = 'idle'")
+    saver._last_purge = 0
+    graph.invoke({"messages": [HumanMessage(content="one more")]}, config)
+
+    # A new saver on the same file sees the whole conversation, as another worker would
+    reopened = build_graph(SQLiteSaver(path, keep_checkpoints=KEEP_CHECKPOINTS))
+    messages = reopened.get_state(config).values["messages"]
+    humans = [m.content for m in messages if isinstance(m, HumanMessage)]
+    assert humans == turns + ["one more"]
+    assert [m.type for m in messages[2:6]] == ["human", "ai", "tool", "ai"]
+    assert messages[-1].content == f"Reply {len(messages) - 1}"
+
+    history = list(reopened.get_state_history(config))
+    assert len(history) == KEEP_CHECKPOINTS
+    assert history[0].values["messages"] == messages
+    assert [len(state.values["messages"]) for state in history] == sorted(
+        (len(state.values["messages"]) for state in history), reverse=True
+    )
+
+    assert not saver.has_thread("idle")
+    stats = saver.stats()
+    assert stats["threads"] == 1
+    assert stats["checkpoints"] == KEEP_CHECKPOINTS
+    assert stats["evicted_threads"] == 1
+    assert stats["pruned_checkpoints"] > 0
+    assert _orphans(path) == ([], [])
@@ -0,0 +1,45 @@
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.messages import AIMessage
+from langchain_core.tools import tool
+
+from utils.singleflight import SingleFlight
+from utils.tools import create_tool_node_with_fallback, with_timeout
+
+
+def test_timed_out_caller_leaves_follower_with_result():
+    """One chat's tool timing out must not cancel another chat's identical search."""
+    searches = SingleFlight("test")
+
+    async def fetch():
+        await asyncio.sleep(0.3)
+        return "flights"
+
+    @tool
+    async def search(query: str) -> str:
+        """Search."""
+        return await searches.ado(query, fetch)
+
+    impatient = create_tool_node_with_fallback([with_timeout(search, 0.05)])
+    patient = create_tool_node_with_fallback([with_timeout(search, 5)])
+
+    def call(node, call_id):
+        message = AIMessage(
+            content="",
+            tool_calls=[{"name": "search", "args": {"query": "HEL-LHR"}, "id": call_id}],
+        )
+        return node.ainvoke({"messages": [message]})
+
+    async def run():
+        leader = asyncio.create_task(call(impatient, "call_1"))
+        await asyncio.sleep(0.01)
+        return await asyncio.gather(leader, call(patient, "call_2"))
+
+    timed_out, follower = asyncio.run(run())
+    assert "timed out" in timed_out["messages"][0].content
+    assert follower["messages"][0].content == "flights"
+    assert searches.stats()["executions"] == 1
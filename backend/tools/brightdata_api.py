@@ -1,11 +1,46 @@
 from dotenv import load_dotenv
+import logging
 import os
+from functools import cache
 from typing import Dict, Any, Optional
-import requests
-import time
+from urllib.parse import urlsplit, parse_qsl, urlencode
+import httpx
+
+from tools.serp_poller import get_poll_scheduler
+from utils.cache import MISSING, TTLCache, make_key
+from utils.http import get_async_client
+from utils.log import log_payload
+from utils.singleflight import SingleFlight
+from utils.tracing import span, upstream_request_seconds
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# Cache TTLs in seconds per search type; hotel prices move faster than place listings
+SERP_CACHE_TTLS = {
+    "hotels": float(os.getenv("SERP_CACHE_TTL_HOTELS", 15 * 60)),
+    "places": float(os.getenv("SERP_CACHE_TTL_PLACES", 24 * 60 * 60)),
+    "default": float(os.getenv("SERP_CACHE_TTL_DEFAULT", 60 * 60)),
+}
+
+serp_cache = TTLCache(
+    "serp",
+    max_entries=int(os.getenv("SERP_CACHE_MAX_ENTRIES", 512)),
+    db_path=os.getenv("SERP_CACHE_DB") or None,
+)
+
+
+# Identical SERP requests in flight at the same time share one upstream request
+serp_searches = SingleFlight("serp")
+
+
+def _canonical_url(url: str) -> str:
+    """Normalizes a SERP url so equivalent searches share a cache key."""
+    parts = urlsplit(url)
+    query = sorted(parse_qsl(parts.query, keep_blank_values=True))
+    return f"{parts.scheme.lower()}://{parts.netloc.lower()}{parts.path}?{urlencode(query)}"
+
 
 class BrightDataAPI:
     """
@@ -18,41 +53,36 @@ class BrightDataAPI:
         self.api_key = os.getenv("BRIGHT_DATA_API_KEY")
         self.customer_id = os.getenv("BRIGHT_DATA_CUSTOMER_ID")
         self.api_zone = os.getenv("BRIGHT_DATA_API_ZONE")
-        self.session = self._create_session()
-
-    def _create_session(self):
-        headers = {
+        self.headers = {
             "Content-Type": "application/json",
             "Authorization": f"Bearer {self.api_key}",
         }
-        with requests.Session() as session:
-            session.headers = headers
-            session.params = {"customer": self.customer_id, "zone": self.api_zone}
-            return session
+        # Base query params, copied into every request so concurrent polls never share state
+        self.params = {"customer": self.customer_id, "zone": self.api_zone}
 
-    def _poll_results(
-        self, response_id: str, max_retries: int = 5, delay: int = 5
-    ) -> Optional[Dict]:
-        url = f"{self.base_url}/get_result"
-        self.session.params["response_id"] = response_id
-
-        for _ in range(max_retries):
-            response = self.session.get(url)
-            response.raise_for_status()
-            try:
-                data = response.json()
-                print(f"{response_id}: Completed")
-                return data
-            except ValueError as e:
-                print(f"{response_id}: {response.text[:200]}")
-
-            time.sleep(delay)
-
-        print(f"{response_id}: Max retries reached")
-        return None
-
-    def get_serp_results(
-        self, url: str, params: Dict[str, Any] = None
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Connection pool shared by every BrightData request on the running event loop."""
+        return get_async_client("brightdata", headers=self.headers)
+
+    async def _fetch_result(self, response_id: str) -> Optional[Dict]:
+        """Fetches a result once, returning None while it is still being processed."""
+        response = await self.client.get(
+            f"{self.base_url}/get_result",
+            params={**self.params, "response_id": response_id},
+        )
+        response.raise_for_status()
+        try:
+            return response.json()
+        except ValueError:
+            return None
+
+    async def _poll_results(self, response_id: str, timeout: float = 25.0) -> Optional[Dict]:
+        scheduler = get_poll_scheduler(self._fetch_result)
+        return await scheduler.wait_for(response_id, timeout)
+
+    async def get_serp_results(
+        self, url: str, params: Dict[str, Any] = None, search_type: str = "default"
     ) -> Optional[Dict]:
         payload = {"url": url + "&brd_json=1"}
 
@@ -63,22 +93,55 @@ class BrightDataAPI:
             else:
                 payload["url"] += f"?{query_params}"
 
+        cache_key = make_key(search_type, _canonical_url(payload["url"]))
+        cached = await serp_cache.aget(cache_key)
+        if cached is not MISSING:
+            logger.debug("SERP cache hit: %s", payload["url"])
+            return cached
+
+        ttl = SERP_CACHE_TTLS.get(search_type, SERP_CACHE_TTLS["default"])
+        return await serp_searches.ado(
+            cache_key, self._fetch_and_cache, payload, cache_key, ttl
+        )
+
+    async def _fetch_and_cache(
+        self, payload: Dict[str, Any], cache_key: str, ttl: float
+    ) -> Optional[Dict]:
+        results = await self._request_serp_results(payload)
+        if results is not None:
+            await serp_cache.aset(cache_key, results, ttl)
+        return results
+
+    async def _request_serp_results(self, payload: Dict[str, Any]) -> Optional[Dict]:
         try:
-            response = self.session.post(
-                f"{self.base_url}/req",
-                json=payload,
-            )
-            response.raise_for_status()
+            async with span(
+                "upstream:brightdata_request",
+                upstream_request_seconds,
+                upstream="brightdata_request",
+            ):
+                response = await self.client.post(
+                    f"{self.base_url}/req",
+                    params=self.params,
+                    json=payload,
+                )
+                response.raise_for_status()
             data = response.json()
             response_id = data.get("response_id")
             if response_id:
-                print(f"Request: {payload}", f"Response ID: {response_id}")
-                return self._poll_results(response_id)
+                logger.info("SERP request %s submitted", response_id)
+                log_payload(logger, f"SERP request {response_id}", payload)
+                return await self._poll_results(response_id)
             else:
                 raise Exception("No response ID returned")
-        except requests.exceptions.RequestException as e:
-            print(f"HTTP error while fetching SERP results: {e}")
+        except httpx.HTTPError as e:
+            logger.warning("HTTP error while fetching SERP results: %s", e)
             return None
         except Exception as e:
-            print(f"Error fetching SERP results: {e}")
+            logger.warning("Error fetching SERP results: %s", e)
             return None
+
+
+@cache
+def get_brightdata_api() -> BrightDataAPI:
+    """Returns the process-wide BrightDataAPI instance."""
+    return BrightDataAPI()
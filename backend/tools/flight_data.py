@@ -0,0 +1,225 @@
+import sys
+from array import array
+from typing import Iterable, List, Sequence, Tuple
+
+from pydantic import BaseModel
+
+from tools.flight_ranking import (
+    INF,
+    RankColumns,
+    parse_clock_to_minutes,
+    parse_duration_to_minutes,
+)
+
+
+class FlightPrice(BaseModel):
+    amount: int
+    currency: str
+
+
+class FlightStopLocation(BaseModel):
+    city: str
+    airport: str
+    duration: str
+
+
+class FlightData(BaseModel):
+    id: str | None = None
+    departure_date: str | None = None
+    departure_time: str | None = None
+    arrival_date: str | None = None
+    arrival_time: str | None = None
+    origin: str | None = None
+    destination: str | None = None
+    price: FlightPrice | None = None
+    num_stops: int | None = None
+    duration: str | None = None
+    airlines: list[str] = []
+    stop_locations: List[FlightStopLocation] = []
+
+
+# Stored columns, in the order FlightTable.append takes them
+FLIGHT_COLUMNS = (
+    "id",
+    "departure_date",
+    "departure_time",
+    "arrival_date",
+    "arrival_time",
+    "origin",
+    "destination",
+    "price_amount",
+    "price_currency",
+    "num_stops",
+    "duration",
+    "airlines",
+    "stop_locations",
+)
+# Numeric sort keys kept next to the columns for ranking, infinity where missing
+_RANK_KEYS = ("price", "duration", "stops", "departure")
+
+
+def _intern(value: str | None) -> str | None:
+    return sys.intern(value) if value is not None else None
+
+
+class FlightTable:
+    """
+    Flights stored column-wise instead of one FlightData per flight. Strings that
+    repeat across flights (dates, times, airports, airlines) are interned, and the
+    numeric sort keys ranking needs are computed once when a flight is appended.
+
+    `take` returns a view: a table that shares the columns and only holds row
+    numbers, so ranking never copies flights. Dicts and FlightData are only built
+    when results leave the table, via to_dicts and to_flight_data, and match
+    FlightData.model_dump() exactly.
+    """
+
+    __slots__ = ("_columns", "_keys", "_rows")
+
+    def __init__(self, _columns: dict = None, _keys: dict = None, _rows: list = None):
+        self._columns = _columns or {name: [] for name in FLIGHT_COLUMNS}
+        self._keys = _keys or {name: array("d") for name in _RANK_KEYS}
+        # None for every stored row, otherwise the row numbers of a view
+        self._rows = _rows
+
+    def __len__(self) -> int:
+        return len(self._columns["id"]) if self._rows is None else len(self._rows)
+
+    def __repr__(self) -> str:
+        return f"<FlightTable {len(self)} flights>"
+
+    def append(
+        self,
+        id: str,
+        departure_date: str | None,
+        departure_time: str | None,
+        arrival_date: str | None,
+        arrival_time: str | None,
+        origin: str | None,
+        destination: str | None,
+        price_amount: int | None,
+        price_currency: str | None,
+        num_stops: int | None,
+        duration: str | None,
+        airlines: Sequence[str],
+        stop_locations: Sequence[Tuple[str, str, str]],
+    ):
+        """Appends a flight; stop locations are (city, airport, duration) tuples."""
+        if self._rows is not None:
+            raise ValueError("Cannot append to a view of a FlightTable.")
+        columns = self._columns
+        columns["id"].append(id)
+        columns["departure_date"].append(_intern(departure_date))
+        columns["departure_time"].append(_intern(departure_time))
+        columns["arrival_date"].append(_intern(arrival_date))
+        columns["arrival_time"].append(_intern(arrival_time))
+        columns["origin"].append(_intern(origin))
+        columns["destination"].append(_intern(destination))
+        columns["price_amount"].append(price_amount)
+        columns["price_currency"].append(_intern(price_currency))
+        columns["num_stops"].append(num_stops)
+        columns["duration"].append(_intern(duration))
+        columns["airlines"].append(tuple(map(sys.intern, airlines)))
+        columns["stop_locations"].append(
+            tuple(tuple(map(sys.intern, stop)) for stop in stop_locations)
+        )
+
+        minutes = parse_duration_to_minutes(duration)
+        departure = parse_clock_to_minutes(departure_time)
+        keys = self._keys
+        keys["price"].append(price_amount if price_amount is not None else INF)
+        keys["duration"].append(minutes if minutes is not None else INF)
+        keys["stops"].append(num_stops if num_stops is not None else INF)
+        keys["departure"].append(departure if departure is not None else INF)
+
+    def column(self, name: str) -> Sequence:
+        """
+        One column's values in row order. For a whole table this is the stored column
+        itself, so callers must not modify it.
+        """
+        column = self._columns[name]
+        if self._rows is None:
+            return column
+        return [column[row] for row in self._rows]
+
+    def _view(self, rows: List[int]) -> "FlightTable":
+        return FlightTable(self._columns, self._keys, rows)
+
+    def base(self) -> "FlightTable":
+        """The whole table a view was taken from, or the table itself."""
+        return self if self._rows is None else FlightTable(self._columns, self._keys)
+
+    def take(self, positions: Iterable[int]) -> "FlightTable":
+        """A view of the flights at `positions`, in that order."""
+        if self._rows is None:
+            return self._view(list(positions))
+        return self._view([self._rows[position] for position in positions])
+
+    def rank_columns(self) -> RankColumns:
+        """The ranking sort keys, shared with the table unless this is a view."""
+        if self._rows is None:
+            return RankColumns.from_columns(**self._keys)
+        return RankColumns.from_columns(
+            **{
+                name: array("d", [keys[row] for row in self._rows])
+                for name, keys in self._keys.items()
+            }
+        )
+
+    @classmethod
+    def concat(cls, tables: Iterable["FlightTable"]) -> "FlightTable":
+        """A new table with the flights of every table, in order."""
+        result = cls()
+        for table in tables:
+            for name, column in result._columns.items():
+                column.extend(table.column(name))
+            for name, keys in result._keys.items():
+                if table._rows is None:
+                    keys.extend(table._keys[name])
+                else:
+                    keys.extend(table._keys[name][row] for row in table._rows)
+        return result
+
+    def to_dicts(self) -> List[dict]:
+        """The flights as FlightData.model_dump() would give them."""
+        return [
+            {
+                "id": id,
+                "departure_date": departure_date,
+                "departure_time": departure_time,
+                "arrival_date": arrival_date,
+                "arrival_time": arrival_time,
+                "origin": origin,
+                "destination": destination,
+                "price": (
+                    {"amount": price_amount, "currency": price_currency}
+                    if price_amount is not None
+                    else None
+                ),
+                "num_stops": num_stops,
+                "duration": duration,
+                "airlines": list(airlines),
+                "stop_locations": [
+                    {"city": city, "airport": airport, "duration": stop_duration}
+                    for city, airport, stop_duration in stop_locations
+                ],
+            }
+            for (
+                id,
+                departure_date,
+                departure_time,
+                arrival_date,
+                arrival_time,
+                origin,
+                destination,
+                price_amount,
+                price_currency,
+                num_stops,
+                duration,
+                airlines,
+                stop_locations,
+            ) in zip(*(self.column(name) for name in FLIGHT_COLUMNS))
+        ]
+
+    def to_flight_data(self) -> List[FlightData]:
+        return [FlightData.model_validate(flight) for flight in self.to_dicts()]
@@ -0,0 +1,229 @@
+import heapq
+import math
+import re
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Sequence, Union
+
+if TYPE_CHECKING:
+    from tools.flight_data import FlightData, FlightTable
+
+INF = math.inf
+
+RANKING_STRATEGIES = (
+    "balanced",
+    "cheapest",
+    "fastest",
+    "fewest_stops",
+    "earliest",
+    "weighted",
+    "pareto",
+)
+
+# Default weights for the "weighted" strategy and for trimming a large Pareto frontier
+DEFAULT_WEIGHTS = {"price": 0.5, "duration": 0.3, "stops": 0.2, "departure": 0.0}
+
+_HOURS_RE = re.compile(r"(\d+)\s*hr")
+_MINUTES_RE = re.compile(r"(\d+)\s*min")
+_CLOCK_RE = re.compile(r"(\d{1,2}):(\d{2})\s?([AP]M)")
+
+
+def parse_duration_to_minutes(duration_str: str | None) -> int | None:
+    """Converts duration string (e.g., '10 hr 30 min', '5 hr', '45 min') to total minutes."""
+    if not duration_str:
+        return None
+
+    hours = 0
+    minutes = 0
+
+    hour_match = _HOURS_RE.search(duration_str)
+    if hour_match:
+        hours = int(hour_match.group(1))
+
+    min_match = _MINUTES_RE.search(duration_str)
+    if min_match:
+        minutes = int(min_match.group(1))
+
+    if hours > 0 or minutes > 0:
+        total_minutes = hours * 60 + minutes
+        return total_minutes
+    else:
+        return None
+
+
+def parse_clock_to_minutes(time_str: str | None) -> int | None:
+    """Converts a clock time (e.g., '7:25AM') to minutes after midnight."""
+    match = _CLOCK_RE.search(time_str) if time_str else None
+    if not match:
+        return None
+    hours = int(match.group(1)) % 12 + (12 if match.group(3) == "PM" else 0)
+    return hours * 60 + int(match.group(2))
+
+
+class RankColumns:
+    """
+    Numeric sort keys computed once per flight, stored column-wise.
+    Missing values are infinity so they always rank last.
+    """
+
+    __slots__ = ("price", "duration", "stops", "departure")
+
+    def __init__(self, flights: Sequence["FlightData"]):
+        self.price: List[float] = []
+        self.duration: List[float] = []
+        self.stops: List[float] = []
+        self.departure: List[float] = []
+        for flight in flights:
+            price = flight.price.amount if flight.price else None
+            duration = parse_duration_to_minutes(flight.duration)
+            departure = parse_clock_to_minutes(flight.departure_time)
+            self.price.append(price if price is not None else INF)
+            self.duration.append(duration if duration is not None else INF)
+            self.stops.append(flight.num_stops if flight.num_stops is not None else INF)
+            self.departure.append(departure if departure is not None else INF)
+
+    @classmethod
+    def from_columns(cls, price, duration, stops, departure) -> "RankColumns":
+        """Wraps precomputed sort key columns, e.g. a FlightTable's, without copying."""
+        columns = cls.__new__(cls)
+        columns.price = price
+        columns.duration = duration
+        columns.stops = stops
+        columns.departure = departure
+        return columns
+
+    def __len__(self) -> int:
+        return len(self.price)
+
+
+def _positions(column: List[float]) -> List[int]:
+    """Rank position of every row when sorted by `column` (stable)."""
+    order = sorted(range(len(column)), key=column.__getitem__)
+    positions = [0] * len(column)
+    for position, index in enumerate(order):
+        positions[index] = position
+    return positions
+
+
+def _normalized(column: List[float]) -> List[float]:
+    """Min-max scales finite values to [0, 1]; missing values score 1."""
+    finite = [value for value in column if value != INF]
+    if not finite:
+        return [1.0] * len(column)
+    low, high = min(finite), max(finite)
+    span = high - low
+    return [
+        1.0 if value == INF else (value - low) / span if span else 0.0
+        for value in column
+    ]
+
+
+def _weighted_scores(columns: RankColumns, weights: Dict[str, float]) -> List[float]:
+    scores = [0.0] * len(columns)
+    for name, weight in weights.items():
+        if not weight:
+            continue
+        for index, value in enumerate(_normalized(getattr(columns, name))):
+            scores[index] += weight * value
+    return scores
+
+
+def _top_k(indices, k: int, key: Callable[[int], tuple]) -> List[int]:
+    # heapq.nsmallest is a partial selection equivalent to sorted(...)[:k], ties included
+    return heapq.nsmallest(k, indices, key=key)
+
+
+def _balanced(columns: RankColumns, k: int) -> List[int]:
+    """
+    Picks the cheapest flights, then fills the rest with the best combined rank
+    (cheapest position + shortest position). For k=5 that is 3 cheapest + 2 combined.
+    """
+    price = columns.price
+    if len(columns) <= k:
+        return _top_k(range(len(columns)), k, price.__getitem__)
+
+    num_combined = k * 2 // 5
+    cheapest = _top_k(range(len(columns)), k - num_combined, price.__getitem__)
+    cheap_positions = _positions(price)
+    short_positions = _positions(columns.duration)
+    taken = set(cheapest)
+    combined = _top_k(
+        (index for index in range(len(columns)) if index not in taken),
+        num_combined,
+        lambda index: cheap_positions[index] + short_positions[index],
+    )
+    return cheapest + combined
+
+
+def _pareto_frontier(columns: RankColumns) -> List[int]:
+    """Flights not dominated on price, duration and stops, in price order."""
+    order = sorted(
+        range(len(columns)),
+        key=lambda i: (columns.price[i], columns.duration[i], columns.stops[i]),
+    )
+    frontier: List[int] = []
+    for index in order:
+        point = (columns.price[index], columns.duration[index], columns.stops[index])
+        # Candidates are visited in price order, so only earlier frontier points can dominate
+        if not any(
+            columns.duration[other] <= point[1]
+            and columns.stops[other] <= point[2]
+            and (columns.price[other], columns.duration[other], columns.stops[other])
+            != point
+            for other in frontier
+        ):
+            frontier.append(index)
+    return frontier
+
+
+def validate_ranking(strategy: str):
+    if strategy not in RANKING_STRATEGIES:
+        raise ValueError(
+            f"Unknown ranking strategy '{strategy}'. "
+            f"Use one of: {', '.join(RANKING_STRATEGIES)}."
+        )
+
+
+def rank_flights(
+    flights: Union["FlightTable", Sequence["FlightData"]],
+    strategy: str = "balanced",
+    k: int = 5,
+    weights: Optional[Dict[str, float]] = None,
+) -> Union["FlightTable", List["FlightData"]]:
+    """
+    Returns up to `k` flights picked by the ranking `strategy`:
+        balanced: cheapest flights plus the best combined price/duration rank.
+        cheapest / fastest / fewest_stops / earliest: single key with tie-breakers.
+        weighted: lowest weighted sum of min-max normalized price, duration, stops and departure.
+        pareto: flights no other flight beats on price, duration and stops at once,
+            trimmed by weighted score when there are more than `k`.
+    A FlightTable is ranked on its precomputed sort keys and gives back a view of it.
+    """
+    is_table = hasattr(flights, "rank_columns")
+    if not flights:
+        return flights if is_table else []
+
+    columns = flights.rank_columns() if is_table else RankColumns(flights)
+    indices = range(len(columns))
+    price, duration, stops = columns.price, columns.duration, columns.stops
+
+    if strategy == "balanced":
+        picked = _balanced(columns, k)
+    elif strategy == "cheapest":
+        picked = _top_k(indices, k, lambda i: (price[i], duration[i]))
+    elif strategy == "fastest":
+        picked = _top_k(indices, k, lambda i: (duration[i], price[i]))
+    elif strategy == "fewest_stops":
+        picked = _top_k(indices, k, lambda i: (stops[i], price[i], duration[i]))
+    elif strategy == "earliest":
+        picked = _top_k(indices, k, lambda i: (columns.departure[i], price[i]))
+    elif strategy in ("weighted", "pareto"):
+        scores = _weighted_scores(columns, weights or DEFAULT_WEIGHTS)
+        candidates = _pareto_frontier(columns) if strategy == "pareto" else indices
+        picked = _top_k(candidates, k, lambda i: (scores[i], price[i]))
+        if strategy == "pareto":
+            picked.sort(key=lambda i: (price[i], duration[i]))
+    else:
+        validate_ranking(strategy)
+
+    if is_table:
+        return flights.take(picked)
+    return [flights[index] for index in picked]
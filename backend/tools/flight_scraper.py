@@ -2,64 +2,60 @@ from fast_flights import FlightData as FastFlightsFlightData, Passengers, create
 from urllib.parse import urlencode
 import requests
 from selectolax.parser import HTMLParser
-from pydantic import BaseModel
 from typing import List
 import re
 from datetime import datetime
+from functools import lru_cache
 import hashlib
+import html
+import httpx
+import logging
+import os
+from tools.flight_data import FlightData, FlightTable
+from tools.flight_ranking import rank_flights, validate_ranking
 from utils.datetime import format_date
+from utils.http import get_async_client
+from utils.projection import Projection
+from utils.singleflight import SingleFlight
+from utils.tracing import processing_seconds, span, upstream_request_seconds
 from langchain_core.tools import tool
 
+logger = logging.getLogger(__name__)
 
-class FlightPrice(BaseModel):
-    amount: int
-    currency: str
+# Identical searches in flight at the same time share one Google Flights fetch
+flight_searches = SingleFlight("flights")
 
+# "stream" feeds response chunks through an incremental tokenizer, "bytes" parses the raw body
+FLIGHT_HTML_EXTRACTION = os.getenv("FLIGHT_HTML_EXTRACTION", "stream")
+FLIGHT_LABEL_MARKER = "Select flight"
 
-class FlightStopLocation(BaseModel):
-    city: str
-    airport: str
-    duration: str
 
+class FlightFetchError(Exception):
+    """Google Flights could not be fetched, as opposed to a search without flights."""
 
-class FlightData(BaseModel):
-    id: str | None = None
-    departure_date: str | None = None
-    departure_time: str | None = None
-    arrival_date: str | None = None
-    arrival_time: str | None = None
-    origin: str | None = None
-    destination: str | None = None
-    price: FlightPrice | None = None
-    num_stops: int | None = None
-    duration: str | None = None
-    airlines: list[str] = []
-    stop_locations: List[FlightStopLocation] = []
 
-
-def _parse_duration_to_minutes(duration_str: str | None) -> int | None:
-    """Converts duration string (e.g., '10 hr 30 min', '5 hr', '45 min') to total minutes."""
-    if not duration_str:
-        return None
-
-    hours = 0
-    minutes = 0
-
-    hour_match = re.search(r"(\d+)\s*hr", duration_str)
-    if hour_match:
-        hours = int(hour_match.group(1))
-
-    min_match = re.search(r"(\d+)\s*min", duration_str)
-    if min_match:
-        minutes = int(min_match.group(1))
-
-    if hours > 0 or minutes > 0:
-        total_minutes = hours * 60 + minutes
-        return total_minutes
-    else:
-        return None
+# Patterns for the Google Flights aria-label, compiled once per process
+_PRICE_RE = re.compile(r"From (\d{1,3}(?:,\d{3})*|\d+) (\w+)")
+_STOPS_RE = re.compile(r"(\d+) stop(?:s)? flight")
+_DURATION_RE = re.compile(r"Total duration (.*?)\.")
+_DEPARTURE_RE = re.compile(
+    r"Leaves (.*?) Airport at (\d{1,2}:\d{2}\s?[AP]M) on (.*?) and"
+)
+_ARRIVAL_RE = re.compile(
+    r"arrives at (.*?) Airport(?: at (\d{1,2}:\d{2}\s?[AP]M))? on (.*?)\."
+)
+_AIRLINE_RE = re.compile(
+    r"flight with (.*?)(?: operated by .*?)?(?: arriving| \.|\.|$)", re.IGNORECASE
+)
+_AIRLINE_FALLBACK_RE = re.compile(r"^(.*?) flight(?: from|\.|$)", re.IGNORECASE)
+_AIRLINE_SUFFIX_RE = re.compile(r"\s+is\s+a\s+\w+$", re.IGNORECASE)
+_AIRLINE_SPLIT_RE = re.compile(r"\s+and\s+|, ")
+_LAYOVER_RE = re.compile(
+    r"Layover \(\d+ of \d+\) is a (.*?) layover at (.*?) in (.*?)\."
+)
 
 
+@lru_cache(maxsize=1024)
 def _parse_date(date_str, year):
     """Parses date strings like 'Thursday, May 1' into 'YYYY-MM-DD'."""
     try:
@@ -84,22 +80,209 @@ def _currency_to_currency_code(currency: str) -> str:
     return currency_map.get(currency.lower(), "UNK")  # Return UNK for unknown
 
 
-def _cheapest_flight_key(flight: FlightData):
-    price = (
-        flight.price.amount
-        if flight.price and flight.price.amount is not None
-        else float("inf")
+def _parse_flight_label(
+    line: str, year: int, origin_airport_code: str, destination_airport_code: str
+) -> tuple | None:
+    """
+    Parses one aria-label into a row for FlightTable.append, or None if the departure
+    time or arrival date is missing.
+    """
+    line = line.replace("\u202f", " ")  # Clean unicode spaces
+
+    # Price
+    price_amount = price_currency = None  # Also covers "Total price is unavailable"
+    price_match = _PRICE_RE.search(line)
+    if price_match:
+        currency = price_match.group(2).lower()
+        # Handle potential 's' at the end (euros, dollars)
+        if currency.endswith("s"):
+            currency = currency[:-1]
+        price_amount = int(price_match.group(1).replace(",", ""))
+        price_currency = _currency_to_currency_code(currency)
+
+    # Stops
+    stops_match = _STOPS_RE.search(line)
+    if stops_match:
+        num_stops = int(stops_match.group(1))
+    elif "Nonstop flight" in line:
+        num_stops = 0
+    else:
+        num_stops = None
+
+    # Duration
+    duration_match = _DURATION_RE.search(line)
+    duration = duration_match.group(1).strip() if duration_match else None
+
+    # Departure Info
+    departure_time = departure_date = origin = None
+    dep_match = _DEPARTURE_RE.search(line)
+    if dep_match:
+        departure_time = dep_match.group(2).strip().replace(" ", "")
+        departure_date = _parse_date(dep_match.group(3).strip(), year)
+        origin = f"{dep_match.group(1).strip()} ({origin_airport_code})"
+
+    # Arrival Info
+    arrival_time = arrival_date = destination = None
+    arr_match = _ARRIVAL_RE.search(line)
+    if arr_match:
+        if arr_match.group(2):
+            arrival_time = arr_match.group(2).strip().replace(" ", "")
+        arrival_date = _parse_date(arr_match.group(3).strip(), year)
+        destination = f"{arr_match.group(1).strip()} ({destination_airport_code})"
+
+    # Skip the remaining work for labels that would be discarded anyway
+    if not (departure_time and arrival_date):
+        return None
+
+    # Airlines, falling back to an airline name at the start of the label
+    airlines = []
+    airline_match = _AIRLINE_RE.search(line) or _AIRLINE_FALLBACK_RE.search(line)
+    if airline_match:
+        airlines_str = airline_match.group(1).strip().rstrip(".")
+        # Remove phrases like "is a Nonstop" or similar if caught
+        airlines_str = _AIRLINE_SUFFIX_RE.sub("", airlines_str)
+        airlines = [
+            a.strip() for a in _AIRLINE_SPLIT_RE.split(airlines_str) if a.strip()
+        ]
+
+    # Layovers / Stop Locations
+    stop_locations = [
+        (layover_city.strip(), layover_airport.strip(), layover_duration.strip())
+        for layover_duration, layover_airport, layover_city in _LAYOVER_RE.findall(
+            line
+        )
+    ]
+
+    # Generate a unique ID for the flight based on its core details
+    key_fields = (
+        departure_date,
+        departure_time,
+        arrival_date,
+        arrival_time,
+        origin,
+        destination,
+        num_stops,
+        duration,
+        tuple(sorted(airlines)),  # Sort airlines for consistency
+        price_amount,
+    )
+
+    return (
+        hashlib.sha256(str(key_fields).encode()).hexdigest(),
+        departure_date,
+        departure_time,
+        arrival_date,
+        arrival_time,
+        origin,
+        destination,
+        price_amount,
+        price_currency,
+        num_stops,
+        duration,
+        airlines,
+        stop_locations,
     )
-    return price
 
 
-def _shortest_flight_key(flight: FlightData):
-    duration_minutes = _parse_duration_to_minutes(flight.duration)
-    duration = duration_minutes if duration_minutes is not None else float("inf")
-    return duration
+def extract_flight_labels(html: bytes | str) -> List[str]:
+    """Extracts flight aria-labels from a whole page, accepting raw response bytes."""
+    tree = HTMLParser(html)
+    return [
+        label
+        for node in tree.css(f"div[aria-label*='{FLIGHT_LABEL_MARKER}']")
+        if (label := node.attributes.get("aria-label"))
+    ]
+
 
+# Markup the streaming tokenizer cares about: div start tags, and raw text elements
+# or comments whose content must be skipped rather than scanned for tags
+_MARKUP_RE = re.compile(rb"<(?:(div)\b|(script|style|textarea|title)\b|(!--))", re.IGNORECASE)
+_DIV_START_TAG_RE = re.compile(rb"<div\b(?:[^>\"']|\"[^\"]*\"|'[^']*')*>", re.IGNORECASE)
+_ARIA_LABEL_RE = re.compile(
+    rb"""\saria-label\s*=\s*(?:"([^"]*)"|'([^']*)')""", re.IGNORECASE
+)
+_RAW_TEXT_END_RES = {
+    name: re.compile(b"</" + name, re.IGNORECASE)
+    for name in (b"script", b"style", b"textarea", b"title")
+}
+_COMMENT_END_RE = re.compile(rb"-->")
 
-def to_markdown(flights: List[FlightData]) -> str:
+
+class FlightLabelCollector:
+    """
+    Incremental tokenizer that collects flight aria-labels from HTML chunks as they
+    arrive. Only unfinished markup is buffered between chunks, so peak memory stays
+    around the size of the labels rather than the page.
+    """
+
+    # Give up on a start tag that is still unterminated after this many bytes
+    max_tag_size = 64 * 1024
+    # Longest opening token "<textarea" plus one byte for the word boundary
+    _carry_size = 10
+
+    def __init__(self, encoding: str | None = None):
+        self.encoding = encoding or "utf-8"
+        self.labels: List[str] = []
+        self._buffer = b""
+        # End pattern while skipping the content of a raw text element or comment
+        self._skip_until = None
+
+    def _add_label(self, start_tag: bytes):
+        match = _ARIA_LABEL_RE.search(start_tag)
+        if not match:
+            return
+        value = match.group(1) if match.group(1) is not None else match.group(2)
+        label = html.unescape(value.decode(self.encoding, errors="replace"))
+        if FLIGHT_LABEL_MARKER in label:
+            self.labels.append(label)
+
+    def feed(self, chunk: bytes):
+        buf = self._buffer + chunk
+        pos = 0
+        while True:
+            if self._skip_until is not None:
+                end = self._skip_until.search(buf, pos)
+                if end is None:
+                    # Keep enough bytes to match an end token split across chunks
+                    pos = max(pos, len(buf) - self._carry_size)
+                    break
+                pos = end.end()
+                self._skip_until = None
+                continue
+
+            markup = _MARKUP_RE.search(buf, pos)
+            if markup is None:
+                pos = max(pos, len(buf) - self._carry_size)
+                break
+
+            if markup.group(1):
+                tag = _DIV_START_TAG_RE.match(buf, markup.start())
+                if tag is None:
+                    if len(buf) - markup.start() > self.max_tag_size:
+                        pos = markup.end()
+                        continue
+                    # Unterminated start tag, wait for the next chunk
+                    pos = markup.start()
+                    break
+                self._add_label(tag.group(0))
+                pos = tag.end()
+            elif markup.group(2):
+                self._skip_until = _RAW_TEXT_END_RES[markup.group(2).lower()]
+                pos = markup.end()
+            else:
+                self._skip_until = _COMMENT_END_RE
+                pos = markup.end()
+
+        self._buffer = buf[pos:]
+
+    def close(self) -> List[str]:
+        self._buffer = b""
+        return self.labels
+
+
+def to_markdown(flights: FlightTable | List[FlightData]) -> str:
+    if isinstance(flights, FlightTable):
+        flights = flights.to_flight_data()
     content = ""
     for index, flight in enumerate(flights):
         content += f"Flight {index + 1}:\n"
@@ -116,10 +299,45 @@ def to_markdown(flights: List[FlightData]) -> str:
     return content
 
 
-def to_json(flights: List[FlightData]) -> List[dict]:
+def to_json(flights: FlightTable | List[FlightData]) -> List[dict]:
+    if isinstance(flights, FlightTable):
+        return flights.to_dicts()
     return [flight.model_dump() for flight in flights]
 
 
+def _join_date_time(date: str | None, time: str | None) -> str | None:
+    return " ".join(part for part in (date, time) if part) or None
+
+
+def _format_price(flight: dict) -> str | None:
+    price = flight.get("price")
+    return f"{price['amount']} {price['currency']}" if price else None
+
+
+def _format_layovers(flight: dict) -> str:
+    return "; ".join(
+        f"{stop['city']} ({stop['airport']}) {stop['duration']}"
+        for stop in flight.get("stop_locations") or []
+    )
+
+
+# What the assistant gets back for each flight: no ids, nested models flattened to text
+FLIGHT_PROJECTION = Projection(
+    "flights",
+    {
+        "departure": lambda f: _join_date_time(f.get("departure_date"), f.get("departure_time")),
+        "arrival": lambda f: _join_date_time(f.get("arrival_date"), f.get("arrival_time")),
+        "from": "origin",
+        "to": "destination",
+        "duration": "duration",
+        "stops": "num_stops",
+        "airlines": lambda f: ", ".join(f.get("airlines") or []),
+        "price": _format_price,
+        "layovers": _format_layovers,
+    },
+)
+
+
 class FlightScraper:
     """
     Scrapes Google Flights for flight information based on provided criteria.
@@ -132,6 +350,7 @@ class FlightScraper:
         num_guests=1,
         seat_class="economy",
         direct=False,
+        extraction_mode=FLIGHT_HTML_EXTRACTION,
     ):
         self.origin_airport_code = origin_airport_code
         self.destination_airport_code = destination_airport_code
@@ -139,11 +358,11 @@ class FlightScraper:
         self.num_guests = num_guests
         self.seat_class = seat_class
         self.direct = direct
+        self.extraction_mode = extraction_mode
 
-        self.html_content = None
         self.raw_flight_strings = []
-        self.parsed_flights: List[FlightData] = []
-        self.best_flights: List[FlightData] = []
+        self.parsed_flights = FlightTable()
+        self.best_flights = FlightTable()
 
     def _get_flight_url(self) -> str:
         """Constructs the Google Flights URL."""
@@ -168,281 +387,163 @@ class FlightScraper:
         }
         return f"https://www.google.com/travel/flights?{urlencode(params)}"
 
-    def _fetch_flight_html(self) -> bool:
-        """Fetches the HTML content from the Google Flights URL."""
+    def _fetch_flight_strings(self):
+        """
+        Fetches the Google Flights page and extracts the raw flight description strings.
+        The response body is never kept: in "stream" mode chunks go straight through an
+        incremental tokenizer, in "bytes" mode the raw body is parsed once and dropped.
+        Raises FlightFetchError if the page could not be fetched.
+        """
         url = self._get_flight_url()
-        print(f"Fetching flights from: {url}")
-        try:
-            response = requests.get(url, timeout=30)  # Added timeout
-            response.raise_for_status()  # Raise HTTPError for bad responses (4xx or 5xx)
-            self.html_content = response.text
-            return True
-        except requests.exceptions.RequestException as e:
-            print(f"Error fetching flight data: {e}")
-            self.html_content = None
-            return False
-
-    def _extract_flight_strings(self):
-        """Extracts raw flight description strings from the HTML."""
-        if not self.html_content:
-            print("HTML content not available for parsing.")
-            self.raw_flight_strings = []
-            return
-
-        tree = HTMLParser(self.html_content)
-        nodes = tree.css("div[aria-label*='Select flight']")
-        self.raw_flight_strings = [
-            node.attributes.get("aria-label", "")
-            for node in nodes
-            if node.attributes.get("aria-label")
-        ]
+        logger.info("Fetching flights from: %s", url)
+        with span(
+            "upstream:google_flights", upstream_request_seconds, upstream="google_flights"
+        ) as fetch:
+            try:
+                with requests.get(url, timeout=30, stream=True) as response:
+                    response.raise_for_status()  # Raise HTTPError for bad responses (4xx or 5xx)
+                    if self.extraction_mode == "stream":
+                        collector = FlightLabelCollector(response.encoding)
+                        for chunk in response.iter_content(chunk_size=64 * 1024):
+                            collector.feed(chunk)
+                        self.raw_flight_strings = collector.close()
+                    else:
+                        self.raw_flight_strings = extract_flight_labels(response.content)
+            except requests.exceptions.RequestException as e:
+                fetch.status = "error"
+                logger.warning("Error fetching flight data: %s", e)
+                self.raw_flight_strings = []
+                raise FlightFetchError(f"Could not fetch flights: {e}") from e
+
+    async def _afetch_flight_strings(self):
+        """Async version of _fetch_flight_strings on the pooled HTTP client."""
+        url = self._get_flight_url()
+        logger.info("Fetching flights from: %s", url)
+        client = get_async_client("google_flights", follow_redirects=True)
+        async with span(
+            "upstream:google_flights", upstream_request_seconds, upstream="google_flights"
+        ) as fetch:
+            try:
+                async with client.stream("GET", url, timeout=30) as response:
+                    response.raise_for_status()
+                    if self.extraction_mode == "stream":
+                        collector = FlightLabelCollector(response.charset_encoding)
+                        async for chunk in response.aiter_bytes(chunk_size=64 * 1024):
+                            collector.feed(chunk)
+                        self.raw_flight_strings = collector.close()
+                    else:
+                        self.raw_flight_strings = extract_flight_labels(await response.aread())
+            except httpx.HTTPError as e:
+                fetch.status = "error"
+                logger.warning("Error fetching flight data: %s", e)
+                self.raw_flight_strings = []
+                raise FlightFetchError(f"Could not fetch flights: {e}") from e
 
     def _parse_flight_data(self):
         """Parses structured flight data from the raw description strings."""
         if not self.raw_flight_strings or len(self.raw_flight_strings) == 0:
-            print("No raw flight strings to parse.")
-            self.parsed_flights = []
+            logger.info("No raw flight strings to parse.")
+            self.parsed_flights = FlightTable()
             return
 
-        print(f"Parsing {len(self.raw_flight_strings)} potential flight strings...")
-        parsed_flights_temp = []
+        logger.debug("Parsing %d potential flight strings...", len(self.raw_flight_strings))
+        parsed_flights_temp = FlightTable()
         year = datetime.strptime(self.date, "%Y-%m-%d").year
         seen_ids = set()  # To track duplicates based on generated ID
 
-        for line in self.raw_flight_strings:
-            flight_info = FlightData()
-            line = line.replace("\u202f", " ")  # Clean unicode spaces
-
-            # Price
-            price_match = re.search(
-                r"From (\d{1,3}(?:,\d{3})*|\d+) (\w+)", line
-            )  # Improved price regex
-            if price_match:
-                currency = price_match.group(2).lower()
-                # Handle potential 's' at the end (euros, dollars)
-                if currency.endswith("s"):
-                    currency = currency[:-1]
-                flight_info.price = FlightPrice(
-                    amount=int(price_match.group(1).replace(",", "")),
-                    currency=_currency_to_currency_code(currency),
-                )
-            elif "Total price is unavailable" in line:
-                flight_info.price = None  # Explicitly set to None
-
-            # Stops
-            stops_match = re.search(r"(\d+) stop(?:s)? flight", line)
-            if stops_match:
-                flight_info.num_stops = int(stops_match.group(1))
-            elif "Nonstop flight" in line:
-                flight_info.num_stops = 0
-            else:
-                flight_info.num_stops = None  # Explicitly set None if not found
-
-            # Duration
-            duration_match = re.search(r"Total duration (.*?)\.", line)
-            if duration_match:
-                flight_info.duration = duration_match.group(1).strip()
-
-            # Departure Info
-            dep_match = re.search(
-                r"Leaves (.*?) Airport at (\d{1,2}:\d{2}\s?[AP]M) on (.*?) and", line
-            )  # Added optional space before AM/PM
-            if dep_match:
-                dep_airport_name = dep_match.group(1).strip()
-                flight_info.departure_time = (
-                    dep_match.group(2).strip().replace(" ", "")
-                )  # Remove space
-                dep_date_str = dep_match.group(3).strip()
-                flight_info.departure_date = _parse_date(dep_date_str, year)
-                flight_info.origin = f"{dep_airport_name} ({self.origin_airport_code})"
-
-            # Arrival Info
-            arr_match = re.search(
-                r"arrives at (.*?) Airport(?: at (\d{1,2}:\d{2}\s?[AP]M))? on (.*?)\.",
-                line,
-            )  # Made time optional
-            if arr_match:
-                arr_airport_name = arr_match.group(1).strip()
-                flight_info.arrival_time = (
-                    arr_match.group(2).strip().replace(" ", "")
-                    if arr_match.group(2)
-                    else None
-                )
-                arr_date_str = arr_match.group(3).strip()
-                flight_info.arrival_date = _parse_date(arr_date_str, year)
-                flight_info.destination = (
-                    f"{arr_airport_name} ({self.destination_airport_code})"
-                )
-
-            # Airlines - More robust extraction
-            # Try common patterns first
-            airline_match = re.search(
-                r"flight with (.*?)(?: operated by .*?)?(?: arriving| \.|\.|$)",
-                line,
-                re.IGNORECASE,
-            )
-            if not airline_match:
-                # Fallback if "flight with" isn't present (e.g., just airline name)
-                airline_match = re.search(
-                    r"^(.*?) flight(?: from|\.|$)", line, re.IGNORECASE
-                )  # Match airline at the start
-
-            if airline_match:
-                airlines_str = airline_match.group(1).strip().rstrip(".")
-                # Remove phrases like "is a Nonstop" or similar if caught
-                airlines_str = re.sub(
-                    r"\s+is\s+a\s+\w+$", "", airlines_str, flags=re.IGNORECASE
-                )
-                flight_info.airlines = [
-                    a.strip()
-                    for a in re.split(r"\s+and\s+|, ", airlines_str)
-                    if a.strip()
-                ]
-            else:
-                flight_info.airlines = []  # Set to empty list if not found
-
-            # Layovers / Stop Locations
-            layover_matches = re.findall(
-                r"Layover \(\d+ of \d+\) is a (.*?) layover at (.*?) in (.*?)\.", line
-            )
-            stops = []
-            for layover in layover_matches:
-                layover_duration = layover[0].strip()
-                layover_airport = layover[1].strip()
-                layover_city = layover[2].strip()
-                stops.append(
-                    FlightStopLocation(
-                        city=layover_city,
-                        airport=layover_airport,
-                        duration=layover_duration,
-                    )
+        with span("flight_parse", processing_seconds, step="flight_parse"):
+            for line in self.raw_flight_strings:
+                flight_info = _parse_flight_label(
+                    line, year, self.origin_airport_code, self.destination_airport_code
                 )
-            flight_info.stop_locations = stops
-
-            # Generate a unique ID for the flight based on its core details
-            # Use a tuple of key fields for hashing to avoid issues with model string representation
-            key_fields = (
-                flight_info.departure_date,
-                flight_info.departure_time,
-                flight_info.arrival_date,
-                flight_info.arrival_time,
-                flight_info.origin,
-                flight_info.destination,
-                flight_info.num_stops,
-                flight_info.duration,
-                tuple(sorted(flight_info.airlines)),  # Sort airlines for consistency
-                flight_info.price.amount if flight_info.price else None,
-            )
-            flight_info.id = hashlib.sha256(str(key_fields).encode()).hexdigest()
-
-            # Append only if essential data is present and it's not a duplicate
-            if (
-                flight_info.departure_time
-                and flight_info.arrival_date
-                and flight_info.id not in seen_ids
-            ):
-                parsed_flights_temp.append(flight_info)
-                seen_ids.add(flight_info.id)
+                # Append only if essential data is present and it's not a duplicate
+                if flight_info is not None and flight_info[0] not in seen_ids:
+                    parsed_flights_temp.append(*flight_info)
+                    seen_ids.add(flight_info[0])
 
         self.parsed_flights = parsed_flights_temp
-        print(f"Successfully parsed {len(self.parsed_flights)} unique flights.")
-
-    def _filter_best_flights(self) -> List[FlightData]:
-        """
-        Selects the top 3 cheapest flights and the 2 flights with the best
-        combined rank (shortest position + cheapest position) from the remainder.
-        Returns copies to avoid modifying the main list.
-        """
-        if not self.parsed_flights:
-            return []
-
-        num_flights = len(self.parsed_flights)
-        if num_flights <= 5:
-            # If 5 or fewer flights, return them sorted by price
-            return sorted(self.parsed_flights, key=_cheapest_flight_key)[:5]
-
-        # Sort flights by price and duration
-        # Make copies to avoid modifying the original list during sorting
-        flights_copy = self.parsed_flights[:]
-        cheapest_flights_sorted = sorted(flights_copy, key=_cheapest_flight_key)
-        shortest_flights_sorted = sorted(flights_copy, key=_shortest_flight_key)
-
-        # Create position maps for quick lookup using the flight IDs
-        cheap_pos_map = {
-            flight.id: i for i, flight in enumerate(cheapest_flights_sorted)
-        }
-        short_pos_map = {
-            flight.id: i for i, flight in enumerate(shortest_flights_sorted)
-        }
-
-        # Select the top 3 cheapest flights (by ID)
-        top_cheapest_ids = {flight.id for flight in cheapest_flights_sorted[:3]}
-
-        # Calculate combined rank for remaining flights
-        ranked_candidates = []
-        for (
-            flight
-        ) in self.parsed_flights:  # Iterate original list to maintain original objects
-            if flight.id not in top_cheapest_ids:
-                # Ensure the flight ID exists in both maps (it should, barring errors)
-                if flight.id in cheap_pos_map and flight.id in short_pos_map:
-                    combined_rank = cheap_pos_map[flight.id] + short_pos_map[flight.id]
-                    ranked_candidates.append((combined_rank, flight))
-                else:
-                    print(
-                        f"Warning: Flight ID {flight.id} missing from position maps during ranking."
-                    )
-
-        # Sort candidates by the combined rank (lower is better)
-        ranked_candidates.sort(key=lambda x: x[0])
-
-        # Get the actual FlightData objects for the top 3 cheapest
-        top_cheapest = [
-            flight for flight in self.parsed_flights if flight.id in top_cheapest_ids
-        ]
-        # Ensure top_cheapest maintains the original price sort order
-        top_cheapest.sort(key=_cheapest_flight_key)
-
-        # Select the top 2 candidates based on combined rank
-        additional_flights = [flight for rank, flight in ranked_candidates[:2]]
+        logger.info("Successfully parsed %d unique flights.", len(self.parsed_flights))
+
+    def _filter_best_flights(self, ranking: str = "balanced") -> FlightTable:
+        """Selects the best flights from the parsed flights using a ranking strategy."""
+        with span("flight_rank", processing_seconds, step="flight_rank"):
+            return rank_flights(self.parsed_flights, ranking)
+
+    def _search_key(self) -> tuple:
+        """Normalized search arguments identifying identical searches."""
+        return (
+            self.origin_airport_code.strip().upper(),
+            self.destination_airport_code.strip().upper(),
+            self.date,
+            int(self.num_guests),
+            str(self.seat_class).strip().lower(),
+            bool(self.direct),
+        )
 
-        # Combine the lists
-        best_flights = top_cheapest + additional_flights
+    def _scrape(self) -> FlightTable:
+        """Fetches and parses every flight for the current date."""
+        self._fetch_flight_strings()
+        self._parse_flight_data()
+        return self.parsed_flights
 
-        # Ensure we don't exceed 5 flights due to edge cases
-        return best_flights[:5]
+    async def _ascrape(self) -> FlightTable:
+        await self._afetch_flight_strings()
+        self._parse_flight_data()
+        return self.parsed_flights
 
-    def get_flight_details(self, date: str) -> List[FlightData]:
+    def get_all_flights(self, date: str) -> FlightTable:
         """
-        Fetches, parses, and filters flight details, returning the best options.
+        Fetches and parses every flight on the given date.
+        Concurrent calls with the same search arguments share one fetch and parse.
+        Raises FlightFetchError if Google Flights could not be fetched.
         """
         self.date = date
-        if not self._fetch_flight_html():
-            return []  # Return empty list if fetching failed
-
-        self._extract_flight_strings()
-        self._parse_flight_data()
+        self.parsed_flights = flight_searches.do(self._search_key(), self._scrape)
+        return self.parsed_flights
 
-        if not self.parsed_flights:
-            print("No flights found or parsed.")
-            return []
+    def get_flight_details(self, date: str, ranking: str = "balanced") -> FlightTable:
+        """
+        Fetches, parses, and filters flight details, returning the best options.
+        """
+        if not self.get_all_flights(date):
+            logger.info("No flights found or parsed.")
+            return FlightTable()
 
-        best_flights_data = self._filter_best_flights()
+        best_flights_data = self._filter_best_flights(ranking)
         self.best_flights = best_flights_data
-        print(f"Selected {len(best_flights_data)} best flights.")
+        logger.info("Selected %d best flights.", len(best_flights_data))
 
         return best_flights_data
 
+    async def aget_all_flights(self, date: str) -> FlightTable:
+        """Async version of get_all_flights; shares in-flight fetches with it."""
+        self.date = date
+        self.parsed_flights = await flight_searches.ado(self._search_key(), self._ascrape)
+        return self.parsed_flights
+
+    async def aget_flight_details(
+        self, date: str, ranking: str = "balanced"
+    ) -> FlightTable:
+        """Async version of get_flight_details."""
+        if not await self.aget_all_flights(date):
+            logger.info("No flights found or parsed.")
+            return FlightTable()
+
+        self.best_flights = self._filter_best_flights(ranking)
+        logger.info("Selected %d best flights.", len(self.best_flights))
+        return self.best_flights
+
 
 @tool
-def search_flights(
+async def search_flights(
     origin_airport_code: str,
     destination_airport_code: str,
     date: str,
     num_guests: int,
     seat_class: str,
     direct: bool,
-) -> List[dict]:
+    ranking: str = "balanced",
+) -> dict | list | str:
     """
     Search for flights between two airports on a given date.
     Args:
@@ -452,10 +553,17 @@ def search_flights(
         num_guests: The number of guests on the flight.
         seat_class: The class of seat on the flight (economy, premium-economy, business, first).
         direct: Whether the flight is direct.
+        ranking: How to pick the best flights: balanced (cheapest plus best price/duration mix),
+            cheapest, fastest, fewest_stops, earliest, weighted (price, duration and stops score),
+            or pareto (flights no other flight beats on price, duration and stops at once).
     Returns:
-        A list of dictionaries containing the flight details.
+        The best flights, one row per flight.
     """
+    validate_ranking(ranking)
     scraper = FlightScraper(
         origin_airport_code, destination_airport_code, num_guests, seat_class, direct
     )
-    return to_json(scraper.get_flight_details(date))
+    flights = await scraper.aget_flight_details(date, ranking)
+    return FLIGHT_PROJECTION.apply(
+        to_json(flights), raw=scraper.parsed_flights.to_dicts
+    )
@@ -0,0 +1,301 @@
+import asyncio
+import heapq
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Callable, List, Optional
+
+from langchain_core.tools import tool
+
+from tools.flight_data import FlightTable
+from tools.flight_ranking import rank_flights, validate_ranking
+from tools.flight_scraper import FLIGHT_PROJECTION, FlightScraper, to_json
+from utils.projection import Projection
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on concurrent Google Flights fetches per multi-date search
+FLIGHT_SEARCH_CONCURRENCY = int(os.getenv("FLIGHT_SEARCH_CONCURRENCY", 4))
+MAX_FLEXIBLE_DAYS = 14
+
+PRICE_CALENDAR_PROJECTION = Projection(
+    "price_calendar",
+    {
+        "date": "date",
+        "flights": "num_flights",
+        "min_price": "min_price",
+        "currency": "currency",
+        "error": "error",
+    },
+    max_items=MAX_FLEXIBLE_DAYS,
+)
+
+# Pairs point at the 1-based position of each leg in the outbound and return lists
+ROUND_TRIP_PAIR_PROJECTION = Projection(
+    "round_trip_pairs",
+    {
+        "outbound_option": "outbound_option",
+        "return_option": "return_option",
+        "total_price": lambda p: f"{p['total_price']['amount']} {p['total_price']['currency']}",
+    },
+)
+
+
+def date_range(start_date: str, end_date: str) -> List[str]:
+    """Every date from `start_date` to `end_date`, both YYYY-MM-DD and inclusive."""
+    start = datetime.strptime(start_date, "%Y-%m-%d")
+    end = datetime.strptime(end_date, "%Y-%m-%d")
+    if end < start:
+        raise ValueError("end_date must not be before start_date.")
+    num_days = (end - start).days + 1
+    if num_days > MAX_FLEXIBLE_DAYS:
+        raise ValueError(f"The date window can be at most {MAX_FLEXIBLE_DAYS} days.")
+    return [(start + timedelta(days=i)).strftime("%Y-%m-%d") for i in range(num_days)]
+
+
+def calendar_entry(date: str, flights: FlightTable, error: str = None) -> dict:
+    """One day of the price calendar: its flight count and cheapest price."""
+    amounts = flights.column("price_amount")
+    cheapest = min(
+        (row for row, amount in enumerate(amounts) if amount is not None),
+        key=amounts.__getitem__,
+        default=None,
+    )
+    entry = {
+        "date": date,
+        "num_flights": len(flights),
+        "min_price": amounts[cheapest] if cheapest is not None else None,
+        "currency": (
+            flights.column("price_currency")[cheapest] if cheapest is not None else None
+        ),
+    }
+    if error:
+        entry["error"] = error
+    return entry
+
+
+async def search_date_range(
+    origin_airport_code: str,
+    destination_airport_code: str,
+    start_date: str,
+    end_date: str,
+    num_guests: int = 1,
+    seat_class: str = "economy",
+    direct: bool = False,
+    ranking: str = "cheapest",
+    top_k: int = 5,
+    on_date_result: Optional[Callable[[str, FlightTable], None]] = None,
+) -> dict:
+    """
+    Fetches every day in the window with at most FLIGHT_SEARCH_CONCURRENCY fetches in
+    flight, then merges them into a price calendar and the overall best flights.
+    `on_date_result` is called as each day's flights land.
+    """
+    validate_ranking(ranking)
+    dates = date_range(start_date, end_date)
+    semaphore = asyncio.Semaphore(FLIGHT_SEARCH_CONCURRENCY)
+
+    async def fetch(date: str) -> FlightTable:
+        async with semaphore:
+            scraper = FlightScraper(
+                origin_airport_code,
+                destination_airport_code,
+                num_guests,
+                seat_class,
+                direct,
+            )
+            flights = await scraper.aget_all_flights(date)
+        if on_date_result:
+            on_date_result(date, flights)
+        return flights
+
+    results = await asyncio.gather(*(fetch(date) for date in dates), return_exceptions=True)
+
+    price_calendar = []
+    tables: List[FlightTable] = []
+    for date, result in zip(dates, results):
+        if isinstance(result, Exception):
+            logger.warning("Error fetching flights for %s: %s", date, result)
+            price_calendar.append(calendar_entry(date, FlightTable(), error=str(result)))
+            continue
+        price_calendar.append(calendar_entry(date, result))
+        tables.append(result)
+    all_flights = FlightTable.concat(tables)
+
+    priced_days = [entry for entry in price_calendar if entry["min_price"] is not None]
+    cheapest_day = min(priced_days, key=lambda entry: entry["min_price"], default=None)
+
+    return {
+        "price_calendar": price_calendar,
+        "cheapest_date": cheapest_day["date"] if cheapest_day else None,
+        "best_flights": to_json(rank_flights(all_flights, ranking, top_k)),
+    }
+
+
+@tool
+async def search_flights_flexible_dates(
+    origin_airport_code: str,
+    destination_airport_code: str,
+    start_date: str,
+    end_date: str,
+    num_guests: int,
+    seat_class: str,
+    direct: bool,
+    ranking: str = "cheapest",
+) -> dict:
+    """
+    Search for flights on every day between two dates in one call, e.g. to find the cheapest day to fly in a week.
+    Use this instead of calling search_flights once per date.
+    Args:
+        origin_airport_code: The IATA code of the origin airport.
+        destination_airport_code: The IATA code of the destination airport.
+        start_date: The first date of the window in YYYY-MM-DD format.
+        end_date: The last date of the window in YYYY-MM-DD format (at most 14 days after start_date).
+        num_guests: The number of guests on the flight.
+        seat_class: The class of seat on the flight (economy, premium-economy, business, first).
+        direct: Whether the flight is direct.
+        ranking: How to pick the best flights across all dates (balanced, cheapest, fastest,
+            fewest_stops, earliest, weighted, pareto).
+    Returns:
+        A price calendar with the cheapest price per date, the cheapest date, and the best flights across the window.
+    """
+    tables: List[FlightTable] = []
+    result = await search_date_range(
+        origin_airport_code,
+        destination_airport_code,
+        start_date,
+        end_date,
+        num_guests,
+        seat_class,
+        direct,
+        ranking,
+        on_date_result=lambda date, flights: tables.append(flights),
+    )
+    return {
+        "price_calendar": PRICE_CALENDAR_PROJECTION.apply(result["price_calendar"]),
+        "cheapest_date": result["cheapest_date"],
+        "best_flights": FLIGHT_PROJECTION.apply(
+            result["best_flights"], raw=lambda: FlightTable.concat(tables).to_dicts()
+        ),
+    }
+
+
+async def fetch_round_trip(
+    origin_airport_code: str,
+    destination_airport_code: str,
+    departure_date: str,
+    return_date: str,
+    num_guests: int = 1,
+    seat_class: str = "economy",
+    direct: bool = False,
+    ranking: str = "balanced",
+) -> tuple[FlightTable, FlightTable]:
+    """
+    Fetches the outbound and return legs concurrently, each on its own scraper, and
+    returns the best flights for both. Legs are searched as two one-way trips because
+    Google Flights only prices return options once an outbound flight is selected.
+    """
+    validate_ranking(ranking)
+    if datetime.strptime(return_date, "%Y-%m-%d") < datetime.strptime(
+        departure_date, "%Y-%m-%d"
+    ):
+        raise ValueError("return_date must not be before departure_date.")
+
+    outbound_scraper = FlightScraper(
+        origin_airport_code, destination_airport_code, num_guests, seat_class, direct
+    )
+    return_scraper = FlightScraper(
+        destination_airport_code, origin_airport_code, num_guests, seat_class, direct
+    )
+    return await asyncio.gather(
+        outbound_scraper.aget_flight_details(departure_date, ranking),
+        return_scraper.aget_flight_details(return_date, ranking),
+    )
+
+
+def pair_round_trips(
+    outbound_flights: FlightTable,
+    return_flights: FlightTable,
+    max_pairs: int = 5,
+) -> List[dict]:
+    """Cheapest outbound/return combinations whose prices share a currency."""
+    outbound_amounts = outbound_flights.column("price_amount")
+    outbound_currencies = outbound_flights.column("price_currency")
+    return_amounts = return_flights.column("price_amount")
+    return_currencies = return_flights.column("price_currency")
+    combinations = (
+        (outbound_amount + return_amount, outbound_index, inbound_index)
+        for outbound_index, outbound_amount in enumerate(outbound_amounts)
+        for inbound_index, return_amount in enumerate(return_amounts)
+        if outbound_amount is not None
+        and return_amount is not None
+        and outbound_currencies[outbound_index] == return_currencies[inbound_index]
+    )
+    outbound_ids = outbound_flights.column("id")
+    return_ids = return_flights.column("id")
+    return [
+        {
+            "outbound_id": outbound_ids[outbound_index],
+            "return_id": return_ids[inbound_index],
+            "outbound_option": outbound_index + 1,
+            "return_option": inbound_index + 1,
+            "total_price": {
+                "amount": total,
+                "currency": outbound_currencies[outbound_index],
+            },
+        }
+        for total, outbound_index, inbound_index in heapq.nsmallest(
+            max_pairs, combinations, key=lambda combination: combination[0]
+        )
+    ]
+
+
+@tool
+async def search_round_trip_flights(
+    origin_airport_code: str,
+    destination_airport_code: str,
+    departure_date: str,
+    return_date: str,
+    num_guests: int,
+    seat_class: str,
+    direct: bool,
+    ranking: str = "balanced",
+) -> dict:
+    """
+    Search for round-trip flights, fetching the outbound and return legs at the same time.
+    Use this instead of two search_flights calls when the user wants to fly there and back.
+    Args:
+        origin_airport_code: The IATA code of the origin airport.
+        destination_airport_code: The IATA code of the destination airport.
+        departure_date: The date of the outbound flight in YYYY-MM-DD format.
+        return_date: The date of the return flight in YYYY-MM-DD format.
+        num_guests: The number of guests on the flight.
+        seat_class: The class of seat on the flight (economy, premium-economy, business, first).
+        direct: Whether the flights are direct.
+        ranking: How to pick the best flights for each leg (balanced, cheapest, fastest,
+            fewest_stops, earliest, weighted, pareto).
+    Returns:
+        The best outbound and return flights, and the cheapest outbound/return pairs with their total price.
+        Pairs refer to flights by their 1-based position in the outbound and return lists.
+    """
+    outbound_flights, return_flights = await fetch_round_trip(
+        origin_airport_code,
+        destination_airport_code,
+        departure_date,
+        return_date,
+        num_guests,
+        seat_class,
+        direct,
+        ranking,
+    )
+    return {
+        "outbound": FLIGHT_PROJECTION.apply(
+            to_json(outbound_flights), raw=outbound_flights.base().to_dicts
+        ),
+        "return": FLIGHT_PROJECTION.apply(
+            to_json(return_flights), raw=return_flights.base().to_dicts
+        ),
+        "pairs": ROUND_TRIP_PAIR_PROJECTION.apply(
+            pair_round_trips(outbound_flights, return_flights)
+        ),
+    }
@@ -0,0 +1,110 @@
+import re
+import time
+import unicodedata
+from collections import defaultdict
+
+# Words too generic to tell two listings apart
+_STOPWORDS = frozenset({"the", "a", "an", "and", "by", "of", "at", "in", "hotel"})
+_NON_ALNUM_RE = re.compile(r"[^a-z0-9]+")
+
+
+def normalize_title(title: str | None) -> str:
+    """Lowercases, strips accents and punctuation, and collapses whitespace."""
+    if not title:
+        return ""
+    text = unicodedata.normalize("NFKD", title)
+    text = "".join(c for c in text if not unicodedata.combining(c)).lower()
+    text = text.replace("&", " and ")
+    return _NON_ALNUM_RE.sub(" ", text).strip()
+
+
+def _title_tokens(normalized: str) -> frozenset:
+    tokens = frozenset(normalized.split())
+    return (tokens - _STOPWORDS) or tokens
+
+
+def token_set_similarity(a: frozenset, b: frozenset) -> float:
+    """Dice coefficient of two token sets, between 0 and 1."""
+    if not a or not b:
+        return 0.0
+    return 2 * len(a & b) / (len(a) + len(b))
+
+
+def _enrich(hotel: dict, place: dict) -> dict:
+    enriched_hotel = hotel.copy()
+    enriched_hotel["amenities"] = [
+        tag.get("value_title") for tag in place.get("tags", [])
+    ]
+    categories = place.get("category", [])
+    enriched_hotel["category"] = categories[0].get("title") if categories else None
+    return enriched_hotel
+
+
+def join_hotels_with_places(
+    hotels: list[dict], places: list[dict], min_similarity: float = 0.6
+) -> tuple[list[dict], dict]:
+    """
+    Enriches hotels with amenities and category from the matching Maps place.
+
+    Places are matched on normalized titles through a hash index first. Hotels left
+    over are matched in one batch against a token index of the unused places, by
+    token-set similarity. Each place is used at most once, and unmatched hotels are
+    kept as they are. Returns the hotels in their original order and the join stats.
+    """
+    start = time.perf_counter()
+
+    exact_index = defaultdict(list)
+    token_index = defaultdict(set)
+    place_tokens = []
+    for index, place in enumerate(places):
+        normalized = normalize_title(place.get("title"))
+        tokens = _title_tokens(normalized)
+        place_tokens.append(tokens)
+        if normalized:
+            exact_index[normalized].append(index)
+        for token in tokens:
+            token_index[token].add(index)
+
+    used = set()
+    matches: dict[int, int] = {}  # hotel index -> place index
+
+    # Exact matches on normalized titles
+    unmatched = []
+    for hotel_index, hotel in enumerate(hotels):
+        normalized = normalize_title(hotel.get("title"))
+        candidates = [i for i in exact_index.get(normalized, ()) if i not in used]
+        if candidates:
+            matches[hotel_index] = candidates[0]
+            used.add(candidates[0])
+        else:
+            unmatched.append((hotel_index, _title_tokens(normalized)))
+    exact_matches = len(matches)
+
+    # Fuzzy matches: score only places sharing at least one token, best pairs first
+    scored = []
+    for hotel_index, tokens in unmatched:
+        candidates = set().union(*(token_index.get(token, ()) for token in tokens))
+        for place_index in candidates - used:
+            score = token_set_similarity(tokens, place_tokens[place_index])
+            if score >= min_similarity:
+                scored.append((-score, hotel_index, place_index))
+    for _, hotel_index, place_index in sorted(scored):
+        if hotel_index not in matches and place_index not in used:
+            matches[hotel_index] = place_index
+            used.add(place_index)
+
+    hotel_details = [
+        _enrich(hotel, places[matches[index]]) if index in matches else hotel.copy()
+        for index, hotel in enumerate(hotels)
+    ]
+
+    stats = {
+        "hotels": len(hotels),
+        "places": len(places),
+        "exact_matches": exact_matches,
+        "fuzzy_matches": len(matches) - exact_matches,
+        "unmatched": len(hotels) - len(matches),
+        "match_rate": len(matches) / len(hotels) if hotels else None,
+        "join_ms": (time.perf_counter() - start) * 1000,
+    }
+    return hotel_details, stats
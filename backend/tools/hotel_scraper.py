@@ -1,10 +1,40 @@
-from tools.brightdata_api import BrightDataAPI
+from tools.brightdata_api import get_brightdata_api
+from tools.hotel_matching import join_hotels_with_places
+from utils.projection import Projection
+from utils.tracing import processing_seconds, span
 from urllib.parse import urlencode, quote
-import concurrent.futures
+from typing import Callable, Optional
+import asyncio
+import logging
 from langchain_core.tools import tool
 
+logger = logging.getLogger(__name__)
+
+# The fields to_markdown shows, which is all the assistant needs to present a hotel
+HOTEL_PROJECTION = Projection(
+    "hotels",
+    {
+        "title": "title",
+        "link": "link",
+        "category": "category",
+        "price": "price",
+        "rating": "rating",
+        "reviews": "reviews_cnt",
+        "amenities": lambda h: [a for a in h.get("amenities") or [] if a][:8],
+    },
+)
+
+
+def listed_hotels(hotels: Optional[dict]) -> list[dict]:
+    """The bookable hotels of a hotel search result; empty when the search failed."""
+    return (
+        list(filter(lambda x: x.get("link") is not None, hotels.get("organic", [])))
+        if hotels
+        else []
+    )
+
 
-def get_hotel_details(
+async def get_hotel_details(
     location: str,
     checkin_date: str,
     checkout_date: str,
@@ -12,60 +42,83 @@ def get_hotel_details(
     currency: str = "EUR",
     free_cancellation: bool = False,
     accommodation_types: list[str] = ["hotel"],
+    on_result: Optional[Callable[[str, Optional[dict]], None]] = None,
 ):
-    with concurrent.futures.ThreadPoolExecutor() as executor:
-        # Submit both search functions to the executor
-        hotels_future = executor.submit(
-            search_hotels,
-            location,
-            checkin_date,
-            checkout_date,
-            num_guests,
-            currency,
-            free_cancellation,
-            accommodation_types,
-        )
-        places_future = executor.submit(search_places, location, accommodation_types)
+    """
+    Fetches hotels and places concurrently and enriches the hotels with place details.
+    `on_result` is called with "hotels" or "places" and the raw result as each lands.
+    """
 
-        # Wait for both futures to complete and get the results
-        hotels = hotels_future.result()
-        places = places_future.result()
+    async def notify(name: str, search) -> Optional[dict]:
+        result = await search
+        if on_result:
+            on_result(name, result)
+        return result
+
+    # Run both searches concurrently and wait for both results
+    hotels, places = await asyncio.gather(
+        notify(
+            "hotels",
+            fetch_hotels(
+                location,
+                checkin_date,
+                checkout_date,
+                num_guests,
+                currency,
+                free_cancellation,
+                accommodation_types,
+            ),
+        ),
+        notify("places", search_places(location, accommodation_types)),
+    )
 
     # Handle potential None results if API calls failed
-    hotels = (
-        list(filter(lambda x: x.get("link") is not None, hotels.get("organic", [])))
-        if hotels
-        else []
-    )
+    hotels = listed_hotels(hotels)
     places = places.get("organic", []) if places else None
 
-    hotel_details = []
     # Ensure places is searchable, assuming it's a list of dicts
     if isinstance(places, list) and len(places) > 0:
-        for hotel in hotels:
-            # Find the corresponding place using title
-            place = next(
-                (p for p in places if p.get("title") == hotel.get("title")), None
-            )
-            if place:
-                enriched_hotel = hotel.copy()
-                enriched_hotel["amenities"] = [
-                    tag.get("value_title") for tag in place.get("tags", [])
-                ]
-                categories = place.get("category", [])
-                enriched_hotel["category"] = (
-                    categories[0].get("title") if categories else None
-                )
-                hotel_details.append(enriched_hotel)
+        with span("hotel_join", processing_seconds, step="hotel_join"):
+            hotel_details, stats = join_hotels_with_places(hotels, places)
+        logger.info(
+            "Matched %d/%d hotels (%d exact, %d fuzzy) in %.2f ms",
+            stats["hotels"] - stats["unmatched"],
+            stats["hotels"],
+            stats["exact_matches"],
+            stats["fuzzy_matches"],
+            stats["join_ms"],
+        )
     else:
-        print("Skipping enrichment.")
+        logger.info("Skipping enrichment.")
         hotel_details = hotels if hotels else []
 
     return hotel_details
 
 
+async def fetch_hotels(
+    location: str,
+    checkin_date: str,
+    checkout_date: str,
+    num_guests: int,
+    currency: str = "USD",
+    free_cancellation: bool = False,
+    accommodation_types: list[str] = ["hotel"],
+):
+    brightdata_api = get_brightdata_api()
+    accommodation_types_str = " or ".join(accommodation_types)
+    query = urlencode({"q": accommodation_types_str + " in " + location})
+    url = f"https://www.google.com/travel/search?{query}"
+    params = {
+        "brd_dates": f"{checkin_date},{checkout_date}",
+        "brd_occupancy": num_guests,
+        "brd_currency": currency,
+        "brd_free_cancellation": free_cancellation,
+    }
+    return await brightdata_api.get_serp_results(url, params, search_type="hotels")
+
+
 @tool
-def search_hotels(
+async def search_hotels(
     location: str,
     checkin_date: str,
     checkout_date: str,
@@ -73,7 +126,7 @@ def search_hotels(
     currency: str = "USD",
     free_cancellation: bool = False,
     accommodation_types: list[str] = ["hotel"],
-) -> list[dict]:
+) -> dict | list | str:
     """
     Search for hotels in a given location.
     Args:
@@ -85,29 +138,31 @@ def search_hotels(
         free_cancellation: Whether to search for free cancellation hotels.
         accommodation_types: The types of accommodation to search for.
     Returns:
-        A list of dictionaries containing the hotel details.
+        The top hotels with their price, rating, category and amenities, one row per hotel.
     """
-    brightdata_api = BrightDataAPI()
-    accommodation_types_str = " or ".join(accommodation_types)
-    query = urlencode({"q": accommodation_types_str + " in " + location})
-    url = f"https://www.google.com/travel/search?{query}"
-    params = {
-        "brd_dates": f"{checkin_date},{checkout_date}",
-        "brd_occupancy": num_guests,
-        "brd_currency": currency,
-        "brd_free_cancellation": free_cancellation,
-    }
-    return brightdata_api.get_serp_results(url, params)
+    # The SERP payloads as they landed, before filtering and enrichment
+    results = {}
+    hotel_details = await get_hotel_details(
+        location,
+        checkin_date,
+        checkout_date,
+        num_guests,
+        currency,
+        free_cancellation,
+        accommodation_types,
+        on_result=results.__setitem__,
+    )
+    return HOTEL_PROJECTION.apply(hotel_details, raw=results.get("hotels"))
 
 
-def search_places(
+async def search_places(
     location: str, accommodation_types: list[str] = ["hotel"], num_results: int = 30
 ):
-    brightdata_api = BrightDataAPI()
+    brightdata_api = get_brightdata_api()
     accommodation_types_str = " or ".join(accommodation_types)
     query = quote(accommodation_types_str + " in " + location)
     url = f"https://www.google.com/maps/search/{query}/?num={num_results}"
-    return brightdata_api.get_serp_results(url)
+    return await brightdata_api.get_serp_results(url, search_type="places")
 
 
 def to_markdown(hotel_details: list[dict]) -> str:
@@ -0,0 +1,110 @@
+import functools
+from datetime import datetime
+from typing import Optional
+
+from tasks import report_progress, task_manager
+from tools.flight_data import FlightTable
+from tools.flight_ranking import rank_flights, validate_ranking
+from tools.flight_scraper import to_json
+from tools.flight_search import calendar_entry, date_range, search_date_range
+from tools.hotel_scraper import get_hotel_details, listed_hotels
+
+FLIGHT_SEARCH_TASK = "flight_search"
+HOTEL_SEARCH_TASK = "hotel_search"
+
+
+async def run_flight_search(
+    origin_airport_code: str,
+    destination_airport_code: str,
+    start_date: str,
+    end_date: Optional[str] = None,
+    num_guests: int = 1,
+    seat_class: str = "economy",
+    direct: bool = False,
+    ranking: str = "cheapest",
+    top_k: int = 5,
+) -> dict:
+    """
+    Searches every day from `start_date` to `end_date` (or just `start_date`) and
+    reports each day's calendar entry and best flights as a partial result as it lands.
+    """
+    num_days = len(date_range(start_date, end_date or start_date))
+    fetched = 0
+
+    def on_date_result(date: str, flights: FlightTable):
+        nonlocal fetched
+        fetched += 1
+        report_progress(
+            fetched / num_days,
+            f"Fetched {len(flights)} flights for {date}",
+            {
+                "date": date,
+                "calendar_entry": calendar_entry(date, flights),
+                "best_flights": to_json(rank_flights(flights, ranking, top_k)),
+            },
+        )
+
+    return await search_date_range(
+        origin_airport_code,
+        destination_airport_code,
+        start_date,
+        end_date or start_date,
+        num_guests,
+        seat_class,
+        direct,
+        ranking,
+        top_k,
+        on_date_result=on_date_result,
+    )
+
+
+async def run_hotel_search(
+    location: str,
+    checkin_date: str,
+    checkout_date: str,
+    num_guests: int = 1,
+    currency: str = "USD",
+    free_cancellation: bool = False,
+    accommodation_types: list[str] = ["hotel"],
+) -> list[dict]:
+    """
+    Searches hotels and enriches them with place details. The hotels are reported as
+    a partial result as soon as they land, before the enrichment.
+    """
+
+    def on_result(name: str, result: Optional[dict]):
+        if name == "hotels":
+            hotels = listed_hotels(result)
+            report_progress(0.5, f"Found {len(hotels)} hotels", {"hotels": hotels})
+        else:
+            report_progress(message="Fetched place details")
+
+    return await get_hotel_details(
+        location,
+        checkin_date,
+        checkout_date,
+        num_guests,
+        currency,
+        free_cancellation,
+        accommodation_types,
+        on_result=on_result,
+    )
+
+
+def submit_flight_search(**params) -> str:
+    """Validates a flight search and starts it as a background task. Returns the task id."""
+    validate_ranking(params.get("ranking", "cheapest"))
+    date_range(params["start_date"], params.get("end_date") or params["start_date"])
+    return task_manager.submit(
+        functools.partial(run_flight_search, **params), kind=FLIGHT_SEARCH_TASK
+    )
+
+
+def submit_hotel_search(**params) -> str:
+    """Validates a hotel search and starts it as a background task. Returns the task id."""
+    checkin = datetime.strptime(params["checkin_date"], "%Y-%m-%d")
+    if datetime.strptime(params["checkout_date"], "%Y-%m-%d") <= checkin:
+        raise ValueError("checkout_date must be after checkin_date.")
+    return task_manager.submit(
+        functools.partial(run_hotel_search, **params), kind=HOTEL_SEARCH_TASK
+    )
@@ -0,0 +1,253 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import random
+import statistics
+import time
+import weakref
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from utils.tracing import span, upstream_request_seconds
+
+logger = logging.getLogger(__name__)
+
+# Fetches one result; returns None while BrightData is still processing the request
+FetchResult = Callable[[str], Awaitable[Optional[Dict]]]
+
+
+class PollStats:
+    """
+    Rolling per-job wait statistics shared by every poll scheduler in the process.
+    Observed wait times also drive the adaptive poll schedule.
+    """
+
+    def __init__(self, history_size: int = 500):
+        self.wait_times = deque(maxlen=history_size)
+        self.polls_per_job = deque(maxlen=history_size)
+        self.completed = 0
+        self.timed_out = 0
+        self.failed = 0
+        self.polls = 0
+
+    def record_completion(self, wait_time: float, polls: int):
+        self.completed += 1
+        self.wait_times.append(wait_time)
+        self.polls_per_job.append(polls)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.wait_times:
+            return None
+        ordered = sorted(self.wait_times)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def snapshot(self) -> dict:
+        waits = list(self.wait_times)
+        return {
+            "completed": self.completed,
+            "timed_out": self.timed_out,
+            "failed": self.failed,
+            "polls": self.polls,
+            "wait_time_mean": statistics.fmean(waits) if waits else None,
+            "wait_time_p50": self.quantile(0.5),
+            "wait_time_p90": self.quantile(0.9),
+            "wait_time_max": max(waits) if waits else None,
+            "polls_per_job_mean": (
+                statistics.fmean(self.polls_per_job) if self.polls_per_job else None
+            ),
+        }
+
+
+poll_stats = PollStats()
+
+
+class _PollJob:
+    __slots__ = ("response_id", "future", "submitted_at", "deadline", "interval", "polls")
+
+    def __init__(self, response_id: str, future: asyncio.Future, timeout: float):
+        self.response_id = response_id
+        self.future = future
+        self.submitted_at = time.monotonic()
+        self.deadline = self.submitted_at + timeout
+        self.interval = 0.0
+        self.polls = 0
+
+
+class SerpPollScheduler:
+    """
+    Owns every outstanding SERP response_id on an event loop. Each due job is polled
+    in a task of its own, at most `batch_size` at a time, so a slow poll never delays
+    the other jobs' schedules. Each caller's future resolves as soon as its result lands.
+
+    The first poll is scheduled around the fastest quartile of observed completion
+    times, then the interval backs off geometrically with jitter up to `max_interval`.
+    """
+
+    def __init__(
+        self,
+        fetch_result: FetchResult,
+        stats: PollStats = poll_stats,
+        initial_delay: float = 2.0,
+        min_interval: float = 0.5,
+        max_interval: float = 5.0,
+        backoff: float = 1.5,
+        jitter: float = 0.2,
+        batch_size: int = 50,
+    ):
+        self._fetch_result = fetch_result
+        self.stats = stats
+        self.initial_delay = initial_delay
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.jitter = jitter
+        self.batch_size = batch_size
+
+        self._jobs: Dict[str, _PollJob] = {}
+        # (due time, sequence, response_id)
+        self._schedule: list[tuple[float, int, str]] = []
+        self._sequence = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._runner: Optional[asyncio.Task] = None
+        # Polls in flight, by response_id, so a job is never polled twice at once
+        self._polling: Dict[str, asyncio.Task] = {}
+
+    @property
+    def pending(self) -> int:
+        return len(self._jobs)
+
+    def _jittered(self, delay: float) -> float:
+        return delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def _first_delay(self) -> float:
+        learned = self.stats.quantile(0.25)
+        delay = learned if learned is not None else self.initial_delay
+        return min(self.max_interval, max(self.min_interval, delay))
+
+    def _next_delay(self, job: _PollJob) -> float:
+        job.interval = min(
+            self.max_interval, max(self.min_interval, job.interval * self.backoff)
+        )
+        return self._jittered(job.interval)
+
+    def _push(self, job: _PollJob, delay: float):
+        due = min(time.monotonic() + delay, job.deadline)
+        heapq.heappush(self._schedule, (due, next(self._sequence), job.response_id))
+
+    def submit(self, response_id: str, timeout: float = 25.0) -> asyncio.Future:
+        """Registers a response_id and returns a future resolving to its result (None on timeout)."""
+        job = self._jobs.get(response_id)
+        if job is not None:
+            return job.future
+
+        job = _PollJob(response_id, asyncio.get_running_loop().create_future(), timeout)
+        job.interval = self.min_interval
+        self._jobs[response_id] = job
+        self._push(job, self._jittered(self._first_delay()))
+
+        if self._runner is None or self._runner.done():
+            self._runner = asyncio.create_task(self._run())
+        self._wakeup.set()
+        return job.future
+
+    async def wait_for(self, response_id: str, timeout: float = 25.0) -> Optional[Dict]:
+        # Shield so a cancelled caller does not cancel the future other callers share
+        return await asyncio.shield(self.submit(response_id, timeout))
+
+    def _finish(self, job: _PollJob, result: Any = None, error: Exception = None):
+        self._jobs.pop(job.response_id, None)
+        if job.future.done():
+            return
+        if error is not None:
+            job.future.set_exception(error)
+        else:
+            job.future.set_result(result)
+
+    async def _poll(self, job: _PollJob):
+        job.polls += 1
+        self.stats.polls += 1
+        try:
+            async with span(
+                "upstream:brightdata_poll", upstream_request_seconds, upstream="brightdata_poll"
+            ) as poll:
+                data = await self._fetch_result(job.response_id)
+                if data is None:
+                    poll.status = "pending"
+        except Exception as e:
+            self.stats.failed += 1
+            logger.warning("%s: Poll failed: %s", job.response_id, e)
+            self._finish(job, error=e)
+            return
+
+        if data is not None:
+            wait_time = time.monotonic() - job.submitted_at
+            self.stats.record_completion(wait_time, job.polls)
+            logger.info(
+                "%s: Completed in %.2fs (%d polls)", job.response_id, wait_time, job.polls
+            )
+            self._finish(job, data)
+        elif time.monotonic() >= job.deadline:
+            self.stats.timed_out += 1
+            logger.warning("%s: Timed out after %d polls", job.response_id, job.polls)
+            self._finish(job, None)
+        else:
+            self._push(job, self._next_delay(job))
+
+    def _pop_due(self) -> list[_PollJob]:
+        now = time.monotonic()
+        due = []
+        while self._schedule and len(due) + len(self._polling) < self.batch_size:
+            due_at, _, response_id = self._schedule[0]
+            if due_at > now:
+                break
+            heapq.heappop(self._schedule)
+            job = self._jobs.get(response_id)
+            # Skip entries for jobs that were already resolved
+            if job is None or job.future.done():
+                self._jobs.pop(response_id, None)
+                continue
+            # The running poll schedules the job's next one when it returns
+            if response_id in self._polling:
+                continue
+            due.append(job)
+        return due
+
+    def _poll_done(self, response_id: str):
+        self._polling.pop(response_id, None)
+        # The poll may have scheduled the job's next poll or freed a slot
+        self._wakeup.set()
+
+    async def _run(self):
+        while self._jobs:
+            for job in self._pop_due():
+                task = asyncio.create_task(self._poll(job))
+                self._polling[job.response_id] = task
+                task.add_done_callback(
+                    lambda _, response_id=job.response_id: self._poll_done(response_id)
+                )
+
+            self._wakeup.clear()
+            delay = self._schedule[0][0] - time.monotonic() if self._schedule else None
+            if len(self._polling) >= self.batch_size:
+                # Every slot is busy, so wait for a poll to finish
+                delay = None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+
+
+_schedulers: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, SerpPollScheduler]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def get_poll_scheduler(fetch_result: FetchResult) -> SerpPollScheduler:
+    """Returns the poll scheduler for the running event loop, creating it on first use."""
+    loop = asyncio.get_running_loop()
+    scheduler = _schedulers.get(loop)
+    if scheduler is None:
+        scheduler = SerpPollScheduler(fetch_result)
+        _schedulers[loop] = scheduler
+    return scheduler
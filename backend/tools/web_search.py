@@ -0,0 +1,115 @@
+import asyncio
+import logging
+import os
+import unicodedata
+import weakref
+from functools import cache
+from typing import Dict, List
+
+from langchain_community.utilities import DuckDuckGoSearchAPIWrapper
+from langchain_core.tools import tool
+
+from utils.cache import MISSING, TTLCache, make_key
+from utils.ratelimit import RateLimiter
+from utils.singleflight import SingleFlight
+from utils.tracing import span, upstream_request_seconds
+
+logger = logging.getLogger(__name__)
+
+# Results per query and queries per tool call
+WEB_SEARCH_MAX_RESULTS = int(os.getenv("WEB_SEARCH_MAX_RESULTS", 5))
+WEB_SEARCH_MAX_QUERIES = int(os.getenv("WEB_SEARCH_MAX_QUERIES", 5))
+# Searches running at once, and the sustained rate and burst of new searches per second
+WEB_SEARCH_CONCURRENCY = int(os.getenv("WEB_SEARCH_CONCURRENCY", 3))
+WEB_SEARCH_RATE = float(os.getenv("WEB_SEARCH_RATE", 1))
+WEB_SEARCH_BURST = int(os.getenv("WEB_SEARCH_BURST", 3))
+
+web_search_cache = TTLCache(
+    "web_search",
+    max_entries=int(os.getenv("WEB_SEARCH_CACHE_MAX_ENTRIES", 1024)),
+    default_ttl=float(os.getenv("WEB_SEARCH_CACHE_TTL", 6 * 60 * 60)),
+    db_path=os.getenv("WEB_SEARCH_CACHE_DB") or None,
+)
+# Identical queries in flight at the same time share one search
+web_searches = SingleFlight("web_search")
+# DuckDuckGo blocks clients that search too often, so the rate is process-wide
+web_search_limiter = RateLimiter(WEB_SEARCH_RATE, WEB_SEARCH_BURST)
+
+_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def _get_semaphore() -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    semaphore = _semaphores.get(loop)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(WEB_SEARCH_CONCURRENCY)
+        _semaphores[loop] = semaphore
+    return semaphore
+
+
+@cache
+def _get_search_api() -> DuckDuckGoSearchAPIWrapper:
+    return DuckDuckGoSearchAPIWrapper(max_results=WEB_SEARCH_MAX_RESULTS)
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(unicodedata.normalize("NFKC", query).casefold().split())
+
+
+async def _search(key: str, query: str) -> List[Dict]:
+    async with _get_semaphore():
+        await web_search_limiter.aacquire()
+        async with span(
+            "upstream:duckduckgo", upstream_request_seconds, upstream="duckduckgo"
+        ):
+            # The DuckDuckGo client is blocking
+            results = await asyncio.to_thread(
+                _get_search_api().results, query, WEB_SEARCH_MAX_RESULTS
+            )
+    await web_search_cache.aset(key, results)
+    return results
+
+
+async def search_web(query: str) -> List[Dict]:
+    """
+    Searches the web for `query`, returning results with title, snippet and link.
+    Results are cached per normalized query; failures raise and are not cached.
+    """
+    normalized = normalize_query(query)
+    key = make_key(normalized, WEB_SEARCH_MAX_RESULTS)
+    cached = await web_search_cache.aget(key)
+    if cached is not MISSING:
+        return cached
+    return await web_searches.ado(key, _search, key, normalized)
+
+
+@tool
+async def web_search(queries: List[str]) -> Dict[str, List[Dict] | str]:
+    """
+    Search the web for general travel information: destinations, neighbourhoods,
+    restaurants, attractions, travel tips, or details about a hotel.
+    Pass several queries at once to run them in parallel rather than calling the tool again.
+    Args:
+        queries: One or more search queries (at most 5).
+    Returns:
+        The results for each query, each with a title, snippet and link.
+    """
+    queries = list(dict.fromkeys(q for q in queries if q.strip()))
+    if not queries:
+        raise ValueError("Provide at least one search query.")
+    if len(queries) > WEB_SEARCH_MAX_QUERIES:
+        raise ValueError(f"At most {WEB_SEARCH_MAX_QUERIES} queries per call.")
+
+    results = await asyncio.gather(
+        *(search_web(query) for query in queries), return_exceptions=True
+    )
+    output = {}
+    for query, result in zip(queries, results):
+        if isinstance(result, BaseException):
+            logger.warning("Web search failed for %r: %s", query, result)
+            output[query] = f"Error: search failed ({result}). Try again or rephrase."
+        else:
+            output[query] = result
+    return output
@@ -0,0 +1,190 @@
+import asyncio
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+import orjson
+
+# Returned by get() on a miss, so cached falsy values stay distinguishable
+MISSING = object()
+
+
+def make_key(*parts: Any) -> str:
+    """Builds a stable cache key from JSON-serializable parts."""
+    raw = orjson.dumps(parts, option=orjson.OPT_SORT_KEYS, default=str)
+    return hashlib.sha256(raw).hexdigest()
+
+
+class CacheStats:
+    def __init__(self):
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.sets = 0
+
+    def snapshot(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "sets": self.sets,
+            "hit_rate": self.hits / lookups if lookups else None,
+        }
+
+
+class SQLiteCacheStore:
+    """
+    On-disk cache tier shared by every worker process pointing at the same file.
+    Values are stored as JSON; each thread gets its own connection.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._last_purge = 0.0
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                " namespace TEXT NOT NULL,"
+                " key TEXT NOT NULL,"
+                " value BLOB NOT NULL,"
+                " expires_at REAL,"
+                " PRIMARY KEY (namespace, key))"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, namespace: str, key: str) -> tuple[Optional[float], Any]:
+        """Returns (expires_at, value), or (None, MISSING) when absent or expired."""
+        row = (
+            self._connect()
+            .execute(
+                "SELECT value, expires_at FROM cache WHERE namespace = ? AND key = ?",
+                (namespace, key),
+            )
+            .fetchone()
+        )
+        if row is None or (row[1] is not None and row[1] <= time.time()):
+            return None, MISSING
+        return row[1], orjson.loads(row[0])
+
+    def set(self, namespace: str, key: str, value: Any, expires_at: Optional[float]):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                (namespace, key, orjson.dumps(value), expires_at),
+            )
+            # Purge expired rows at most once a minute
+            now = time.time()
+            if now - self._last_purge > 60:
+                self._last_purge = now
+                conn.execute(
+                    "DELETE FROM cache WHERE expires_at IS NOT NULL AND expires_at <= ?",
+                    (now,),
+                )
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache with per-entry TTLs and an optional SQLite tier.
+    Entries missing from memory are looked up on disk and promoted on hit.
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        max_entries: int = 1024,
+        default_ttl: Optional[float] = None,
+        db_path: Optional[str] = None,
+    ):
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self.disk = SQLiteCacheStore(db_path) if db_path else None
+        self.stats = CacheStats()
+        # key -> (expires_at, value)
+        self._entries: OrderedDict[str, tuple[Optional[float], Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _get_memory(self, key: str) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return MISSING
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= time.time():
+                del self._entries[key]
+                self.stats.expirations += 1
+                return MISSING
+            self._entries.move_to_end(key)
+            return value
+
+    def _set_memory(self, key: str, value: Any, expires_at: Optional[float]):
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats.evictions += 1
+
+    def _expires_at(self, ttl: Optional[float]) -> Optional[float]:
+        ttl = self.default_ttl if ttl is None else ttl
+        return time.time() + ttl if ttl is not None else None
+
+    def get(self, key: str) -> Any:
+        value = self._get_memory(key)
+        if value is MISSING and self.disk:
+            expires_at, value = self.disk.get(self.namespace, key)
+            if value is not MISSING:
+                self.stats.disk_hits += 1
+                self._set_memory(key, value, expires_at)
+        if value is MISSING:
+            self.stats.misses += 1
+        else:
+            self.stats.hits += 1
+        return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        expires_at = self._expires_at(ttl)
+        self.stats.sets += 1
+        self._set_memory(key, value, expires_at)
+        if self.disk:
+            self.disk.set(self.namespace, key, value, expires_at)
+
+    async def aget(self, key: str) -> Any:
+        if self.disk is None:
+            return self.get(key)
+        value = self._get_memory(key)
+        if value is not MISSING:
+            self.stats.hits += 1
+            return value
+        # Go through get() in a thread so disk I/O never blocks the event loop
+        return await asyncio.to_thread(self.get, key)
+
+    async def aset(self, key: str, value: Any, ttl: Optional[float] = None):
+        if self.disk is None:
+            self.set(key, value, ttl)
+        else:
+            await asyncio.to_thread(self.set, key, value, ttl)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,37 @@
+import asyncio
+import weakref
+
+import httpx
+
+# event loop -> client name -> pooled client.
+# Clients are bound to the loop they were created on, so each loop
+# (one per uvicorn worker, or one per asyncio.run in debug mode) gets its own pool.
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict[str, httpx.AsyncClient]]" = (
+    weakref.WeakKeyDictionary()
+)
+
+DEFAULT_LIMITS = httpx.Limits(max_connections=200, max_keepalive_connections=50)
+DEFAULT_TIMEOUT = httpx.Timeout(30.0, connect=10.0)
+
+
+def get_async_client(name: str = "default", **client_kwargs) -> httpx.AsyncClient:
+    """
+    Returns the pooled AsyncClient registered under `name` for the running event loop,
+    creating it on first use. `client_kwargs` are only applied when the client is created.
+    """
+    loop = asyncio.get_running_loop()
+    loop_clients = _clients.setdefault(loop, {})
+    client = loop_clients.get(name)
+    if client is None or client.is_closed:
+        client_kwargs.setdefault("limits", DEFAULT_LIMITS)
+        client_kwargs.setdefault("timeout", DEFAULT_TIMEOUT)
+        client = httpx.AsyncClient(**client_kwargs)
+        loop_clients[name] = client
+    return client
+
+
+async def close_async_clients():
+    """Closes every pooled client created on the running event loop."""
+    loop_clients = _clients.pop(asyncio.get_running_loop(), {})
+    for client in loop_clients.values():
+        await client.aclose()
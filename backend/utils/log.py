@@ -0,0 +1,58 @@
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+from typing import Any, Optional
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# Share of tool inputs/outputs and other payloads logged at INFO; all of them at DEBUG
+LOG_PAYLOAD_SAMPLE = float(os.getenv("LOG_PAYLOAD_SAMPLE", 0.05))
+# Payloads are cut to this many characters
+LOG_PAYLOAD_CHARS = int(os.getenv("LOG_PAYLOAD_CHARS", 500))
+
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def setup_logging(level: str = LOG_LEVEL):
+    """
+    Sends the app's log records through a queue to a background thread that writes
+    them, so a slow terminal or pipe never blocks the event loop. Safe to call twice.
+    """
+    global _listener
+    if _listener is not None:
+        return
+    records: queue.Queue = queue.Queue(-1)
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    _listener = logging.handlers.QueueListener(records, handler)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+    root = logging.getLogger()
+    root.addHandler(logging.handlers.QueueHandler(records))
+    root.setLevel(level)
+    # Keep library request logs out of INFO
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+
+def truncate(value: Any, limit: int = LOG_PAYLOAD_CHARS) -> str:
+    text = str(value)
+    if len(text) <= limit:
+        return text
+    return f"{text[:limit]}... ({len(text)} chars)"
+
+
+def log_payload(logger: logging.Logger, message: str, payload: Any):
+    """
+    Logs `message` with a truncated payload: always at DEBUG, and at INFO for a
+    LOG_PAYLOAD_SAMPLE share of calls. The payload is only formatted when logged.
+    """
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("%s: %s", message, truncate(payload))
+    elif random.random() < LOG_PAYLOAD_SAMPLE and logger.isEnabledFor(logging.INFO):
+        logger.info("%s (sampled): %s", message, truncate(payload))
@@ -0,0 +1,267 @@
+import bisect
+import logging
+import math
+import threading
+from typing import Callable, Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+# Latency buckets in seconds, from in-process work up to the slowest tool timeouts
+DEFAULT_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0
+)
+
+LabelValues = Tuple[str, ...]
+
+logger = logging.getLogger(__name__)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str]) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, help: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.label_names):
+            raise ValueError(
+                f"{self.name} takes labels {self.label_names}, got {tuple(labels)}"
+            )
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labels: Iterable[str] = ()):
+        super().__init__(name, help, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"
+            for key, value in values
+        ]
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: Iterable[str] = (),
+        buckets: Iterable[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts (last is +Inf), sum]
+        self._values: Dict[LabelValues, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = sorted(
+                (key, (list(counts), total)) for key, (counts, total) in self._values.items()
+            )
+        lines = []
+        names = self.label_names + ("le",)
+        for key, (counts, total) in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                labels = _format_labels(names, key + (_format_value(bound),))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.label_names, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    """
+    Holds the process's metrics and renders them in the Prometheus text format.
+    Components that already keep their own stats are exported through `register_stats`,
+    which turns the numeric fields of their snapshot into gauges, or counters for the
+    fields that only ever grow, at scrape time.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, _Metric] = {}
+        # (prefix, label the snapshot is keyed by, counter fields, labels, snapshot)
+        self._stats: List[
+            Tuple[str, Optional[str], FrozenSet[str], Dict[str, str], Callable]
+        ] = []
+
+    def _add(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric):
+                    raise ValueError(
+                        f"Metric {metric.name} is already registered as a {existing.type}"
+                    )
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, help: str, labels: Iterable[str] = ()) -> Counter:
+        return self._add(Counter(name, help, labels))
+
+    def gauge(self, name: str, help: str, labels: Iterable[str] = ()) -> Gauge:
+        return self._add(Gauge(name, help, labels))
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labels: Iterable[str] = (),
+        buckets: Iterable[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._add(Histogram(name, help, labels, buckets))
+
+    def register_stats(
+        self,
+        prefix: str,
+        snapshot: Callable[[], dict],
+        by: Optional[str] = None,
+        counters: Iterable[str] = (),
+        **labels,
+    ):
+        """
+        Exports `snapshot()` as gauges named `{prefix}_{field}`, with `labels` attached.
+        The fields listed in `counters` only ever grow and are exported as counters named
+        `{prefix}_{field}_total` instead. With `by`, the snapshot maps a value of that
+        label to the fields, e.g. stats per tool.
+        """
+        with self._lock:
+            self._stats.append((prefix, by, frozenset(counters), labels, snapshot))
+
+    def _render_stats(self) -> List[str]:
+        # name -> (type, [(labels, value)]), so each name gets a single TYPE block
+        series: Dict[str, Tuple[str, List[Tuple[Dict[str, str], float]]]] = {}
+        with self._lock:
+            stats = list(self._stats)
+        for prefix, by, counters, labels, snapshot in stats:
+            try:
+                snapshots = snapshot()
+            except Exception:
+                logger.exception("Error collecting %s stats", prefix)
+                continue
+            if by is None:
+                snapshots = {None: snapshots}
+            for label_value, values in snapshots.items():
+                sample_labels = labels if by is None else {**labels, by: label_value}
+                for field, value in values.items():
+                    if isinstance(value, bool) or not isinstance(value, (int, float)):
+                        continue
+                    if field in counters:
+                        name, type = f"{prefix}_{field}_total", Counter.type
+                    else:
+                        name, type = f"{prefix}_{field}", Gauge.type
+                    series.setdefault(name, (type, []))[1].append((sample_labels, value))
+
+        blocks = []
+        for name, (type, samples) in sorted(series.items()):
+            lines = [f"# TYPE {name} {type}"]
+            for labels, value in samples:
+                lines.append(
+                    f"{name}{_format_labels(labels.keys(), labels.values())} {_format_value(value)}"
+                )
+            blocks.append("\n".join(lines))
+        return blocks
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        blocks = [metric.render() for metric in metrics]
+        blocks.extend(self._render_stats())
+        return "\n".join(blocks) + "\n"
+
+
+registry = Registry()
+
+
+def counter(name: str, help: str, labels: Iterable[str] = ()) -> Counter:
+    return registry.counter(name, help, labels)
+
+
+def gauge(name: str, help: str, labels: Iterable[str] = ()) -> Gauge:
+    return registry.gauge(name, help, labels)
+
+
+def histogram(
+    name: str,
+    help: str,
+    labels: Iterable[str] = (),
+    buckets: Optional[Iterable[float]] = None,
+) -> Histogram:
+    return registry.histogram(name, help, labels, buckets or DEFAULT_BUCKETS)
+
+
+def register_stats(
+    prefix: str,
+    snapshot: Callable[[], dict],
+    by: Optional[str] = None,
+    counters: Iterable[str] = (),
+    **labels,
+):
+    registry.register_stats(prefix, snapshot, by, counters, **labels)
+
+
+def render_metrics() -> str:
+    return registry.render()
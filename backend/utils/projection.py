@@ -0,0 +1,208 @@
+import concurrent.futures
+import json
+import logging
+import os
+import threading
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Union
+
+# "columnar" (column names + value rows), "markdown" (a table) or "json" (a list of objects)
+TOOL_OUTPUT_FORMAT = os.getenv("TOOL_OUTPUT_FORMAT", "columnar")
+OUTPUT_FORMATS = ("columnar", "markdown", "json")
+
+# Tokenizer of the gpt-4.1 model family
+TOKEN_ENCODING = "o200k_base"
+
+Getter = Union[str, Callable[[dict], Any]]
+
+logger = logging.getLogger(__name__)
+
+
+@lru_cache(maxsize=1)
+def _get_encoding():
+    try:
+        import tiktoken
+
+        return tiktoken.get_encoding(TOKEN_ENCODING)
+    except Exception as e:
+        # The encoding is downloaded on first use; fall back to an estimate when offline
+        logger.warning("Token counts are estimated, could not load %s: %s", TOKEN_ENCODING, e)
+        return None
+
+
+def count_tokens(text: str) -> int:
+    encoding = _get_encoding()
+    if encoding is None:
+        return (len(text.encode("utf-8")) + 3) // 4
+    return len(encoding.encode_ordinary(text))
+
+
+def to_tool_content(output: Any) -> str:
+    """The text a ToolMessage carries for a tool output, as ToolNode serializes it."""
+    if isinstance(output, str):
+        return output
+    return json.dumps(output, ensure_ascii=False)
+
+
+def _is_empty(value: Any) -> bool:
+    return value is None or value == "" or value == [] or value == {}
+
+
+def _markdown_cell(value: Any) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, list):
+        value = ", ".join(map(str, value))
+    return str(value).replace("|", "\\|").replace("\n", " ")
+
+
+class ProjectionStats:
+    def __init__(self):
+        self.calls = 0
+        self.items_in = 0
+        self.items_out = 0
+        self.raw_bytes = 0
+        self.projected_bytes = 0
+        self.raw_tokens = 0
+        self.projected_tokens = 0
+
+    def snapshot(self) -> dict:
+        return {
+            "calls": self.calls,
+            "items_in": self.items_in,
+            "items_out": self.items_out,
+            "bytes_saved": self.raw_bytes - self.projected_bytes,
+            "tokens_saved": self.raw_tokens - self.projected_tokens,
+            "token_ratio": (
+                self.projected_tokens / self.raw_tokens if self.raw_tokens else None
+            ),
+        }
+
+
+_stats_lock = threading.Lock()
+projection_stats: Dict[str, ProjectionStats] = {}
+# Serializing and counting tokens only feeds stats and logs, so it runs here rather
+# than in the tool call, which is usually on the event loop. One worker keeps it to
+# a single core.
+_token_executor = concurrent.futures.ThreadPoolExecutor(
+    max_workers=1, thread_name_prefix="projection-tokens"
+)
+
+
+def _record_tokens(name: str, raw: Any, output: Any, items_in: int, items_out: int):
+    try:
+        raw_content = to_tool_content(raw() if callable(raw) else raw)
+        content = to_tool_content(output)
+    except Exception:
+        logger.exception("Error measuring the %s projection", name)
+        return
+    raw_bytes = len(raw_content.encode("utf-8"))
+    projected_bytes = len(content.encode("utf-8"))
+    raw_tokens = count_tokens(raw_content)
+    projected_tokens = count_tokens(content)
+
+    with _stats_lock:
+        stats = projection_stats.setdefault(name, ProjectionStats())
+        stats.raw_bytes += raw_bytes
+        stats.projected_bytes += projected_bytes
+        stats.raw_tokens += raw_tokens
+        stats.projected_tokens += projected_tokens
+
+    logger.info(
+        "Projected %s: %d -> %d items, %d -> %d bytes, %d -> %d tokens (saved %d)",
+        name,
+        items_in,
+        items_out,
+        raw_bytes,
+        projected_bytes,
+        raw_tokens,
+        projected_tokens,
+        raw_tokens - projected_tokens,
+    )
+
+
+class Projection:
+    """
+    Schema for what one tool hands back to the model. Keeps only the listed fields
+    of each item and at most `max_items` items. `fields` maps an output column to a
+    key of the source item or to a function of the item; empty values are dropped.
+    """
+
+    def __init__(self, name: str, fields: Dict[str, Getter], max_items: int = 10):
+        self.name = name
+        self.fields = fields
+        self.max_items = max_items
+
+    def project(self, items: List[dict]) -> List[dict]:
+        rows = []
+        for item in items[: self.max_items]:
+            row = {}
+            for column, getter in self.fields.items():
+                value = item.get(getter) if isinstance(getter, str) else getter(item)
+                if not _is_empty(value):
+                    row[column] = value
+            rows.append(row)
+        return rows
+
+    def render(self, rows: List[dict], output_format: str) -> Union[str, dict, list]:
+        if output_format == "json":
+            return rows
+        # Columns that are empty on every row are left out
+        columns = [column for column in self.fields if any(column in row for row in rows)]
+        if output_format == "columnar":
+            return {
+                "columns": columns,
+                "rows": [[row.get(column) for column in columns] for row in rows],
+            }
+        if output_format == "markdown":
+            if not rows:
+                return "No results."
+            lines = [
+                "| " + " | ".join(columns) + " |",
+                "|" + "---|" * len(columns),
+            ]
+            for row in rows:
+                cells = (_markdown_cell(row.get(column)) for column in columns)
+                lines.append("| " + " | ".join(cells) + " |")
+            return "\n".join(lines)
+        raise ValueError(
+            f"Unknown output format '{output_format}'. Use one of: {', '.join(OUTPUT_FORMATS)}."
+        )
+
+    def apply(
+        self,
+        items: List[dict],
+        raw: Any = None,
+        output_format: Optional[str] = None,
+    ) -> Union[str, dict, list]:
+        """
+        Projects and renders `items`, and records how much smaller the result is than
+        `raw`, the unfiltered payload the tool started from (defaults to `items`).
+        `raw` may be a function that builds the payload. Sizes are measured in the
+        background, so they land in the stats shortly after; neither `items` nor `raw`
+        may change once they are passed in.
+        """
+        items = items or []
+        output = self.render(self.project(items), output_format or TOOL_OUTPUT_FORMAT)
+        items_out = min(len(items), self.max_items)
+
+        with _stats_lock:
+            stats = projection_stats.setdefault(self.name, ProjectionStats())
+            stats.calls += 1
+            stats.items_in += len(items)
+            stats.items_out += items_out
+
+        _token_executor.submit(
+            _record_tokens,
+            self.name,
+            items if raw is None else raw,
+            output,
+            len(items),
+            items_out,
+        )
+        return output
+
+
+def get_projection_stats() -> dict:
+    with _stats_lock:
+        return {name: stats.snapshot() for name, stats in projection_stats.items()}
@@ -0,0 +1,97 @@
+import asyncio
+import concurrent.futures
+import threading
+from typing import Any, Awaitable, Callable, Hashable
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key into one execution.
+
+    The first caller for a key (the leader) runs the function; callers arriving while it
+    is in flight wait for and share its result or exception. With `ado` the function
+    runs in a task of its own, so cancelling any caller, including the leader, only
+    stops that caller's wait and never fails the others. A plain
+    concurrent.futures.Future is the rendezvous, so thread-pool callers (`do`) and
+    asyncio callers (`ado`) coalesce with each other. `do` blocks, so it must not be
+    called from an event loop thread.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._in_flight: dict[Hashable, concurrent.futures.Future] = {}
+        # Running shared calls of `ado`, referenced until they finish
+        self._tasks: set[asyncio.Task] = set()
+        self.calls = 0
+        self.executions = 0
+
+    def _join(self, key: Hashable) -> tuple[concurrent.futures.Future, bool]:
+        with self._lock:
+            self.calls += 1
+            future = self._in_flight.get(key)
+            if future is not None:
+                return future, False
+            future = concurrent.futures.Future()
+            self._in_flight[key] = future
+            self.executions += 1
+            return future, True
+
+    def _settle(self, key: Hashable, future: concurrent.futures.Future, result=None, error=None):
+        # Forget the key first so callers arriving after completion start a fresh call
+        with self._lock:
+            self._in_flight.pop(key, None)
+        if future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def do(self, key: Hashable, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        future, leader = self._join(key)
+        if not leader:
+            return future.result()
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            self._settle(key, future, error=e)
+            raise
+        self._settle(key, future, result)
+        return result
+
+    def _settle_task(self, key: Hashable, future: concurrent.futures.Future, task: asyncio.Task):
+        self._tasks.discard(task)
+        if task.cancelled():
+            # Never hand a CancelledError to callers that were not cancelled themselves
+            self._settle(key, future, error=RuntimeError(f"{self.name} call was cancelled"))
+        elif task.exception() is not None:
+            self._settle(key, future, error=task.exception())
+        else:
+            self._settle(key, future, task.result())
+
+    async def ado(
+        self, key: Hashable, fn: Callable[..., Awaitable[Any]], *args, **kwargs
+    ) -> Any:
+        future, leader = self._join(key)
+        if leader:
+            # The shared call runs in its own task, so it outlives any one caller
+            task = asyncio.ensure_future(fn(*args, **kwargs))
+            self._tasks.add(task)
+            task.add_done_callback(lambda task: self._settle_task(key, future, task))
+        waiter = asyncio.wrap_future(future)
+        # A caller that stopped waiting never reads the outcome, so mark it retrieved
+        waiter.add_done_callback(lambda waiter: waiter.cancelled() or waiter.exception())
+        # Shield so a cancelled caller, leader or follower, only stops its own wait
+        return await asyncio.shield(waiter)
+
+    def stats(self) -> dict:
+        with self._lock:
+            coalesced = self.calls - self.executions
+            return {
+                "calls": self.calls,
+                "executions": self.executions,
+                "coalesced": coalesced,
+                "coalescing_ratio": coalesced / self.calls if self.calls else None,
+                "in_flight": len(self._in_flight),
+            }
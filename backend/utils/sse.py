@@ -0,0 +1,205 @@
+import asyncio
+import os
+import time
+from typing import AsyncIterator, Optional
+
+import orjson
+
+# Merge consecutive tokens into one frame; "0" sends every token as its own event
+SSE_COALESCE = os.getenv("SSE_COALESCE", "1").lower() not in ("0", "false", "no")
+# Pending tokens are flushed after this many milliseconds or bytes, whichever comes first
+SSE_FLUSH_MS = float(os.getenv("SSE_FLUSH_MS", 25))
+SSE_FLUSH_BYTES = int(os.getenv("SSE_FLUSH_BYTES", 512))
+# Comment frame sent when nothing else was written for this many seconds
+SSE_HEARTBEAT_SECONDS = float(os.getenv("SSE_HEARTBEAT_SECONDS", 15))
+
+HEARTBEAT = b": keep-alive\n\n"
+_DONE = object()
+
+
+def encode_event(event: dict, event_id=None) -> bytes:
+    frame = b"data: " + orjson.dumps(event) + b"\n\n"
+    if event_id is not None:
+        # Sent back by reconnecting clients in the Last-Event-ID header
+        return b"id: %d\n" % event_id + frame
+    return frame
+
+
+class SSEStats:
+    def __init__(self):
+        self.events = 0
+        self.frames = 0
+        self.bytes = 0
+        self.heartbeats = 0
+
+    def snapshot(self) -> dict:
+        return {
+            "events": self.events,
+            "frames": self.frames,
+            "bytes": self.bytes,
+            "heartbeats": self.heartbeats,
+            "events_per_frame": self.events / self.frames if self.frames else None,
+        }
+
+
+sse_stats = SSEStats()
+
+
+class SSEEncoder:
+    """
+    Encodes stream events as SSE frames. With coalescing on, consecutive "token" events
+    are merged into one, and consecutive "tool_call_chunk" events for the same call
+    have their argument fragments joined. Any other event flushes what is pending
+    first, so the order of events is kept. With `id_key` set, events carrying that
+    key are sent with its value as their SSE id.
+    """
+
+    def __init__(
+        self,
+        coalesce: bool = SSE_COALESCE,
+        flush_bytes: int = SSE_FLUSH_BYTES,
+        id_key: Optional[str] = None,
+    ):
+        self.coalesce = coalesce
+        self.flush_bytes = flush_bytes
+        self.id_key = id_key
+        self._tokens: list[str] = []
+        self._token_size = 0
+        self._tool_chunk: Optional[dict] = None
+        # When the oldest pending fragment arrived, for the time-based flush
+        self.pending_since: Optional[float] = None
+
+    @property
+    def pending(self) -> bool:
+        return self.pending_since is not None
+
+    def _mark_pending(self):
+        if self.pending_since is None:
+            self.pending_since = time.monotonic()
+
+    def _encode(self, event: dict) -> bytes:
+        frame = encode_event(event, event.get(self.id_key) if self.id_key else None)
+        sse_stats.frames += 1
+        sse_stats.bytes += len(frame)
+        return frame
+
+    def flush(self) -> bytes:
+        frames = b""
+        if self._tokens:
+            frames += self._encode({"type": "token", "content": "".join(self._tokens)})
+            self._tokens = []
+            self._token_size = 0
+        if self._tool_chunk is not None:
+            frames += self._encode({"type": "tool_call_chunk", "chunk": self._tool_chunk})
+            self._tool_chunk = None
+        self.pending_since = None
+        return frames
+
+    def add(self, event: dict) -> bytes:
+        """Adds an event and returns the frames that are ready to send, if any."""
+        sse_stats.events += 1
+        if not self.coalesce:
+            return self._encode(event)
+
+        kind = event.get("type")
+        if kind == "token":
+            frames = self.flush() if self._tool_chunk is not None else b""
+            self._tokens.append(event["content"])
+            self._token_size += len(event["content"])
+            self._mark_pending()
+            if self._token_size >= self.flush_bytes:
+                frames += self.flush()
+            return frames
+
+        if kind == "tool_call_chunk":
+            chunk = event["chunk"]
+            pending = self._tool_chunk
+            frames = b""
+            if self._tokens or (
+                pending is not None and pending.get("index") != chunk.get("index")
+            ):
+                frames = self.flush()
+                pending = None
+            if pending is None:
+                self._tool_chunk = dict(chunk)
+                self._mark_pending()
+            else:
+                pending["args"] = (pending.get("args") or "") + (chunk.get("args") or "")
+            if len(self._tool_chunk.get("args") or "") >= self.flush_bytes:
+                frames += self.flush()
+            return frames
+
+        return self.flush() + self._encode(event)
+
+
+async def encode_stream(
+    events: AsyncIterator[dict],
+    encoder: Optional[SSEEncoder] = None,
+    flush_interval: float = SSE_FLUSH_MS / 1000,
+    heartbeat_interval: float = SSE_HEARTBEAT_SECONDS,
+) -> AsyncIterator[bytes]:
+    """
+    Turns an async iterator of event dicts into SSE bytes for a StreamingResponse.
+    Events are read by a producer task, so pending tokens are flushed on time and
+    heartbeats go out while the source is quiet, e.g. during a long tool call.
+    Everything that is ready at once is written as a single chunk.
+    """
+    encoder = encoder or SSEEncoder()
+    queue: asyncio.Queue = asyncio.Queue(maxsize=1024)
+
+    async def produce():
+        try:
+            async for event in events:
+                await queue.put(event)
+        except Exception as e:
+            await queue.put(e)
+        finally:
+            await queue.put(_DONE)
+
+    producer = asyncio.create_task(produce())
+    last_write = time.monotonic()
+    try:
+        done = False
+        while not done:
+            now = time.monotonic()
+            deadline = last_write + heartbeat_interval
+            if encoder.pending:
+                deadline = min(deadline, encoder.pending_since + flush_interval)
+
+            if queue.empty():
+                try:
+                    item = await asyncio.wait_for(queue.get(), max(deadline - now, 0))
+                except asyncio.TimeoutError:
+                    if encoder.pending:
+                        yield encoder.flush()
+                    else:
+                        sse_stats.heartbeats += 1
+                        sse_stats.bytes += len(HEARTBEAT)
+                        yield HEARTBEAT
+                    last_write = time.monotonic()
+                    continue
+                items = [item]
+            else:
+                items = []
+            # Drain whatever else is already queued into the same write
+            while not queue.empty():
+                items.append(queue.get_nowait())
+
+            out = b""
+            for item in items:
+                if item is _DONE:
+                    done = True
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                out += encoder.add(item)
+            if done or (
+                encoder.pending
+                and time.monotonic() - encoder.pending_since >= flush_interval
+            ):
+                out += encoder.flush()
+            if out:
+                yield out
+                last_write = time.monotonic()
+    finally:
+        producer.cancel()
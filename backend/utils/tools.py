@@ -1,8 +1,23 @@
+import asyncio
+import os
+
 from langchain_core.messages import ToolMessage
 from langchain_core.runnables import RunnableLambda
+from langchain_core.tools import BaseTool, StructuredTool
 
 from langgraph.prebuilt import ToolNode
 
+from utils.tracing import span, tool_call_seconds
+
+# Seconds a tool call may run before it is cancelled
+TOOL_TIMEOUT = float(os.getenv("TOOL_TIMEOUT", 60))
+
+
+def format_tool_error(error: Exception) -> str:
+    if isinstance(error, TimeoutError):
+        return f"Error: the tool timed out ({error}). Try a narrower search or try again later."
+    return f"Error: {repr(error)}\n please fix your mistakes."
+
 
 def handle_tool_error(state) -> dict:
     error = state.get("error")
@@ -10,7 +25,7 @@ def handle_tool_error(state) -> dict:
     return {
         "messages": [
             ToolMessage(
-                content=f"Error: {repr(error)}\n please fix your mistakes.",
+                content=format_tool_error(error),
                 tool_call_id=tc["id"],
             )
             for tc in tool_calls
@@ -18,8 +33,35 @@ def handle_tool_error(state) -> dict:
     }
 
 
+def with_timeout(tool: BaseTool, timeout: float = TOOL_TIMEOUT) -> BaseTool:
+    """
+    Wraps a tool so each call is cancelled after `timeout` seconds. The wrapper keeps
+    the tool's name, description and arguments, so the model sees the same tool.
+    """
+
+    async def run(**kwargs):
+        try:
+            async with span(f"tool:{tool.name}", tool_call_seconds, tool=tool.name):
+                # No callbacks: the wrapper already reports the tool start and end events
+                return await asyncio.wait_for(
+                    tool.ainvoke(kwargs, config={"callbacks": []}), timeout
+                )
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"{tool.name} took longer than {timeout:g}s") from None
+
+    return StructuredTool.from_function(
+        coroutine=run,
+        name=tool.name,
+        description=tool.description,
+        args_schema=tool.args_schema,
+    )
+
+
 def create_tool_node_with_fallback(tools: list) -> dict:
-    return ToolNode(tools).with_fallbacks(
+    # Tool calls of one step run concurrently when the graph runs async. A failing or
+    # timed out call becomes an error ToolMessage of its own, and the others still
+    # return their results; the fallback only covers errors outside the tools.
+    return ToolNode(tools, handle_tool_errors=format_tool_error).with_fallbacks(
         [RunnableLambda(handle_tool_error)], exception_key="error"
     )
 
@@ -0,0 +1,131 @@
+import asyncio
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+from utils.metrics import Histogram, histogram
+
+chat_ttft_seconds = histogram(
+    "chat_time_to_first_token_seconds",
+    "Time from a chat stream request to its first model token",
+)
+chat_stream_seconds = histogram(
+    "chat_stream_duration_seconds", "Duration of chat streams", labels=("status",)
+)
+assistant_step_seconds = histogram(
+    "assistant_step_seconds", "Duration of one assistant node run, retries included"
+)
+tool_call_seconds = histogram(
+    "tool_call_seconds", "Duration of tool calls", labels=("tool", "status")
+)
+upstream_request_seconds = histogram(
+    "upstream_request_seconds",
+    "Duration of requests to upstream services",
+    labels=("upstream", "status"),
+)
+processing_seconds = histogram(
+    "processing_seconds",
+    "Duration of in-process parsing, ranking and joining",
+    labels=("step",),
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+)
+
+
+class Trace:
+    """Spans recorded while serving one request, for a one-line timing summary."""
+
+    def __init__(self, trace_id: str, start: Optional[float] = None):
+        self.trace_id = trace_id
+        self.start = time.perf_counter() if start is None else start
+        # (name, offset from the trace start, duration, status)
+        self.spans: List[Tuple[str, float, float, str]] = []
+
+    def add(self, name: str, start: float, duration: float, status: str = "ok"):
+        self.spans.append((name, start - self.start, duration, status))
+
+    def summary(self) -> str:
+        totals: Dict[str, list] = {}
+        for name, _, duration, status in self.spans:
+            entry = totals.setdefault(name, [0, 0.0, 0])
+            entry[0] += 1
+            entry[1] += duration
+            # A poll that found the result not ready yet is not a failure
+            entry[2] += status not in ("ok", "pending")
+        parts = [f"total {(time.perf_counter() - self.start) * 1000:.0f}ms"]
+        for name, (count, total, failed) in totals.items():
+            part = f"{name} {count}x {total * 1000:.0f}ms"
+            if failed:
+                part += f" ({failed} failed)"
+            parts.append(part)
+        return ", ".join(parts)
+
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("trace", default=None)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+@contextmanager
+def start_trace(trace_id: str, start: Optional[float] = None):
+    """
+    Makes a new trace current for the block. Tasks and worker threads started inside
+    it copy the context, so their spans land in the same trace. `start` is a
+    perf_counter() time to measure from, e.g. when the request arrived.
+    """
+    trace = Trace(trace_id, start)
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+def _status(exc_type) -> str:
+    if exc_type is None:
+        return "ok"
+    if issubclass(exc_type, (TimeoutError, asyncio.TimeoutError)):
+        return "timeout"
+    if issubclass(exc_type, asyncio.CancelledError):
+        return "cancelled"
+    return "error"
+
+
+class span:
+    """
+    Times a block, as a `with` or `async with` context manager. The duration goes to
+    `histogram` (with `labels`, plus the outcome if it has a "status" label) and to the
+    current trace under `name`. Set `status` inside the block to override the outcome.
+    """
+
+    def __init__(self, name: str, histogram: Optional[Histogram] = None, **labels):
+        self.name = name
+        self.histogram = histogram
+        self.labels = labels
+        self.status: Optional[str] = None
+        self.start = 0.0
+
+    def __enter__(self) -> "span":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self.start
+        status = self.status or _status(exc_type)
+        if self.histogram is not None:
+            labels = self.labels
+            if "status" in self.histogram.label_names:
+                labels = {**labels, "status": status}
+            self.histogram.observe(duration, **labels)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add(self.name, self.start, duration, status)
+        return False
+
+    async def __aenter__(self) -> "span":
+        return self.__enter__()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return self.__exit__(exc_type, exc, tb)
@@ -28,7 +28,9 @@ export function useChat(chatId: Ref<string>) {
     });
 
     // Prepare conversation history
-    const messages = chatStore.getChat(chatId.value)?.messages || [];
+    const chat = chatStore.getChat(chatId.value);
+    const messages = chat?.messages || [];
+    const threadId = chat?.threadId;
     const conversationHistory = messages.map((msg) => ({
       role: msg.role,
       content: msg.content, // Send raw content
@@ -48,41 +50,50 @@ export function useChat(chatId: Ref<string>) {
     isLoading.value = true;
 
     // --- Call Streaming API ---
-    await streamChat(conversationHistory, {
-      onToken: async (token) => {
-        // Find the message using store's messages array
-        const existingMessage = messages.find((m) => m.id === assistantMessageId);
-        if (existingMessage) {
-          const updatedContent = existingMessage.content + token;
+    // A known thread only needs the new user message; the full history is the fallback
+    const requestMessages = threadId ? conversationHistory.slice(-1) : conversationHistory;
+    await streamChat(
+      requestMessages,
+      {
+        onThread: (newThreadId) => {
+          chatStore.updateChat(chatId.value, { threadId: newThreadId });
+        },
+        onToken: async (token) => {
+          // Find the message using store's messages array
+          const existingMessage = messages.find((m) => m.id === assistantMessageId);
+          if (existingMessage) {
+            const updatedContent = existingMessage.content + token;
+            chatStore.updateMessage(chatId.value, assistantMessageId, {
+              content: updatedContent,
+              loading: true,
+            });
+          }
+        },
+        onToolCallChunk: (chunk) => {},
+        onToolStart: (name, input) => {
+          console.log(`Starting tool: ${name}`, input);
+        },
+        onToolEnd: (name) => {
+          console.log(`Tool finished: ${name}`);
+        },
+        onError: (errorMessage) => {
+          console.error("Streaming Error:", errorMessage);
           chatStore.updateMessage(chatId.value, assistantMessageId, {
-            content: updatedContent,
-            loading: true,
+            content: `Sorry, an error occurred: ${errorMessage}`,
+            loading: false,
           });
-        }
-      },
-      onToolCallChunk: (chunk) => {},
-      onToolStart: (name, input) => {
-        console.log(`Starting tool: ${name}`, input);
-      },
-      onToolEnd: (name) => {
-        console.log(`Tool finished: ${name}`);
-      },
-      onError: (errorMessage) => {
-        console.error("Streaming Error:", errorMessage);
-        chatStore.updateMessage(chatId.value, assistantMessageId, {
-          content: `Sorry, an error occurred: ${errorMessage}`,
-          loading: false,
-        });
-        isLoading.value = false;
-      },
-      onEnd: () => {
-        chatStore.updateMessage(chatId.value, assistantMessageId, {
-          loading: false,
-        });
-        isLoading.value = false;
-        console.log("Streaming finished.");
+          isLoading.value = false;
+        },
+        onEnd: () => {
+          chatStore.updateMessage(chatId.value, assistantMessageId, {
+            loading: false,
+          });
+          isLoading.value = false;
+          console.log("Streaming finished.");
+        },
       },
-    });
+      { threadId, fullHistory: conversationHistory }
+    );
   };
 
   return {
@@ -39,16 +39,23 @@ type StreamEventEnd = {
   type: "end";
 };
 
+type StreamEventThread = {
+  type: "thread";
+  thread_id: string;
+};
+
 type StreamEvent =
   | StreamEventToken
   | StreamEventToolStart
   | StreamEventToolEnd
   | StreamEventToolCallChunk
   | StreamEventError
-  | StreamEventEnd;
+  | StreamEventEnd
+  | StreamEventThread;
 
 // Callbacks for the stream handler
 interface StreamCallbacks {
+  onThread?: (threadId: string) => void;
   onToken?: (token: string) => void;
   onToolCallChunk?: (chunk: StreamEventToolCallChunk["chunk"]) => void;
   onToolStart?: (name: string, input: any) => void;
@@ -57,25 +64,46 @@ interface StreamCallbacks {
   onEnd?: () => void;
 }
 
+// Use the updated Message type, selecting necessary fields + optional tool fields
+type RequestMessage = Pick<Message, "role" | "content"> &
+  Partial<Pick<Message, "tool_calls" | "tool_call_id">>;
+
+interface StreamOptions {
+  // Thread to resume; `messages` then only holds the new messages
+  threadId?: string;
+  // Full conversation, sent once if the backend no longer knows the thread
+  fullHistory?: RequestMessage[];
+}
+
+const postChatStream = (body: Record<string, any>) =>
+  fetch(`${API_URL}/api/chat/stream`, {
+    method: "POST",
+    headers: {
+      "Content-Type": "application/json",
+      Accept: "text/event-stream",
+    },
+    body: JSON.stringify(body),
+  });
+
 /**
  * Calls the backend streaming endpoint and processes Server-Sent Events.
  */
 export const streamChat = async (
-  // Use the updated Message type, selecting necessary fields + optional tool fields
-  messages: Array<
-    Pick<Message, "role" | "content"> & Partial<Pick<Message, "tool_calls" | "tool_call_id">>
-  >,
-  callbacks: StreamCallbacks
+  messages: RequestMessage[],
+  callbacks: StreamCallbacks,
+  options: StreamOptions = {}
 ): Promise<void> => {
   try {
-    const response = await fetch(`${API_URL}/api/chat/stream`, {
-      method: "POST",
-      headers: {
-        "Content-Type": "application/json",
-        Accept: "text/event-stream",
-      },
-      body: JSON.stringify({ messages }), // Send the message history
-    });
+    let response = await postChatStream({ messages, thread_id: options.threadId });
+
+    // 409: the backend lost the thread (e.g. after a restart), replay the conversation
+    if (response.status === 409 && options.fullHistory) {
+      response = await postChatStream({
+        messages: options.fullHistory,
+        thread_id: options.threadId,
+        full_history: true,
+      });
+    }
 
     if (!response.ok) {
       const errorBody = await response.text();
@@ -115,6 +143,9 @@ export const streamChat = async (
 
               // Call the appropriate callback based on the event type
               switch (event.type) {
+                case "thread":
+                  callbacks.onThread?.(event.thread_id);
+                  break;
                 case "token":
                   callbacks.onToken?.(event.content);
                   break;
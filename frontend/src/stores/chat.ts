@@ -6,6 +6,8 @@ type Chat = {
   title: string;
   messages: Message[];
   loading: boolean;
+  // Backend conversation thread, set once the first response starts streaming
+  threadId?: string;
 };
 
 // Create a factory function for message stores